@@ -0,0 +1,237 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "beatcharter"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Part of every key. Bumped whenever TempoAnalysis changes or the detection, folding or
+# phase alignment would give a different result, so older entries miss instead of lying.
+FORMAT_VERSION = 3
+# Arrays stored next to the per detector beats in the beats blob
+ONSET_TIMES_KEY = "_onset_times"
+ONSET_STRENGTHS_KEY = "_onset_strengths"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    key TEXT PRIMARY KEY,
+    audio_hash TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    params TEXT NOT NULL,
+    bpm REAL NOT NULL,
+    confidence REAL NOT NULL,
+    result TEXT NOT NULL,
+    beats BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_audio_hash ON analysis (audio_hash);
+CREATE INDEX IF NOT EXISTS analysis_last_used ON analysis (last_used);
+CREATE TABLE IF NOT EXISTS file_hash (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    audio_hash TEXT NOT NULL
+);
+"""
+
+
+def hash_file(path: Path) -> str:
+    """Hash the bytes of a file, without remembering it anywhere"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """
+    AnalysisCache - persistent, content addressed store of audio analysis results.
+
+    Entries are keyed by a hash of the audio bytes plus the backend name and its
+    parameters, so renaming or moving a song keeps its cached analysis while any change to
+    the audio or the analysis settings misses. The database is bounded to max_bytes and
+    evicts the least recently used entries first.
+
+    A connection is opened per operation so a cache can be shared between processes.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        if cache_dir is None:
+            cache_dir = Path(os.environ.get("BEATCHARTER_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.cache_dir = Path(cache_dir)
+        self.db_path = self.cache_dir / "analysis.sqlite3"
+        self.max_bytes = max_bytes
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._initialized = True
+        return connection
+
+    def hash_audio(self, path: Path) -> str:
+        """
+        Hash the audio bytes of a file. The hash is remembered by path, size and mtime so
+        unchanged files are only read once.
+        """
+        path = Path(path).resolve()
+        stat = path.stat()
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT audio_hash FROM file_hash WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (str(path), stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+            if row:
+                return row[0]
+
+            audio_hash = hash_file(path)
+            connection.execute(
+                "INSERT OR REPLACE INTO file_hash VALUES (?, ?, ?, ?)",
+                (str(path), stat.st_size, stat.st_mtime_ns, audio_hash),
+            )
+        return audio_hash
+
+    @staticmethod
+    def make_key(audio_hash: str, backend: str, params: Dict[str, Any]) -> str:
+        params_json = json.dumps(params, sort_keys=True)
+        return hashlib.sha256(
+            f"{FORMAT_VERSION}:{audio_hash}:{backend}:{params_json}".encode()
+        ).hexdigest()
+
+    def get(self, path: Path, backend: str, params: Dict[str, Any]) -> Optional[TempoAnalysis]:
+        """Return the cached analysis for the file, or None on a miss"""
+        key = self.make_key(self.hash_audio(path), backend, params)
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT result, beats FROM analysis WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE analysis SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+
+        result, beats_blob = row
+        try:
+            analysis = TempoAnalysis(**json.loads(result))
+            analysis.bpm_segments = [tuple(segment) for segment in analysis.bpm_segments]
+            with np.load(io.BytesIO(beats_blob)) as beats:
+                analysis.beats = {
+                    method: beats[method] for method in beats.files if not method.startswith("_")
+                }
+                if ONSET_TIMES_KEY in beats.files:
+                    analysis.onset_times = beats[ONSET_TIMES_KEY]
+                    analysis.onset_strengths = beats[ONSET_STRENGTHS_KEY]
+        except (TypeError, ValueError, KeyError, OSError) as e:
+            # An entry another version wrote, or a damaged one, is recomputed and replaced
+            logger.debug(f"Ignoring unreadable analysis cache entry for {path}: {e}")
+            return None
+        logger.debug(f"Analysis cache hit for {path} ({backend})")
+        return analysis
+
+    def put(
+        self, path: Path, backend: str, params: Dict[str, Any], analysis: TempoAnalysis
+    ) -> None:
+        """Store an analysis result, evicting old entries if the cache grows too large"""
+        audio_hash = self.hash_audio(path)
+        key = self.make_key(audio_hash, backend, params)
+
+        beats_buffer = io.BytesIO()
+        np.savez(
+            beats_buffer,
+            **analysis.beats,
+            **{
+                ONSET_TIMES_KEY: analysis.onset_times,
+                ONSET_STRENGTHS_KEY: analysis.onset_strengths,
+            },
+        )
+        beats_blob = beats_buffer.getvalue()
+        result = json.dumps(
+            {
+                "bpms": analysis.bpms,
+                "confidences": analysis.confidences,
+                "bpm": analysis.bpm,
+                "confidence": analysis.confidence,
+                "agreement": analysis.agreement,
+                "bpm_segments": analysis.bpm_segments,
+                "first_downbeat": analysis.first_downbeat,
+            }
+        )
+
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO analysis VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    audio_hash,
+                    backend,
+                    json.dumps(params, sort_keys=True),
+                    analysis.bpm,
+                    analysis.confidence,
+                    result,
+                    beats_blob,
+                    len(result) + len(beats_blob),
+                    time.time(),
+                ),
+            )
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM analysis").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in connection.execute(
+            "SELECT key, size FROM analysis ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM analysis WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.debug(f"Evicted {evicted} analysis cache entries")
+
+    def invalidate(self, path: Optional[Path] = None) -> int:
+        """
+        Drop cached results for one audio file, or for everything when path is None.
+
+        Returns:
+            int: Number of entries removed
+        """
+        with closing(self._connect()) as connection, connection:
+            if path is None:
+                connection.execute("DELETE FROM file_hash")
+                return connection.execute("DELETE FROM analysis").rowcount
+
+        audio_hash = self.hash_audio(path)
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM file_hash WHERE audio_hash = ?", (audio_hash,))
+            return connection.execute(
+                "DELETE FROM analysis WHERE audio_hash = ?", (audio_hash,)
+            ).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with closing(self._connect()) as connection:
+            entries, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis"
+            ).fetchone()
+        return {"entries": entries, "size": size, "max_size": self.max_bytes}
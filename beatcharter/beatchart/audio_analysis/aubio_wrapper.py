@@ -1,129 +1,196 @@
-from aubio import tempo, source
-from pydub import AudioSegment
-from numpy import float64, median, diff
+import logging
+from typing import Any, Dict, Optional, Sequence
+from array import array as float_array
+from aubio import onset, tempo
+from numpy import array, clip, concatenate, float32, float64, rint
+from numpy.lib.stride_tricks import sliding_window_view
 from pathlib import Path
 from numpy.typing import NDArray
 
 from beatcharter.beatchart.audio_analysis.audio_analysis_wrapper import AudioAnalysisWrapper
+from beatcharter.beatchart.audio_analysis.audio_stream import AudioStream
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+from beatcharter.beatchart.beat_phase import find_first_downbeat
+from beatcharter.beatchart.subtatum_map import (
+    COMMON_RANGE_MAX,
+    COMMON_RANGE_MIN,
+    fold_to_common_range,
+    intervals_to_bpm,
+    most_common_in_range,
+    most_common_tactus,
+)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 class AubioWrapper(AudioAnalysisWrapper):
 
-    def __init__(self):
+    name = "aubio"
+
+    # Onset detection functions handed to aubio.tempo, see `aubio.specdesc` for the full list
+    DEFAULT_METHODS = ("default", "specdiff", "hfc")
+
+    def __init__(
+        self,
+        methods: Sequence[str] = DEFAULT_METHODS,
+        use_cache: bool = True,
+        cache_dir: Optional[Path] = None,
+    ):
+        super().__init__(use_cache, cache_dir)
         self.window_size = 512
         self.hop_size = self.window_size//2
         self.sample_rate_hz = 48000
-
-    def __convert_to_wav(self, path: Path):
-        short_name = path.name
-        extension = short_name.split('.')[-1]
-
-        if extension == 'mp3':
-            name_no_extension = path.name.split('.mp3')[0]
-
-            sound = AudioSegment.from_mp3(path)
-            resulting_wav = name_no_extension + ".wav"
-            sound.export(resulting_wav, format="wav")
-            print("Converted %s to %s (%s)", path, resulting_wav)
-            filename = resulting_wav
-
-        return filename
+        self.methods = tuple(methods)
+        self.agreement_bpm = 2.0
+        # Onset envelope the beat grid is phase aligned against to find the first downbeat
+        self.onset_method = "specflux"
+        self.beats_per_measure = 4
+
+    def cache_params(self) -> Dict[str, Any]:
+        return {
+            "window_size": self.window_size,
+            "hop_size": self.hop_size,
+            "sample_rate_hz": self.sample_rate_hz,
+            "agreement_bpm": self.agreement_bpm,
+            "common_range": [COMMON_RANGE_MIN, COMMON_RANGE_MAX],
+            "onset_method": self.onset_method,
+            "beats_per_measure": self.beats_per_measure,
+        }
+
+    def __open_stream(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> AudioStream:
+        # Decoded blocks are handed straight to aubio, nothing is written to disk
+        return AudioStream(path, self.hop_size, self.sample_rate_hz, start, duration)
 
     """
      FindBPM - finds bpm of song
      @return float detected bpm
     """
-    def calculate_bpm(self, path: Path) -> NDArray[float64]:
-
-        filename = self.__convert_to_wav(path)
-        bpm = self.get_bpm_simple(filename)
-
-        bpm = self.get_bpm_iterative(filename)
-        print(bpm)
-
-        return bpm
-
-    def get_bpm_simple(self, filename) -> NDArray[float64]:
-        window_size = self.window_size
-        hop_size = self.hop_size
-        
-        # First get the source with native sample rate
-        s = source(filename)
-        native_sample_rate = s.samplerate
-        s.close()
-        
-        # Then create new source using the file's native sample rate
-        s = source(filename, native_sample_rate, hop_size)
-        
-        o = tempo("default", window_size, hop_size, native_sample_rate)
-        
-        # tempo detection delay, in samples
-        # default to 4 blocks delay to catch up with
-        delay = 4. * hop_size
-
-        # list of beats, in samples
-        beats = []
-
-        # total number of frames read
-        total_frames = 0
-        while True:
-            samples, read = s()
-            is_beat = o(samples)
-            if is_beat:
-                this_beat = int(total_frames - delay + is_beat[0] * hop_size)
-                # print("%f" % (this_beat / float(sample_rate)))
-                beats.append(this_beat)
-            total_frames += read
-            if read < hop_size: 
-                break
-
-        return beats
-
-
-    def get_bpm_iterative(self, filename) -> NDArray[float64]:
-        """ Calculate the beats per minute (bpm) of a given file.
-            filename: filename to the file
-            param: dictionary of parameters
+    def calculate_bpm(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> NDArray[float64]:
+        analysis = self.analyze(path, start=start, duration=duration)
+        logger.debug(f"{path}: {analysis.bpm:.2f} bpm")
+
+        return array([analysis.bpm])
+
+    def analyze(
+        self,
+        path: Path,
+        start: float = 0.0,
+        duration: Optional[float] = None,
+        *,
+        methods: Optional[Sequence[str]] = None,
+    ) -> TempoAnalysis:
+        """
+        Run every tempo detector over the song in a single decode.
+
+        Each decoded hop is fed to one aubio tempo instance per method, so the cost is
+        one decode no matter how many detectors are compared.
+
+        Args:
+            path: Path to the audio file
+            start: Seconds into the song to seek to, only the window is decoded
+            duration: Seconds to analyze, None for the rest of the song
+            methods: Onset detection methods to run, defaults to self.methods
+
+        Returns:
+            TempoAnalysis: per detector beats, bpm and confidence plus a combined estimate
         """
-        window_size = self.window_size
-        hop_size = self.hop_size
-        sample_rate = self.sample_rate_hz
-
-        s = source(filename)
-        native_sample_rate = s.samplerate
-        s.close()
-
-        s = source(filename, native_sample_rate, hop_size)
-        sample_rate = s.samplerate
-        o = tempo("specdiff", window_size, hop_size, sample_rate)
-
-        # List of beats, in samples
-        beats = []
-        # Total number of frames read
-        total_frames = 0
-
-        while True:
-            samples, read = s()
-            is_beat = o(samples)
-            if is_beat:
-                this_beat = o.get_last_s()
-                beats.append(this_beat)
-                # if o.get_confidence() > .2 and len(beats) > 2.:
-                #    break
-            total_frames += read
-            if read < hop_size:
-                break
-
-        return beats
-
-    def beats_to_bpm(self, beats, filename):
-            # if enough beats are found, convert to periods then to bpm
-            if len(beats) > 1:
-                if len(beats) < 4:
-                    print("few beats found in {:s}".format(filename))
-                bpms = 60. / diff(beats)
-                return median(bpms)
-            else:
-                print("not enough beats found in {:s}".format(filename))
-                return 0
-
-        return beats_to_bpm(beats, filename)
\ No newline at end of file
+        methods = tuple(methods) if methods else self.methods
+        return self.cached_analysis(
+            path,
+            ",".join(methods),
+            lambda: self.__analyze(path, methods, start, duration),
+            start,
+            duration,
+        )
+
+    def __find_first_downbeat(
+        self, envelope: float_array, samplerate: int, bpm: float, start: float
+    ) -> float:
+        # Each descriptor covers the window ending at the current hop, center it on that window
+        frame_offset = start + (self.hop_size - self.window_size / 2) / samplerate
+        return find_first_downbeat(
+            array(envelope, dtype=float64),
+            samplerate / self.hop_size,
+            bpm,
+            self.beats_per_measure,
+            frame_offset,
+        )
+
+    def __analyze(
+        self, path: Path, methods: Sequence[str], start: float, duration: Optional[float]
+    ) -> TempoAnalysis:
+        with self.__open_stream(path, start, duration) as s:
+            detectors = {
+                method: tempo(method, self.window_size, self.hop_size, s.samplerate)
+                for method in methods
+            }
+            # List of beats, in seconds from the start of the song
+            beats = {method: [] for method in methods}
+            # Onset strength per hop, one float each, and the onsets picked from it
+            envelope_detector = onset(
+                self.onset_method, self.window_size, self.hop_size, s.samplerate
+            )
+            envelope = float_array("f")
+            onsets = float_array("d")
+
+            for samples, read in s:
+                for method, o in detectors.items():
+                    if o(samples):
+                        beats[method].append(start + o.get_last_s())
+                if envelope_detector(samples):
+                    onsets.append(start + envelope_detector.get_last_s())
+                envelope.append(envelope_detector.get_descriptor())
+            samplerate = s.samplerate
+
+        analysis = TempoAnalysis()
+        for method, o in detectors.items():
+            analysis.beats[method] = array(beats[method], dtype=float64)
+            analysis.bpms[method] = most_common_tactus(analysis.beats[method]).bpm
+            analysis.confidences[method] = float(o.get_confidence())
+
+        analysis.onset_times = array(onsets, dtype=float64)
+        analysis.onset_strengths = self.__onset_strengths(
+            envelope, samplerate, analysis.onset_times, start
+        )
+
+        self.__combine(analysis)
+        analysis.first_downbeat = self.__find_first_downbeat(
+            envelope, samplerate, analysis.bpm, start
+        )
+        return analysis
+
+    def __onset_strengths(
+        self, envelope: float_array, samplerate: int, onset_times: NDArray[float64], start: float
+    ) -> NDArray[float32]:
+        # Peak of the envelope within a few hops of each onset, the picked time is delay
+        # compensated so it does not land exactly on the peak frame
+        envelope = array(envelope, dtype=float32)
+        if len(envelope) == 0 or len(onset_times) == 0:
+            return array([], dtype=float32)
+        radius = 2
+        peaks = sliding_window_view(
+            concatenate((envelope[:1].repeat(radius), envelope, envelope[-1:].repeat(radius))),
+            2 * radius + 1,
+        ).max(axis=1)
+        frame_offset = start + (self.hop_size - self.window_size / 2) / samplerate
+        frames = rint((onset_times - frame_offset) * samplerate / self.hop_size).astype(int)
+        return peaks[clip(frames, 0, len(peaks) - 1)]
+
+    def __combine(self, analysis: TempoAnalysis) -> None:
+        # Pool the folded intervals of every detector and take the most common tactus
+        bpms = concatenate(
+            [fold_to_common_range(intervals_to_bpm(beats)) for beats in analysis.beats.values()]
+        )
+        tactus = most_common_in_range(bpms)
+        if tactus.bpm == 0:
+            return
+
+        analysis.bpm = tactus.bpm
+        analysis.confidence = tactus.confidence
+        found = [bpm for bpm in analysis.bpms.values() if bpm > 0]
+        agreeing = [bpm for bpm in found if abs(bpm - analysis.bpm) <= self.agreement_bpm]
+        analysis.agreement = len(agreeing) / len(analysis.bpms)
@@ -1,13 +1,113 @@
 from abc import abstractmethod
 from pathlib import Path
+from typing import Any, Callable, Dict, Optional
 from numpy import float64
 from numpy.typing import NDArray
 
+from beatcharter.beatchart.audio_analysis.analysis_cache import AnalysisCache
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+from beatcharter.beatchart.beat_phase import find_first_downbeat_from_onsets
+from beatcharter.beatchart.tempo_map import TempoMapBuilder, build_tempo_map
+
 
 class AudioAnalysisWrapper:
-    def __init__(self):
+    # Backend name recorded in the analysis cache
+    name = ""
+
+    def __init__(self, use_cache: bool = True, cache_dir: Optional[Path] = None):
+        self.cache = AnalysisCache(cache_dir) if use_cache else None
+
+    @abstractmethod
+    def calculate_bpm(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> NDArray[float64]:
+        """
+        Args:
+            path: Path to the audio file
+            start: Seconds into the song to start analyzing at
+            duration: Seconds to analyze, None for the rest of the song
+        """
         pass
 
     @abstractmethod
-    def calculate_bpm(self, path: Path) -> NDArray[float64]:
+    def analyze(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> TempoAnalysis:
+        """
+        Args:
+            path: Path to the audio file
+            start: Seconds into the song to start analyzing at
+            duration: Seconds to analyze, None for the rest of the song
+
+        Returns:
+            TempoAnalysis: the tempo, beats and onsets of the song
+        """
         pass
+
+    def cache_params(self) -> Dict[str, Any]:
+        """Parameters that change the analysis result and so must be part of the cache key"""
+        return {}
+
+    def cached_analysis(
+        self,
+        path: Path,
+        method: str,
+        compute: Callable[[], TempoAnalysis],
+        start: float = 0.0,
+        duration: Optional[float] = None,
+    ) -> TempoAnalysis:
+        """Return the cached analysis of path for method, computing and storing it on a miss"""
+        if self.cache is None:
+            analysis = compute()
+            analysis.backend = self.name
+            return analysis
+
+        params = dict(self.cache_params(), method=method)
+        if start or duration is not None:
+            params.update(start=start, duration=duration)
+        analysis = self.cache.get(path, self.name, params)
+        if analysis is None:
+            analysis = compute()
+            self.cache.put(path, self.name, params, analysis)
+        analysis.backend = self.name
+        return analysis
+
+    def analyze_tempo_map(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> TempoAnalysis:
+        """
+        Variable tempo analysis of a song, mapped from the beats of analyze.
+
+        Returns:
+            TempoAnalysis: bpm_segments holds the (beat, bpm) map, bpm the longest segment
+        """
+        return self.tempo_map(self.analyze(path, start=start, duration=duration), start=start)
+
+    def tempo_map(self, analysis: TempoAnalysis, start: float = 0.0) -> TempoAnalysis:
+        """
+        Variable tempo map from the beats of an analysis already made, without decoding
+        the song again. Beat 0 is phase aligned to the onsets at the first segment's tempo,
+        the beats are a few floats each so mapping them twice costs nothing.
+
+        Args:
+            analysis: Result of analyze
+            start: Seconds into the song the analysis started at
+
+        Returns:
+            TempoAnalysis: bpm_segments holds the (beat, bpm) map, bpm the longest segment
+        """
+        beats = analysis.best_beats()
+        bpm_segments = build_tempo_map(beats, start_time=start)
+        if not bpm_segments:
+            return TempoAnalysis(backend=analysis.backend)
+        first_downbeat = find_first_downbeat_from_onsets(
+            analysis.onset_times, analysis.onset_strengths, bpm_segments[0][1], start=start
+        )
+        # Again from the downbeat, so tempo changes land on whole beats of the chart
+        builder = TempoMapBuilder(start_time=first_downbeat)
+        return TempoAnalysis(
+            bpm_segments=build_tempo_map(beats, builder=builder),
+            bpm=builder.main_bpm,
+            first_downbeat=first_downbeat,
+            backend=analysis.backend,
+        )
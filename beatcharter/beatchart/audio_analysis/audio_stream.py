@@ -0,0 +1,140 @@
+import logging
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import soundfile
+from numpy import float32
+from numpy.typing import NDArray
+
+logger = logging.getLogger(__name__)
+
+
+class AudioStream:
+    """
+    AudioStream - decode an audio file into fixed size mono float32 blocks.
+
+    Blocks are read straight from the decoder, so memory use is bounded by the hop size
+    rather than the length of the song, and no intermediate file is ever written.
+
+    libsndfile (through soundfile) decodes wav, flac, ogg and mp3 in-process. Anything
+    it cannot open is piped through ffmpeg as raw float32 PCM, when ffmpeg is available.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        hop_size: int,
+        sample_rate_hz: int = 48000,
+        start: float = 0.0,
+        duration: Optional[float] = None,
+    ):
+        """
+        Args:
+            path: Path to the audio file
+            hop_size: Number of samples per yielded block
+            sample_rate_hz: Sample rate to request from ffmpeg. Files decoded in-process
+                keep their native sample rate.
+            start: Seconds into the song to seek to before decoding
+            duration: Seconds to decode from start, None for the rest of the song
+        """
+        self.path = Path(path)
+        self.hop_size = hop_size
+        self.samplerate = sample_rate_hz
+        self.start = start
+        self.duration = duration
+        self._sound_file = None
+        self._process = None
+
+        try:
+            self._sound_file = soundfile.SoundFile(str(self.path))
+            self.samplerate = self._sound_file.samplerate
+            if start > 0:
+                # Seeks in the container, frames before start are never decoded
+                self._sound_file.seek(min(int(start * self.samplerate), self._sound_file.frames))
+        except soundfile.LibsndfileError:
+            if shutil.which("ffmpeg") is None:
+                raise
+            logger.debug(f"libsndfile cannot decode {self.path}, falling back to ffmpeg")
+            # -ss and -t before -i seek the input instead of decoding and discarding
+            window = ["-ss", str(start)] if start > 0 else []
+            if duration is not None:
+                window += ["-t", str(duration)]
+            self._process = subprocess.Popen(
+                [
+                    "ffmpeg",
+                    "-v",
+                    "error",
+                    *window,
+                    "-i",
+                    str(self.path),
+                    "-f",
+                    "f32le",
+                    "-ac",
+                    "1",
+                    "-ar",
+                    str(self.samplerate),
+                    "-",
+                ],
+                stdout=subprocess.PIPE,
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        if self._sound_file is not None:
+            self._sound_file.close()
+            self._sound_file = None
+        if self._process is not None:
+            self._process.stdout.close()
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+
+    def __iter__(self) -> Iterator[Tuple[NDArray[float32], int]]:
+        """
+        Yield (samples, read) pairs in the same shape aubio.source returns them: samples is
+        always hop_size long and zero padded at the end of the file, read is the number of
+        real samples in the block.
+        """
+        if self._sound_file is not None:
+            return self._read_sound_file()
+        return self._read_pipe()
+
+    def _read_sound_file(self) -> Iterator[Tuple[NDArray[float32], int]]:
+        hop_size = self.hop_size
+        block = np.zeros((hop_size, self._sound_file.channels), dtype=float32)
+        samples = np.zeros(hop_size, dtype=float32)
+        remaining = None
+        if self.duration is not None:
+            remaining = int(self.duration * self.samplerate)
+        while True:
+            frames = hop_size if remaining is None else max(0, min(hop_size, remaining))
+            read = self._sound_file.read(frames, dtype="float32", out=block[:frames]).shape[0]
+            if read < hop_size:
+                block[read:] = 0
+            if remaining is not None:
+                remaining -= read
+            np.mean(block, axis=1, out=samples)
+            yield samples, read
+            if read < hop_size:
+                break
+
+    def _read_pipe(self) -> Iterator[Tuple[NDArray[float32], int]]:
+        hop_size = self.hop_size
+        block_bytes = hop_size * 4
+        samples = np.zeros(hop_size, dtype=float32)
+        while True:
+            data = self._process.stdout.read(block_bytes)
+            read = len(data) // 4
+            samples[:read] = np.frombuffer(data, dtype=float32, count=read)
+            samples[read:] = 0
+            yield samples, read
+            if read < hop_size:
+                break
@@ -0,0 +1,48 @@
+"""
+Registry of AudioAnalysisWrapper backends.
+
+Backends are registered by module path and only imported when first created, so using
+aubio never pays for importing librosa (and numba) and vice versa.
+"""
+
+import importlib
+from typing import Dict, List, Type
+
+from beatcharter.beatchart.audio_analysis.audio_analysis_wrapper import AudioAnalysisWrapper
+
+# Backend name -> "module:ClassName"
+BACKENDS: Dict[str, str] = {
+    "aubio": "beatcharter.beatchart.audio_analysis.aubio_wrapper:AubioWrapper",
+    "librosa": "beatcharter.beatchart.audio_analysis.librosa_wrapper:LibrosaWrapper",
+    "cascade": "beatcharter.beatchart.audio_analysis.cascade_wrapper:CascadeWrapper",
+}
+
+
+def register_backend(name: str, target: str) -> None:
+    """
+    Register a backend.
+
+    Args:
+        name: Name the backend is selected by, e.g. on the command line
+        target: "module:ClassName" of an AudioAnalysisWrapper subclass
+    """
+    BACKENDS[name] = target
+
+
+def available_backends() -> List[str]:
+    return list(BACKENDS)
+
+
+def get_backend(name: str) -> Type[AudioAnalysisWrapper]:
+    """Import and return the wrapper class registered as name"""
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown analysis backend: {name}, expected one of {', '.join(BACKENDS)}"
+        )
+    module_name, class_name = BACKENDS[name].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_backend(name: str, **kwargs) -> AudioAnalysisWrapper:
+    """Create the backend registered as name, kwargs are passed to its constructor"""
+    return get_backend(name)(**kwargs)
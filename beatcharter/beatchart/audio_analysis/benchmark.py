@@ -0,0 +1,340 @@
+"""
+Speed and accuracy benchmark for the AudioAnalysisWrapper backends.
+
+Each backend analyzes every case in a fresh worker process, so the peak RSS recorded is
+that of one backend on one song, and the analysis cache is bypassed so every run decodes
+and analyzes from scratch. Cases are the songs in samples/ with their known tempos and
+click tracks synthesized at exact tempos.
+
+The chart building steps that run after analysis, quantization, arrow patterns and groove
+radar, are timed on synthetic input in this process, as they need no audio.
+"""
+
+import json
+import logging
+import multiprocessing
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import soundfile
+
+try:
+    import resource
+except ImportError:
+    # Windows, peak RSS is reported as None
+    resource = None
+
+from beatcharter.beatchart.audio_analysis.backends import create_backend
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+REPORT_VERSION = 1
+
+# Tempos of the songs in samples/, as asserted by test_beatchart_decoder
+SAMPLE_BPMS = {
+    "dixieland.mp3": 114.0,
+    "batleh.mp3": 111.0,
+    "evelina.mp3": 120.0,
+    "grandfather.mp3": 115.0,
+    "tenting.mp3": 72.0,
+}
+
+DEFAULT_CLICK_BPMS = (90.0, 120.0, 128.0, 140.0, 174.0)
+
+
+@dataclass
+class BenchmarkCase:
+    name: str
+    path: Path
+    expected_bpm: Optional[float] = None  # None to record timing only
+
+
+def synthesize_click_track(
+    path: Path,
+    bpm: float,
+    seconds: float = 60.0,
+    sample_rate_hz: int = 44100,
+    beats_per_measure: int = 4,
+    first_beat: float = 0.5,
+) -> Path:
+    """
+    Write a mono wav click track with a known tempo, the first beat of each measure accented.
+
+    Args:
+        path: wav file to write
+        bpm: Tempo of the clicks
+        seconds: Length of the track
+        sample_rate_hz: Sample rate of the track
+        beats_per_measure: Beats per measure, the first of each is louder and higher pitched
+        first_beat: Time in seconds of the first click
+
+    Returns:
+        Path: path
+    """
+    samples = np.zeros(int(seconds * sample_rate_hz), dtype=np.float32)
+    click_t = np.arange(int(0.03 * sample_rate_hz)) / sample_rate_hz
+    decay = np.exp(-click_t * 150.0)
+    accent = (0.9 * decay * np.sin(2 * np.pi * 1600.0 * click_t)).astype(np.float32)
+    click = (0.5 * decay * np.sin(2 * np.pi * 1000.0 * click_t)).astype(np.float32)
+
+    beat_times = np.arange(first_beat, seconds - click_t[-1], 60.0 / bpm)
+    for i, beat_time in enumerate(beat_times):
+        offset = int(round(beat_time * sample_rate_hz))
+        samples[offset : offset + click.size] += accent if i % beats_per_measure == 0 else click
+
+    # A little noise keeps spectral onset functions from dividing silence by silence
+    rng = np.random.default_rng(int(bpm * 1000))
+    samples += rng.normal(0, 0.002, samples.size).astype(np.float32)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    soundfile.write(str(path), samples, sample_rate_hz)
+    return path
+
+
+def sample_cases(samples_dir: Path) -> List[BenchmarkCase]:
+    """One case per audio file in samples_dir, with the known tempo where there is one"""
+    return [
+        BenchmarkCase(path.name, path, SAMPLE_BPMS.get(path.name))
+        for path in sorted(samples_dir.glob("*.mp3"))
+    ]
+
+
+def click_cases(
+    output_dir: Path, bpms: Iterable[float] = DEFAULT_CLICK_BPMS, seconds: float = 60.0
+) -> List[BenchmarkCase]:
+    """Synthesize a click track per bpm into output_dir, reusing ones already written"""
+    cases = []
+    for bpm in bpms:
+        path = output_dir / f"click_{bpm:g}bpm_{seconds:g}s.wav"
+        if not path.exists():
+            synthesize_click_track(path, bpm, seconds)
+        cases.append(BenchmarkCase(path.name, path, bpm))
+    return cases
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process, None where the platform can't tell"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _round_mb(mb: Optional[float]) -> Optional[float]:
+    return round(mb, 1) if mb is not None else None
+
+
+def _format_mb(mb: Optional[float]) -> str:
+    return f"{mb:7.1f} MB" if mb is not None else "    n/a MB"
+
+
+def octave_error(bpm: float, expected_bpm: float) -> float:
+    """Distance from expected_bpm after allowing for half and double tempo detections"""
+    return min(abs(bpm * factor - expected_bpm) for factor in (0.5, 1.0, 2.0))
+
+
+def measure(backend: str, case: BenchmarkCase, repeat: int = 1) -> Dict[str, Any]:
+    """Analyze case repeat times with backend and return its result record"""
+    record: Dict[str, Any] = {"backend": backend, "case": case.name}
+    try:
+        audio_seconds = soundfile.info(str(case.path)).duration
+        wrapper = create_backend(backend, use_cache=False)
+        import_rss_mb = _peak_rss_mb()
+
+        wall_seconds = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            analysis = wrapper.analyze(case.path)
+            wall_seconds.append(time.perf_counter() - started)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        return record
+
+    # The first run pays for one time setup such as JIT compilation, report the best
+    best = min(wall_seconds)
+    record.update(
+        audio_seconds=round(audio_seconds, 3),
+        wall_seconds=round(best, 4),
+        first_wall_seconds=round(wall_seconds[0], 4),
+        realtime_factor=round(best / audio_seconds, 5) if audio_seconds else None,
+        import_rss_mb=_round_mb(import_rss_mb),
+        peak_rss_mb=_round_mb(_peak_rss_mb()),
+        bpm=round(analysis.bpm, 3),
+        confidence=round(analysis.confidence, 3),
+        agreement=round(analysis.agreement, 3),
+        analyzed_by=analysis.backend,
+        expected_bpm=case.expected_bpm,
+    )
+    if case.expected_bpm is not None:
+        record["bpm_error"] = round(abs(analysis.bpm - case.expected_bpm), 3)
+        record["octave_error"] = round(octave_error(analysis.bpm, case.expected_bpm), 3)
+    return record
+
+
+def run_benchmarks(
+    backends: Iterable[str], cases: Iterable[BenchmarkCase], repeat: int = 1
+) -> Dict[str, Any]:
+    """
+    Benchmark every backend on every case, one fresh process per measurement.
+
+    Args:
+        backends: Backend names, e.g. ["aubio", "librosa"]
+        cases: Songs to analyze
+        repeat: Analyses per case, the fastest is reported
+
+    Returns:
+        Dict: the report, as written by write_report
+    """
+    cases = list(cases)
+    results = []
+    # Spawned rather than forked so no memory or imported backend is inherited
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        for case in cases:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                record = executor.submit(measure, backend, case, repeat).result()
+            if "error" in record:
+                logger.error(f"{backend:8} {case.name}: {record['error']}")
+            else:
+                error = record.get("bpm_error")
+                logger.info(
+                    f"{backend:8} {case.name:28} {record['wall_seconds']:7.3f}s "
+                    f"rtf {record['realtime_factor']:.4f} {_format_mb(record['peak_rss_mb'])} "
+                    f"{record['bpm']:7.2f} bpm" + (f" (error {error:.2f})" if error is not None else "")
+                )
+            results.append(record)
+
+    return {
+        "version": REPORT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "cases": [dict(asdict(case), path=str(case.path)) for case in cases],
+        "results": results,
+    }
+
+
+def builder_benchmarks(repeat: int = 1) -> Dict[str, float]:
+    """
+    Time the chart building steps on fixed synthetic input, the best of repeat runs.
+
+    Returns:
+        Dict[str, float]: seconds per step: quantizing a ten minute song, generating the
+            arrows of 1000 charts and computing the radar of 200 charts
+    """
+    # Imported here so the analysis workers don't pay for them
+    from beatcharter.builders.pattern_generator import build_transition_table, generate_steps
+    from beatcharter.builders.quantizer import ROWS_PER_MEASURE, quantize_onsets
+    from beatcharter.builders.step_builder import CONTROLLER_STYLES, ControllerType
+    from beatcharter.encoders.groove_radar import compute_radar_rows
+
+    rng = np.random.default_rng(0)
+    onsets = np.sort(rng.uniform(0, 600, 8000))
+    strengths = rng.random(8000).astype(np.float32)
+    table = build_transition_table(CONTROLLER_STYLES[ControllerType.ARCADE], 1.0)
+    charts = []
+    for _ in range(200):
+        rows = np.sort(rng.choice(100 * ROWS_PER_MEASURE, 800, replace=False))
+        charts.append((rows, rng.integers(0, 4, (800, 4)).astype(np.uint8)))
+
+    steps = {
+        "quantize_10_minutes": lambda: quantize_onsets(
+            onsets, strengths, np.array([[0.0, 140.0]]), 0.25, (4, 8, 12, 16, 24), 3.0
+        ),
+        "patterns_1000_charts": lambda: [
+            generate_steps(table, 400, np.random.default_rng(i)) for i in range(1000)
+        ],
+        "radar_200_charts": lambda: [
+            compute_radar_rows(rows, notes, [(0.0, 150.0)]) for rows, notes in charts
+        ],
+    }
+    timings = {}
+    for name, step in steps.items():
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            step()
+            best = min(best, time.perf_counter() - started)
+        timings[name] = round(best, 5)
+        logger.info(f"builder  {name:28} {best:7.4f}s")
+    return timings
+
+
+def write_report(report: Dict[str, Any], output: Path) -> None:
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def read_report(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_reports(
+    report: Dict[str, Any],
+    baseline: Dict[str, Any],
+    time_tolerance: float = 0.25,
+    memory_tolerance: float = 0.25,
+    bpm_tolerance: float = 0.5,
+) -> List[str]:
+    """
+    Compare a report against a stored baseline.
+
+    Args:
+        report: The new report
+        baseline: The baseline report
+        time_tolerance: Allowed relative increase of the real-time factor and of the
+            builder timings
+        memory_tolerance: Allowed relative increase of the peak RSS
+        bpm_tolerance: Allowed increase of the octave folded bpm error, in bpm
+
+    Returns:
+        List[str]: One line per regression, empty if there are none
+    """
+    baseline_results = {(r["backend"], r["case"]): r for r in baseline.get("results", [])}
+    regressions = []
+    baseline_builders = baseline.get("builders", {})
+    for name, seconds in report.get("builders", {}).items():
+        old = baseline_builders.get(name)
+        if old is not None and seconds > old * (1 + time_tolerance):
+            regressions.append(f"builder {name}: {old:.4f}s -> {seconds:.4f}s")
+    for result in report.get("results", []):
+        key = (result["backend"], result["case"])
+        label = f"{key[0]} {key[1]}"
+        old = baseline_results.get(key)
+        if old is None or "error" in old:
+            continue
+        if "error" in result:
+            regressions.append(f"{label}: failed, {result['error']}")
+            continue
+
+        if result["realtime_factor"] > old["realtime_factor"] * (1 + time_tolerance):
+            regressions.append(
+                f"{label}: real-time factor {old['realtime_factor']:.4f} -> "
+                f"{result['realtime_factor']:.4f}"
+            )
+        if (
+            result["peak_rss_mb"] is not None
+            and old["peak_rss_mb"] is not None
+            and result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + memory_tolerance)
+        ):
+            regressions.append(
+                f"{label}: peak RSS {old['peak_rss_mb']:.1f} MB -> {result['peak_rss_mb']:.1f} MB"
+            )
+        if "octave_error" in result and "octave_error" in old:
+            if result["octave_error"] > old["octave_error"] + bpm_tolerance:
+                regressions.append(
+                    f"{label}: bpm error {old['octave_error']:.2f} -> {result['octave_error']:.2f}"
+                    f" ({result['bpm']:.2f} bpm, expected {result['expected_bpm']:.2f})"
+                )
+    return regressions
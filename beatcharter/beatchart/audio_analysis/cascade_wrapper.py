@@ -0,0 +1,96 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from numpy import array, float64
+from numpy.typing import NDArray
+
+from beatcharter.beatchart.audio_analysis.audio_analysis_wrapper import AudioAnalysisWrapper
+from beatcharter.beatchart.audio_analysis.backends import create_backend
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+
+logger = logging.getLogger(__name__)
+
+
+class CascadeWrapper(AudioAnalysisWrapper):
+    """
+    CascadeWrapper - run the cheapest backend first and escalate only on uncertain songs.
+
+    Backends are tried in order. A result is accepted as soon as its confidence and the
+    agreement between its detectors both reach their thresholds, otherwise the next backend
+    analyzes the song. If none are certain the last backend's result is used. Each backend
+    is created, and its module imported, only when the cascade first reaches it.
+    """
+
+    name = "cascade"
+
+    DEFAULT_BACKENDS = ("aubio", "librosa")
+
+    def __init__(
+        self,
+        backends: Sequence[str] = DEFAULT_BACKENDS,
+        min_confidence: float = 0.55,
+        min_agreement: float = 0.67,
+        use_cache: bool = True,
+        cache_dir: Optional[Path] = None,
+    ):
+        """
+        Args:
+            backends: Backend names, cheapest first
+            min_confidence: Lowest tactus confidence accepted without escalating
+            min_agreement: Lowest fraction of agreeing detectors accepted without escalating
+            use_cache: Passed to each backend, the cascade itself caches nothing
+            cache_dir: Passed to each backend
+        """
+        # Each backend caches its own results, a cascade result is never stored
+        super().__init__(use_cache=False)
+        if not backends:
+            raise ValueError("CascadeWrapper needs at least one backend")
+        self.backend_names = tuple(backends)
+        self.min_confidence = min_confidence
+        self.min_agreement = min_agreement
+        self.backend_kwargs = {"use_cache": use_cache, "cache_dir": cache_dir}
+        self._backends: Dict[str, AudioAnalysisWrapper] = {}
+
+    def backend(self, name: str) -> AudioAnalysisWrapper:
+        if name not in self._backends:
+            self._backends[name] = create_backend(name, **self.backend_kwargs)
+        return self._backends[name]
+
+    def is_confident(self, analysis: TempoAnalysis) -> bool:
+        return (
+            analysis.bpm > 0
+            and analysis.confidence >= self.min_confidence
+            and analysis.agreement >= self.min_agreement
+        )
+
+    def calculate_bpm(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> NDArray[float64]:
+        return array([self.analyze(path, start, duration).bpm])
+
+    def analyze(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> TempoAnalysis:
+        """
+        Args:
+            path: Path to the audio file
+            start: Seconds into the song to start analyzing at
+            duration: Seconds to analyze, None for the rest of the song
+
+        Returns:
+            TempoAnalysis: the first confident result, its backend field says which one
+        """
+        for name in self.backend_names:
+            analysis = self.backend(name).analyze(path, start=start, duration=duration)
+            if self.is_confident(analysis):
+                return analysis
+            logger.debug(
+                f"{name} unsure of {path} ({analysis.bpm:.2f} bpm, confidence "
+                f"{analysis.confidence:.2f}, agreement {analysis.agreement:.2f})"
+            )
+        return analysis
+
+    def loaded_backends(self) -> List[str]:
+        """Backends the cascade has needed so far"""
+        return list(self._backends)
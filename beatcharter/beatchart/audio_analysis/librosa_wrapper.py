@@ -1,25 +1,177 @@
-from librosa import load
+from functools import cached_property
+from librosa import load, time_to_frames
 from librosa.feature.rhythm import tempo
 from librosa.beat import beat_track
+from librosa.onset import onset_detect, onset_strength
 from pathlib import Path
-from numpy import float64
+from typing import Any, Dict, Optional
+from numpy import array, clip, float32, float64
 from numpy.typing import NDArray
 
 from beatcharter.beatchart.audio_analysis.audio_analysis_wrapper import (
     AudioAnalysisWrapper,
 )
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+from beatcharter.beatchart.beat_phase import find_first_downbeat
+from beatcharter.beatchart.subtatum_map import intervals_to_bpm, most_common_tactus
+
+
+class LibrosaAudio:
+    """
+    LibrosaAudio - mono audio decoded once, shared by every librosa feature.
+
+    The onset strength envelope is computed on first use and reused for tempo, beat
+    tracking and onset detection, so each of them costs no further decode or STFT.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        sample_rate_hz: int,
+        res_type: str,
+        hop_length: int,
+        start: float = 0.0,
+        duration: Optional[float] = None,
+    ):
+        self.path = path
+        # librosa seeks to offset and stops after duration, so only the window is decoded
+        self.y, self.sr = load(
+            path,
+            sr=sample_rate_hz,
+            mono=True,
+            res_type=res_type,
+            offset=start,
+            duration=duration,
+        )
+        self.hop_length = hop_length
+        self.start = start
+
+    @cached_property
+    def onset_envelope(self) -> NDArray[float64]:
+        return onset_strength(y=self.y, sr=self.sr, hop_length=self.hop_length)
+
+    def tempo(self) -> float:
+        bpm = tempo(onset_envelope=self.onset_envelope, sr=self.sr, hop_length=self.hop_length)
+        return float(bpm[0])
+
+    def beat_track(self, bpm: Optional[float] = None) -> NDArray[float64]:
+        """
+        Return beat times in seconds from the start of the song. Passing the tempo skips
+        re-estimating it.
+        """
+        _, beat_times = beat_track(
+            onset_envelope=self.onset_envelope,
+            sr=self.sr,
+            hop_length=self.hop_length,
+            bpm=bpm,
+            units="time",
+        )
+        return beat_times + self.start
+
+    def onset_strengths(self, onset_times: NDArray[float64]) -> NDArray[float32]:
+        """Onset envelope value at each of onset_times"""
+        frames = time_to_frames(onset_times - self.start, sr=self.sr, hop_length=self.hop_length)
+        frames = clip(frames, 0, len(self.onset_envelope) - 1)
+        return self.onset_envelope[frames].astype(float32)
+
+    def onset_times(self) -> NDArray[float64]:
+        onsets = onset_detect(
+            onset_envelope=self.onset_envelope,
+            sr=self.sr,
+            hop_length=self.hop_length,
+            units="time",
+        )
+        return onsets + self.start
 
 
 class LibrosaWrapper(AudioAnalysisWrapper):
-    def __init__(self):
-        pass
-
-    def calculate_bpm(self, path: Path) -> NDArray[float64]:
-        y, sr = load(path)
-        bpm = tempo(y=y, sr=sr)
-        return bpm
-
-    def get_beats(self, path: Path):
-        y, sr = load(path)
-        tempo, _ = beat_track(y=y, sr=sr)
-        return tempo
+    name = "librosa"
+
+    # Resampler used when fast_resample is set, trading a little accuracy for speed
+    FAST_RES_TYPE = "soxr_lq"
+
+    def __init__(
+        self,
+        sample_rate_hz: int = 22050,
+        fast_resample: bool = False,
+        use_cache: bool = True,
+        cache_dir: Optional[Path] = None,
+    ):
+        super().__init__(use_cache, cache_dir)
+        self.sample_rate_hz = sample_rate_hz
+        self.res_type = self.FAST_RES_TYPE if fast_resample else "soxr_hq"
+        self.hop_length = 512
+        self.agreement_bpm = 2.0
+        self.beats_per_measure = 4
+
+    def cache_params(self) -> Dict[str, Any]:
+        return {
+            "sample_rate_hz": self.sample_rate_hz,
+            "res_type": self.res_type,
+            "hop_length": self.hop_length,
+            "agreement_bpm": self.agreement_bpm,
+            "beats_per_measure": self.beats_per_measure,
+        }
+
+    def load(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> LibrosaAudio:
+        """Decode the song once, for callers that need more than tempo and beats"""
+        return LibrosaAudio(
+            path, self.sample_rate_hz, self.res_type, self.hop_length, start, duration
+        )
+
+    def calculate_bpm(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> NDArray[float64]:
+        return array([self.analyze(path, start, duration).bpm])
+
+    def get_beats(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> NDArray[float64]:
+        return self.analyze(path, start, duration).beats["beat_track"]
+
+    def analyze(
+        self, path: Path, start: float = 0.0, duration: Optional[float] = None
+    ) -> TempoAnalysis:
+        """
+        Estimate tempo and beat positions from one decode and one onset envelope.
+
+        Args:
+            path: Path to the audio file
+            start: Seconds into the song to seek to, only the window is decoded
+            duration: Seconds to analyze, None for the rest of the song
+
+        Returns:
+            TempoAnalysis: tempo and beat_track estimates plus their combination
+        """
+        return self.cached_analysis(
+            path, "analyze", lambda: self.__analyze(path, start, duration), start, duration
+        )
+
+    def __analyze(self, path: Path, start: float, duration: Optional[float]) -> TempoAnalysis:
+        audio = self.load(path, start, duration)
+        bpm = audio.tempo()
+        beat_times = audio.beat_track(bpm)
+
+        beat_bpms = intervals_to_bpm(beat_times)
+        beat_bpm = float(beat_bpms.mean()) if beat_bpms.size else 0.0
+        analysis = TempoAnalysis(
+            beats={"beat_track": beat_times},
+            bpms={"tempo": bpm, "beat_track": beat_bpm},
+            bpm=bpm,
+            confidence=most_common_tactus(beat_times).confidence,
+        )
+        analysis.onset_times = audio.onset_times()
+        analysis.onset_strengths = audio.onset_strengths(analysis.onset_times)
+        agreeing = [b for b in analysis.bpms.values() if abs(b - bpm) <= self.agreement_bpm]
+        analysis.agreement = len(agreeing) / len(analysis.bpms)
+        # Same onset envelope the tempo came from, its frames are centered on frame * hop
+        analysis.first_downbeat = find_first_downbeat(
+            audio.onset_envelope,
+            audio.sr / audio.hop_length,
+            bpm,
+            self.beats_per_measure,
+            start,
+        )
+        return analysis
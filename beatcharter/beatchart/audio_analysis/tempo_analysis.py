@@ -0,0 +1,28 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from numpy import empty, float32, float64
+from numpy.typing import NDArray
+
+
+@dataclass
+class TempoAnalysis:
+    """Result of one analysis pass over a song, with one entry per tempo detector"""
+
+    beats: Dict[str, NDArray[float64]] = field(default_factory=dict)  # beat times in seconds
+    onset_times: NDArray[float64] = field(default_factory=lambda: empty(0, dtype=float64))
+    onset_strengths: NDArray[float32] = field(default_factory=lambda: empty(0, dtype=float32))
+    bpms: Dict[str, float] = field(default_factory=dict)
+    confidences: Dict[str, float] = field(default_factory=dict)
+    bpm: float = 0.0  # combined estimate over every detector
+    confidence: float = 0.0
+    agreement: float = 0.0  # fraction of detectors that agree with the combined estimate
+    bpm_segments: List[Tuple[float, float]] = field(default_factory=list)  # (beat, bpm) pairs
+    first_downbeat: float = 0.0  # seconds, beat 0 of the chart, i.e. -#OFFSET
+    backend: str = ""  # name of the backend that produced the result
+
+    def best_beats(self) -> NDArray[float64]:
+        """Beat times of the detector closest to the combined bpm"""
+        if not self.beats:
+            return empty(0, dtype=float64)
+        method = min(self.beats, key=lambda m: abs(self.bpms.get(m, 0.0) - self.bpm))
+        return self.beats[method]
@@ -0,0 +1,146 @@
+"""
+Beat grid phase alignment, used to find the first downbeat and so the chart #OFFSET.
+
+Given the tempo, every possible phase of the beat grid is scored by summing the onset
+envelope under its beats, all phases at once. The strongest beat of the measure is then
+taken as the downbeat.
+
+Analyses keep only their onsets, not the envelope, so the phase can also be found from
+the onsets alone by spreading them back into an envelope first.
+"""
+
+import numpy as np
+from numpy import float32, float64
+from numpy.typing import NDArray
+
+# Frames per second of envelopes rebuilt from onsets
+ONSET_FRAME_RATE = 100.0
+# Frames either side of an onset it is spread over, covering a few ms of timing jitter
+ONSET_SPREAD_FRAMES = 2
+
+
+def grid_strength(
+    envelope: NDArray[float64],
+    frame_rate: float,
+    period: float,
+    phases: NDArray[float64],
+    frame_offset: float = 0.0,
+) -> NDArray[float64]:
+    """
+    Mean envelope value under a grid of period seconds, for each phase.
+
+    Args:
+        envelope: Onset strength, one value per frame
+        frame_rate: Frames per second of the envelope
+        period: Seconds between grid lines
+        phases: Time in seconds of the first grid line, one per candidate
+        frame_offset: Time in seconds of envelope frame 0
+
+    Returns:
+        NDArray: strength of each candidate phase
+    """
+    duration = frame_offset + len(envelope) / frame_rate
+    n_lines = max(int((duration - phases.min()) / period), 1)
+    times = phases[:, None] + np.arange(n_lines)[None, :] * period
+    frames = np.rint((times - frame_offset) * frame_rate).astype(np.int64)
+    valid = (frames >= 0) & (frames < len(envelope))
+    values = np.where(valid, envelope[np.clip(frames, 0, len(envelope) - 1)], 0.0)
+    return values.sum(axis=1) / np.maximum(valid.sum(axis=1), 1)
+
+
+def find_first_downbeat(
+    envelope: NDArray[float64],
+    frame_rate: float,
+    bpm: float,
+    beats_per_measure: int = 4,
+    frame_offset: float = 0.0,
+) -> float:
+    """
+    Find the time of the first downbeat by aligning a beat grid at bpm to the envelope.
+
+    Args:
+        envelope: Onset strength, one value per frame
+        frame_rate: Frames per second of the envelope
+        bpm: Tempo of the grid
+        beats_per_measure: Beats per measure, the downbeat is the strongest of them
+        frame_offset: Time in seconds of envelope frame 0
+
+    Returns:
+        float: Time in seconds of the first downbeat, frame_offset if nothing was found
+    """
+    envelope = np.asarray(envelope, dtype=float64)
+    if bpm <= 0 or len(envelope) == 0:
+        return frame_offset
+
+    beat_period = 60.0 / bpm
+    # Every frame within one beat is a candidate phase
+    phases = frame_offset + np.arange(0.0, beat_period, 1.0 / frame_rate)
+    beat_strength = grid_strength(envelope, frame_rate, beat_period, phases, frame_offset)
+    beat_phase = phases[int(np.argmax(beat_strength))]
+
+    # Choose which beat of the measure is the downbeat
+    measure_phases = beat_phase + np.arange(beats_per_measure) * beat_period
+    measure_strength = grid_strength(
+        envelope, frame_rate, beat_period * beats_per_measure, measure_phases, frame_offset
+    )
+    return float(measure_phases[int(np.argmax(measure_strength))])
+
+
+def onset_envelope(
+    onset_times: NDArray[float64],
+    onset_strengths: NDArray[float32],
+    frame_rate: float = ONSET_FRAME_RATE,
+    frame_offset: float = 0.0,
+) -> NDArray[float64]:
+    """
+    Rebuild an onset envelope from picked onsets, each spread over a few frames.
+
+    Args:
+        onset_times: Onset times in seconds
+        onset_strengths: Strength of each onset
+        frame_rate: Frames per second of the envelope
+        frame_offset: Time in seconds of envelope frame 0
+
+    Returns:
+        NDArray: envelope, one value per frame
+    """
+    onset_times = np.asarray(onset_times, dtype=float64)
+    if len(onset_times) == 0:
+        return np.zeros(0, dtype=float64)
+    frames = np.rint((onset_times - frame_offset) * frame_rate).astype(np.int64)
+    keep = frames >= 0
+    frames = frames[keep]
+    strengths = np.asarray(onset_strengths, dtype=float64)[keep]
+    envelope = np.zeros(int(frames.max(initial=0)) + ONSET_SPREAD_FRAMES + 1, dtype=float64)
+    # Tapered so the frame of the onset itself still scores highest
+    for distance in range(-ONSET_SPREAD_FRAMES, ONSET_SPREAD_FRAMES + 1):
+        weight = 1.0 - abs(distance) / (ONSET_SPREAD_FRAMES + 1)
+        spread = frames + distance
+        inside = spread >= 0
+        np.maximum.at(envelope, spread[inside], strengths[inside] * weight)
+    return envelope
+
+
+def find_first_downbeat_from_onsets(
+    onset_times: NDArray[float64],
+    onset_strengths: NDArray[float32],
+    bpm: float,
+    beats_per_measure: int = 4,
+    start: float = 0.0,
+) -> float:
+    """
+    Find the time of the first downbeat at bpm from an analysis' onsets, e.g. to realign
+    a chart to a tempo other than the one its analysis was phase aligned to.
+
+    Args:
+        onset_times: Onset times in seconds
+        onset_strengths: Strength of each onset
+        bpm: Tempo of the grid
+        beats_per_measure: Beats per measure, the downbeat is the strongest of them
+        start: Time in seconds the analysis started at
+
+    Returns:
+        float: Time in seconds of the first downbeat, start if nothing was found
+    """
+    envelope = onset_envelope(onset_times, onset_strengths, ONSET_FRAME_RATE, start)
+    return find_first_downbeat(envelope, ONSET_FRAME_RATE, bpm, beats_per_measure, start)
@@ -1,8 +1,112 @@
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+from numpy import float32, float64
+
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+
 
 class Beatchart:
+    """
+    Beatchart - the analysis of one song, as handed from the decoder to the builders.
+
+    Every per-beat and per-onset value is held in a contiguous NumPy array, and the whole
+    chart can be checkpointed to an uncompressed .npz and loaded back without decoding the
+    song again.
+    """
+
+    __slots__ = (
+        "name",
+        "file_object",
+        "bpm",
+        "songStartOffsetSeconds",
+        "songEndSeconds",
+        "beat_times",
+        "onset_times",
+        "onset_strengths",
+        "bpm_segments",
+        "downbeat_index",
+    )
+
     def __init__(self, name, file_object, bpm):
         self.name = name
         self.file_object = file_object
         self.bpm = bpm
-        self.songStartOffsetSeconds = 0
-        self.songEndSeconds = 0
+        self.songStartOffsetSeconds = 0.0  # time of the first downbeat, beat 0 of the chart
+        self.songEndSeconds = 0.0
+        self.beat_times = np.empty(0, dtype=float64)  # seconds
+        self.onset_times = np.empty(0, dtype=float64)  # seconds
+        self.onset_strengths = np.empty(0, dtype=float32)  # one per onset
+        # (beat, bpm) rows, more than one for variable tempo
+        self.bpm_segments = np.array([[0.0, bpm]], dtype=float64)
+        self.downbeat_index = 0  # index into beat_times of the first downbeat
+
+    @property
+    def bpms(self) -> List[Tuple[float, float]]:
+        """bpm_segments as (beat, bpm) pairs, as written to #BPMS"""
+        return [(float(beat), float(bpm)) for beat, bpm in self.bpm_segments]
+
+    @bpms.setter
+    def bpms(self, bpms: List[Tuple[float, float]]) -> None:
+        self.bpm_segments = np.asarray(bpms, dtype=float64).reshape(-1, 2)
+
+    @property
+    def offset(self):
+        """#OFFSET of the chart, StepMania counts it backwards from beat 0"""
+        return -self.songStartOffsetSeconds
+
+    def set_analysis(self, analysis: TempoAnalysis) -> None:
+        """Take the beats, onsets and first downbeat of an analysis pass"""
+        self.beat_times = np.ascontiguousarray(analysis.best_beats(), dtype=float64)
+        self.onset_times = np.ascontiguousarray(analysis.onset_times, dtype=float64)
+        self.onset_strengths = np.ascontiguousarray(analysis.onset_strengths, dtype=float32)
+        self.songStartOffsetSeconds = analysis.first_downbeat
+        # Detected beats are a few milliseconds either side of the aligned grid
+        self.downbeat_index = int(
+            np.searchsorted(self.beat_times, analysis.first_downbeat - 0.05)
+        )
+        if len(self.onset_times):
+            self.songEndSeconds = float(self.onset_times[-1])
+
+    def save(self, path: Path) -> Path:
+        """
+        Checkpoint the chart to an uncompressed .npz.
+
+        Args:
+            path: File to write, .npz is appended by NumPy if missing
+
+        Returns:
+            Path: the file written
+        """
+        path = Path(path)
+        if path.suffix != ".npz":
+            path = path.with_name(path.name + ".npz")
+        np.savez(
+            path,
+            name=np.array(str(self.name)),
+            file_object=np.array(str(self.file_object)),
+            bpm=np.array(self.bpm, dtype=float64),
+            song_start_offset_seconds=np.array(self.songStartOffsetSeconds, dtype=float64),
+            song_end_seconds=np.array(self.songEndSeconds, dtype=float64),
+            beat_times=self.beat_times,
+            onset_times=self.onset_times,
+            onset_strengths=self.onset_strengths,
+            bpm_segments=self.bpm_segments,
+            downbeat_index=np.array(self.downbeat_index),
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "Beatchart":
+        """Load a chart written by save"""
+        with np.load(path, allow_pickle=False) as data:
+            chart = cls(str(data["name"]), str(data["file_object"]), float(data["bpm"]))
+            chart.songStartOffsetSeconds = float(data["song_start_offset_seconds"])
+            chart.songEndSeconds = float(data["song_end_seconds"])
+            chart.beat_times = data["beat_times"]
+            chart.onset_times = data["onset_times"]
+            chart.onset_strengths = data["onset_strengths"]
+            chart.bpm_segments = data["bpm_segments"]
+            chart.downbeat_index = int(data["downbeat_index"])
+        return chart
@@ -1,5 +1,11 @@
-from beatchart.aubio_wrapper import AubioWrapper
-from beatchart.beatchart import Beatchart
+from math import isclose
+from pathlib import Path
+from typing import Optional
+
+from beatcharter.beatchart.audio_analysis.analysis_cache import AnalysisCache
+from beatcharter.beatchart.audio_analysis.backends import create_backend
+from beatcharter.beatchart.beat_phase import find_first_downbeat_from_onsets
+from beatcharter.beatchart.beatchart import Beatchart
 
 class BeatchartDecoder:
 
@@ -7,14 +13,62 @@ class BeatchartDecoder:
      BeatchartDecoder - perform decoding of beats and audio to generate an object that can be handled by the StepBuilder
     """
 
-    def __init__(self):
-        self.wrapper = AubioWrapper()
+    def __init__(self, backend: str = "cascade", **backend_kwargs):
+        """
+        Args:
+            backend: Analysis backend name, see audio_analysis.backends. The default cascade
+                runs aubio and falls back to librosa only for songs aubio is unsure of.
+            backend_kwargs: Passed to the backend, e.g. min_confidence for the cascade
+        """
+        self.wrapper = create_backend(backend, **backend_kwargs)
+        # Remembers song hashes for the encoders, only where the backend caches its analysis
+        self.cache = (
+            AnalysisCache(backend_kwargs.get("cache_dir"))
+            if backend_kwargs.get("use_cache", True)
+            else None
+        )
 
-    def decode_song(self, song_file, bpm):
+    def decode_song(
+        self,
+        song_file,
+        bpm,
+        variable_tempo: bool = False,
+        start: float = 0.0,
+        duration: Optional[float] = None,
+    ):
+        """
+        Args:
+            song_file: Path to the audio file
+            bpm: Manual bpm, or 0 to detect it. Beats and onsets are detected either way
+                and #OFFSET is aligned to whichever bpm is used.
+            variable_tempo: Detect tempo changes and fill Beatchart.bpms with every segment,
+                from the beats of the same analysis pass
+            start: Seconds into the song to start analyzing at
+            duration: Seconds to analyze, None for the rest of the song. Only this window
+                of the song is decoded.
+        """
+        # One decode serves the tempo, the beats, the onsets and the tempo map
+        analysis = self.wrapper.analyze(song_file, start=start, duration=duration)
         if bpm == 0:
-            bpm = self.wrapper.calculate_bpm(song_file)
+            bpm = analysis.bpm
+            bpms = [(0.0, bpm)]
+            if variable_tempo:
+                tempo_map = self.wrapper.tempo_map(analysis, start=start)
+                if tempo_map.bpm_segments:
+                    bpm, bpms = tempo_map.bpm, tempo_map.bpm_segments
+                    analysis.first_downbeat = tempo_map.first_downbeat
+        else:
+            bpms = [(0.0, bpm)]
+            if not isclose(bpm, analysis.bpm, abs_tol=0.01):
+                # The analysis phase aligned its own tempo, align the one the chart uses
+                analysis.first_downbeat = find_first_downbeat_from_onsets(
+                    analysis.onset_times, analysis.onset_strengths, bpm, start=start
+                )
 
-        return Beatchart(song_file, bpm)
+        chart = Beatchart(Path(song_file).stem, song_file, bpm)
+        chart.set_analysis(analysis)
+        chart.bpms = bpms
+        return chart
 
     """
      * Regarding methods of finding BPM
@@ -42,4 +96,4 @@ class BeatchartDecoder:
      */
     """
     def calculate_bpm(self, song_file):
-        return self.wrapper.find_bpm(song_file)
+        return self.wrapper.calculate_bpm(song_file)
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from beatcharter.beatchart.audio_analysis.backends import create_backend
+from stepchart_utils.chart_parser import ChartParser
+from stepchart_utils.common_parser import find_audio_file
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Per worker process analysis wrapper, created once by _init_worker
+_wrapper = None
+
+
+def _init_worker(backend: str) -> None:
+    global _wrapper
+    _wrapper = create_backend(backend)
+
+
+def analyze_song(
+    song_dir: Path, audio_file: Path, start: float = 0.0, duration: Optional[float] = None
+) -> Dict[str, Any]:
+    """Analyze a single song in a worker process and return its JSONL record"""
+    record = {"song_dir": str(song_dir), "audio_file": str(audio_file), "backend": _wrapper.name}
+    if start or duration is not None:
+        record.update(start=start, duration=duration)
+    started = time.perf_counter()
+    try:
+        analysis = _wrapper.analyze(audio_file, start=start, duration=duration)
+        record.update(
+            bpm=analysis.bpm,
+            confidence=analysis.confidence,
+            agreement=analysis.agreement,
+            bpms=analysis.bpms,
+            analyzed_by=analysis.backend,
+        )
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def find_songs(
+    songs_dir: Path, chart_parser: ChartParser
+) -> Iterator[tuple[Path, Path, Path]]:
+    """Yield (song_dir, chart_file, audio_file) for each song directory holding a chart file"""
+    seen: Set[Path] = set()
+    for chart_file in chart_parser.get_chart_files_from_directory(songs_dir):
+        song_dir = chart_file.parent
+        if song_dir in seen:
+            continue
+        seen.add(song_dir)
+
+        audio_file = find_audio_file(song_dir)
+        if audio_file is None:
+            logger.warning(f"No audio file found in {song_dir}, skipping")
+            continue
+        yield song_dir, chart_file, audio_file
+
+
+def end_partial_line(output: Path) -> None:
+    """End a partially written last line, so records appended after it stay readable"""
+    if not output.exists() or output.stat().st_size == 0:
+        return
+    with open(output, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+# A song analyzed with one backend and window says nothing about another
+ResumeKey = Tuple[str, str, float, Optional[float]]
+
+
+def resume_key(
+    song_dir: Path, backend: str, start: float = 0.0, duration: Optional[float] = None
+) -> ResumeKey:
+    return (str(song_dir), backend, float(start), float(duration) if duration is not None else None)
+
+
+def read_finished_songs(output: Path) -> Set[ResumeKey]:
+    """Return the resume keys of the songs already recorded without error in a JSONL output"""
+    finished = set()
+    if not output.exists():
+        return finished
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if "error" not in record:
+                finished.add(
+                    resume_key(
+                        record["song_dir"],
+                        record["backend"],
+                        record.get("start", 0.0),
+                        record.get("duration"),
+                    )
+                )
+    return finished
+
+
+def analyze_library(
+    songs_dir: Path,
+    output: Path,
+    chart_parser: ChartParser,
+    backend: str = "aubio",
+    workers: Optional[int] = None,
+    resume: bool = False,
+    start: float = 0.0,
+    duration: Optional[float] = None,
+    use_sample_start: bool = False,
+) -> int:
+    """
+    Analyze the BPM of every song in a StepMania Songs tree on a process pool.
+
+    Results are appended to output as one JSON object per line as soon as each song
+    finishes, so an interrupted run keeps all finished work. Only a few songs per worker
+    are in flight at once, which keeps memory flat however large the library is.
+
+    Args:
+        songs_dir: Path to the Songs directory
+        output: JSONL file to write results to
+        chart_parser: ChartParser instance used to find chart files
+        backend: Analysis backend name, see audio_analysis.backends
+        workers: Number of worker processes, defaults to the number of CPUs
+        resume: If True, skip songs already recorded in output with the same backend,
+            start and duration
+        start: Seconds into each song to start analyzing at
+        duration: Seconds of each song to analyze, None for the whole song
+        use_sample_start: Start at each chart's #SAMPLESTART instead of start
+
+    Returns:
+        int: Number of songs analyzed
+    """
+    finished = read_finished_songs(output) if resume else set()
+    if finished:
+        logger.info(f"Resuming, {len(finished)} songs already analyzed in {output}")
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    if resume:
+        end_partial_line(output)
+    analyzed = 0
+    with open(output, "a" if resume else "w", encoding="utf-8") as writer, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(backend,)
+    ) as executor:
+        in_flight: Set[Future] = set()
+
+        def drain() -> None:
+            nonlocal analyzed, in_flight
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                writer.write(json.dumps(record) + "\n")
+                writer.flush()
+                analyzed += 1
+                if "error" in record:
+                    logger.error(f"Error analyzing {record['audio_file']}: {record['error']}")
+                else:
+                    logger.info(f"{record['bpm']:7.2f} bpm  {record['song_dir']}")
+
+        for song_dir, chart_file, audio_file in find_songs(songs_dir, chart_parser):
+            song_start = start
+            if use_sample_start:
+                try:
+                    song_start = chart_parser.parse_file(chart_file).chart_file.sample_start
+                except Exception as e:
+                    logger.warning(f"Could not read #SAMPLESTART from {chart_file}: {e}")
+            if resume_key(song_dir, backend, song_start, duration) in finished:
+                continue
+            in_flight.add(
+                executor.submit(analyze_song, song_dir, audio_file, song_start, duration)
+            )
+            if len(in_flight) >= max_in_flight:
+                drain()
+
+        while in_flight:
+            drain()
+
+    return analyzed
@@ -0,0 +1,160 @@
+"""
+Vectorized port of the SubtatumMap/SubtatumCount tempo-octave folding.
+
+The Java version added one subtatum at a time, scanning a list of ranges and re-sorting it
+on every insertion. Here every inter-onset interval is converted, folded and counted in a
+handful of NumPy passes, so hours of onsets cost a few milliseconds.
+
+See BeatchartDecoder for the background on tactus, tatum and sub-tatum.
+"""
+
+from dataclasses import dataclass
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+from numpy import float64, int64
+from numpy.typing import NDArray
+
+ALLOWED_RANGE = 1.0
+COMMON_RANGE_MIN = 80.0
+COMMON_RANGE_MAX = 200.0
+
+# Histogram resolution, in bpm. Counts are taken over a sliding window of +/- ALLOWED_RANGE
+RESOLUTION = 0.01
+
+
+@dataclass
+class Tactus:
+    bpm: float = 0.0
+    confidence: float = 0.0  # fraction of intervals within +/- allowed_range of bpm
+    count: int = 0
+
+
+def intervals_to_bpm(
+    beat_times: Union[NDArray[float64], Sequence[float]], units_per_second: float = 1.0
+) -> NDArray[float64]:
+    """
+    Convert beat or onset times to the bpm of each inter-onset interval.
+
+    60 (seconds / minute) / interval (seconds / beat) = BPM (beats / minute)
+
+    Args:
+        beat_times: Beat times, in any order
+        units_per_second: 1.0 for times in seconds, 1000.0 for milliseconds
+
+    Returns:
+        NDArray: bpm of every non-zero interval
+    """
+    times = np.sort(np.asarray(beat_times, dtype=float64))
+    intervals = np.diff(times) / units_per_second
+    intervals = intervals[intervals > 0]
+    return 60.0 / intervals
+
+
+def fold_to_common_range(
+    bpms: NDArray[float64],
+    common_range_min: float = COMMON_RANGE_MIN,
+    common_range_max: float = COMMON_RANGE_MAX,
+) -> NDArray[float64]:
+    """
+    Move each bpm into the common range by powers of two.
+
+    Ex: subtatum of 860 lies outside of range.
+        860 / 2 = 430, lies outside of range
+        430 / 2 = 215, lies outside of common range
+        215 / 2 = 107.5 lies within common range
+    """
+    bpms = np.asarray(bpms, dtype=float64)
+    bpms = bpms[np.isfinite(bpms) & (bpms > 0)]
+    exponents = np.zeros(bpms.shape, dtype=float64)
+
+    below = bpms < common_range_min
+    exponents[below] = np.ceil(np.log2(common_range_min / bpms[below]))
+    above = bpms > common_range_max
+    exponents[above] = -np.ceil(np.log2(bpms[above] / common_range_max))
+
+    return np.ldexp(bpms, exponents.astype(int64))
+
+
+def bpm_histogram(
+    bpms: NDArray[float64],
+    allowed_range: float = ALLOWED_RANGE,
+    range_min: float = COMMON_RANGE_MIN,
+    range_max: float = COMMON_RANGE_MAX,
+    resolution: float = RESOLUTION,
+) -> Tuple[NDArray[float64], NDArray[int64]]:
+    """
+    Count, for every candidate bpm between range_min and range_max, how many bpms lie
+    within +/- allowed_range of it. This is the sliding equivalent of the Java bins, which
+    were centered on whichever subtatum happened to arrive first.
+
+    Returns:
+        (centers, counts): candidate bpms and the number of bpms within range of each
+    """
+    bpms = np.asarray(bpms, dtype=float64)
+    bpms = bpms[(bpms >= range_min) & (bpms <= range_max)]
+    n_bins = int(round((range_max - range_min) / resolution)) + 1
+    centers = range_min + np.arange(n_bins) * resolution
+
+    indices = np.rint((bpms - range_min) / resolution).astype(int64)
+    counts = np.bincount(indices, minlength=n_bins)
+
+    half_width = int(round(allowed_range / resolution))
+    cumulative = np.concatenate(([0], np.cumsum(counts)))
+    lower = np.clip(np.arange(n_bins) - half_width, 0, n_bins)
+    upper = np.clip(np.arange(n_bins) + half_width + 1, 0, n_bins)
+    return centers, cumulative[upper] - cumulative[lower]
+
+
+def most_common_in_range(
+    bpms: NDArray[float64],
+    allowed_range: float = ALLOWED_RANGE,
+    range_min: float = COMMON_RANGE_MIN,
+    range_max: float = COMMON_RANGE_MAX,
+) -> Tactus:
+    """
+    Pick the histogram peak and refine it to the mean of the bpms within its window.
+    """
+    bpms = np.asarray(bpms, dtype=float64)
+    if bpms.size == 0:
+        return Tactus()
+
+    centers, counts = bpm_histogram(bpms, allowed_range, range_min, range_max)
+    peak = int(np.argmax(counts))
+    if counts[peak] == 0:
+        return Tactus()
+
+    # Match the histogram, which rounds each bpm to the nearest bin before counting
+    in_window = np.abs(bpms - centers[peak]) <= allowed_range + RESOLUTION / 2
+    return Tactus(
+        bpm=float(np.mean(bpms[in_window])),
+        confidence=float(counts[peak] / bpms.size),
+        count=int(counts[peak]),
+    )
+
+
+def most_common_tactus(
+    beat_times: Union[NDArray[float64], Sequence[float]],
+    units_per_second: float = 1.0,
+    allowed_range: float = ALLOWED_RANGE,
+    common_range_min: float = COMMON_RANGE_MIN,
+    common_range_max: float = COMMON_RANGE_MAX,
+) -> Tactus:
+    """
+    Find the most common tactus of a list of beat or onset times, after folding every
+    inter-onset interval into the common range.
+
+    Args:
+        beat_times: Beat or onset times, e.g. the beat lists returned by AubioWrapper
+        units_per_second: 1.0 for times in seconds, 1000.0 for milliseconds
+        allowed_range: Half width of a bin, in bpm
+        common_range_min: Lowest bpm of the common range
+        common_range_max: Highest bpm of the common range
+
+    Returns:
+        Tactus: the most common folded bpm and the fraction of intervals supporting it
+    """
+    bpms = fold_to_common_range(
+        intervals_to_bpm(beat_times, units_per_second), common_range_min, common_range_max
+    )
+    return most_common_in_range(bpms, allowed_range, common_range_min, common_range_max)
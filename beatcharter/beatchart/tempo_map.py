@@ -0,0 +1,173 @@
+"""
+Variable tempo BPM map extraction.
+
+Beat times are consumed one at a time, in order. The local tempo is
+estimated over overlapping windows and a new BPM segment is started once the local tempo
+has moved away from the current segment for several windows in a row. Only the beats of
+the current window, plus a few steps used to locate a change, are held, so memory does not
+grow with the length of the song.
+"""
+
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+import numpy as np
+
+from beatcharter.beatchart.subtatum_map import fold_to_common_range, most_common_tactus
+
+
+class TempoMapBuilder:
+    def __init__(
+        self,
+        window_seconds: float = 8.0,
+        step_seconds: float = 2.0,
+        change_threshold_bpm: float = 2.0,
+        confirm_windows: int = 3,
+        min_confidence: float = 0.3,
+        start_time: float = 0.0,
+    ):
+        """
+        Args:
+            window_seconds: Length of each tempo estimation window
+            step_seconds: Distance between the starts of consecutive windows
+            change_threshold_bpm: Local tempo difference that counts as a tempo change
+            confirm_windows: Consecutive differing windows needed to start a new segment
+            min_confidence: Windows with a less certain tactus are ignored
+            start_time: Time in seconds of beat 0, i.e. -#OFFSET
+        """
+        self.window_seconds = window_seconds
+        self.step_seconds = step_seconds
+        self.change_threshold_bpm = change_threshold_bpm
+        self.confirm_windows = confirm_windows
+        self.min_confidence = min_confidence
+        self.start_time = start_time
+
+        self._beats: Deque[float] = deque()
+        self._next_window_end = start_time + window_seconds
+
+        # (start time, start beat, bpm) of each closed segment
+        self._segments: List[Tuple[float, float, float]] = []
+        self._segment_start_time = start_time
+        self._segment_start_beat = 0.0
+        self._segment_bpm_sum = 0.0
+        self._segment_windows = 0
+        # Windows that disagree with the current segment, as (center time, bpm)
+        self._pending: List[Tuple[float, float]] = []
+        # bpm of the longest segment, set by finish
+        self.main_bpm = 0.0
+
+    @property
+    def segment_bpm(self) -> float:
+        if self._segment_windows == 0:
+            return 0.0
+        return self._segment_bpm_sum / self._segment_windows
+
+    def add_beat(self, beat_time: float) -> None:
+        """Feed the next detected beat, in seconds. Beats must arrive in order."""
+        while beat_time >= self._next_window_end:
+            self._close_window(self._next_window_end)
+            self._next_window_end += self.step_seconds
+        self._beats.append(beat_time)
+
+    def finish(self) -> List[Tuple[float, float]]:
+        """
+        Close the last window and return the BPM map.
+
+        Returns:
+            List[Tuple[float, float]]: (beat, bpm) pairs, as written to #BPMS
+        """
+        if self._beats:
+            self._close_window(self._beats[-1])
+        self._accept_pending()
+        if self._segment_windows:
+            self._segments.append(
+                (self._segment_start_time, self._segment_start_beat, self.segment_bpm)
+            )
+
+        if self._segments:
+            end_time = self._beats[-1] if self._beats else self._segments[-1][0]
+            ends = [start for start, _, _ in self._segments[1:]] + [end_time]
+            durations = [end - start for end, (start, _, _) in zip(ends, self._segments)]
+            self.main_bpm = self._segments[int(np.argmax(durations))][2]
+        return [(beat, bpm) for _, beat, bpm in self._segments]
+
+    def _close_window(self, window_end: float) -> None:
+        # Beats are kept a few steps past the window so a confirmed change can be located
+        retain_start = window_end - self.window_seconds - self.confirm_windows * self.step_seconds
+        while self._beats and self._beats[0] < retain_start:
+            self._beats.popleft()
+
+        beats = np.fromiter(self._beats, dtype=float, count=len(self._beats))
+        beats = beats[beats >= window_end - self.window_seconds]
+        if len(beats) < 4:
+            return
+
+        tactus = most_common_tactus(beats)
+        if tactus.bpm == 0 or tactus.confidence < self.min_confidence:
+            return
+
+        window_center = window_end - self.window_seconds / 2
+        if (
+            self._segment_windows == 0
+            or abs(tactus.bpm - self.segment_bpm) <= self.change_threshold_bpm
+        ):
+            self._accept_pending()
+            self._segment_bpm_sum += tactus.bpm
+            self._segment_windows += 1
+            return
+
+        self._pending.append((window_center, tactus.bpm))
+        pending_bpms = [bpm for _, bpm in self._pending]
+        if len(self._pending) >= self.confirm_windows and (
+            max(pending_bpms) - min(pending_bpms) <= 2 * self.change_threshold_bpm
+        ):
+            self._start_segment(self._locate_change(self._pending[0][0]), pending_bpms)
+        elif len(self._pending) >= self.confirm_windows:
+            # The disagreeing windows don't agree with each other either, keep looking
+            self._pending.pop(0)
+
+    def _locate_change(self, first_window_center: float) -> float:
+        """
+        Return the time of the beat that ends the last interval still at the old tempo, or
+        the center of the first disagreeing window if the retained beats don't show one.
+        """
+        beats = np.fromiter(self._beats, dtype=float, count=len(self._beats))
+        if len(beats) < 2:
+            return first_window_center
+
+        intervals = np.diff(beats)
+        bpms = fold_to_common_range(60.0 / np.maximum(intervals, 1e-6))
+        old_tempo = np.flatnonzero(np.abs(bpms - self.segment_bpm) <= self.change_threshold_bpm)
+        if old_tempo.size == 0:
+            return first_window_center
+        return float(beats[old_tempo[-1] + 1])
+
+    def _accept_pending(self) -> None:
+        # A short excursion that never confirmed belongs to the current segment
+        self._pending.clear()
+
+    def _start_segment(self, change_time: float, bpms: List[float]) -> None:
+        bpm = self.segment_bpm
+        # Tempo changes land on a beat of the previous segment
+        beat = self._segment_start_beat + round(
+            (change_time - self._segment_start_time) * bpm / 60.0
+        )
+        beat = max(beat, self._segment_start_beat + 1)
+        time = self._segment_start_time + (beat - self._segment_start_beat) * 60.0 / bpm
+
+        self._segments.append((self._segment_start_time, self._segment_start_beat, bpm))
+        self._segment_start_time = time
+        self._segment_start_beat = float(beat)
+        self._segment_bpm_sum = sum(bpms)
+        self._segment_windows = len(bpms)
+        self._pending.clear()
+
+
+def build_tempo_map(
+    beat_times, start_time: float = 0.0, builder: Optional[TempoMapBuilder] = None
+) -> List[Tuple[float, float]]:
+    """Convenience wrapper to build a BPM map from an iterable of beat times"""
+    builder = builder or TempoMapBuilder(start_time=start_time)
+    for beat_time in beat_times:
+        builder.add_beat(beat_time)
+    return builder.finish()
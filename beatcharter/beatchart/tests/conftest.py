@@ -7,13 +7,19 @@ from beatcharter.beatchart.audio_analysis.aubio_wrapper import AubioWrapper
 logging.basicConfig(level=logging.DEBUG)
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep every cache a test creates out of the developer's ~/.cache/beatcharter"""
+    monkeypatch.setenv("BEATCHARTER_CACHE_DIR", str(tmp_path / "beatcharter_cache"))
+
+
 @pytest.fixture
 def aubio_wrapper():
-    """Fixture that yields a mocked AubioWrapper instance"""
-    yield AubioWrapper()
+    """Fixture that yields an uncached AubioWrapper instance, so detection always runs"""
+    yield AubioWrapper(use_cache=False)
 
 
 @pytest.fixture
 def librosa_wrapper():
-    """Fixture that yields a mocked LibrosaWrapper instance"""
-    yield LibrosaWrapper()
+    """Fixture that yields an uncached LibrosaWrapper instance, so detection always runs"""
+    yield LibrosaWrapper(use_cache=False)
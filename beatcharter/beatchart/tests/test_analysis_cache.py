@@ -0,0 +1,106 @@
+import pathlib
+import sqlite3
+from contextlib import closing
+
+from numpy import array, float64
+from numpy.testing import assert_array_equal
+import pytest
+
+from beatcharter.beatchart.audio_analysis import analysis_cache
+from beatcharter.beatchart.audio_analysis.analysis_cache import AnalysisCache
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+
+
+@pytest.fixture
+def cache(tmp_path: pathlib.Path):
+    yield AnalysisCache(tmp_path / "cache")
+
+
+@pytest.fixture
+def audio_file(tmp_path: pathlib.Path):
+    path = tmp_path / "song.mp3"
+    path.write_bytes(b"not really audio")
+    yield path
+
+
+def make_analysis(bpm: float) -> TempoAnalysis:
+    return TempoAnalysis(
+        beats={"default": array([0.5, 1.0, 1.5], dtype=float64)},
+        bpms={"default": bpm},
+        confidences={"default": 0.5},
+        bpm=bpm,
+        confidence=0.5,
+        agreement=1.0,
+    )
+
+
+def test_round_trip(cache: AnalysisCache, audio_file: pathlib.Path):
+    params = {"hop_size": 256}
+    assert cache.get(audio_file, "aubio", params) is None
+
+    cache.put(audio_file, "aubio", params, make_analysis(120.0))
+    analysis = cache.get(audio_file, "aubio", params)
+
+    assert analysis.bpm == 120.0
+    assert analysis.bpms == {"default": 120.0}
+    assert_array_equal(analysis.beats["default"], [0.5, 1.0, 1.5])
+
+
+def test_key_includes_backend_and_params(cache: AnalysisCache, audio_file: pathlib.Path):
+    cache.put(audio_file, "aubio", {"hop_size": 256}, make_analysis(120.0))
+
+    assert cache.get(audio_file, "librosa", {"hop_size": 256}) is None
+    assert cache.get(audio_file, "aubio", {"hop_size": 512}) is None
+
+
+def test_key_follows_audio_content(cache: AnalysisCache, audio_file: pathlib.Path):
+    cache.put(audio_file, "aubio", {}, make_analysis(120.0))
+
+    copy = audio_file.with_name("renamed.mp3")
+    copy.write_bytes(audio_file.read_bytes())
+    assert cache.get(copy, "aubio", {}).bpm == 120.0
+
+    audio_file.write_bytes(b"different audio")
+    assert cache.get(audio_file, "aubio", {}) is None
+
+
+def test_key_includes_format_version(
+    cache: AnalysisCache, audio_file: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+):
+    cache.put(audio_file, "aubio", {}, make_analysis(120.0))
+    monkeypatch.setattr(analysis_cache, "FORMAT_VERSION", analysis_cache.FORMAT_VERSION + 1)
+    assert cache.get(audio_file, "aubio", {}) is None
+
+
+def test_unreadable_entries_are_misses(cache: AnalysisCache, audio_file: pathlib.Path):
+    cache.put(audio_file, "aubio", {}, make_analysis(120.0))
+    # Fields another version of TempoAnalysis had
+    with closing(sqlite3.connect(cache.db_path)) as connection, connection:
+        connection.execute("UPDATE analysis SET result = '{\"tempo\": 120.0}'")
+    assert cache.get(audio_file, "aubio", {}) is None
+
+    cache.put(audio_file, "aubio", {}, make_analysis(121.0))
+    assert cache.get(audio_file, "aubio", {}).bpm == 121.0
+
+
+def test_invalidate(cache: AnalysisCache, audio_file: pathlib.Path):
+    cache.put(audio_file, "aubio", {}, make_analysis(120.0))
+    cache.put(audio_file, "librosa", {}, make_analysis(121.0))
+
+    assert cache.invalidate(audio_file) == 2
+    assert cache.get(audio_file, "aubio", {}) is None
+
+
+def test_evicts_least_recently_used(tmp_path: pathlib.Path, audio_file: pathlib.Path):
+    cache = AnalysisCache(tmp_path / "cache")
+    cache.put(audio_file, "aubio", {"n": 0}, make_analysis(120.0))
+    entry_size = cache.stats()["size"]
+    cache.max_bytes = entry_size * 2
+
+    cache.put(audio_file, "aubio", {"n": 1}, make_analysis(120.0))
+    cache.get(audio_file, "aubio", {"n": 0})
+    cache.put(audio_file, "aubio", {"n": 2}, make_analysis(120.0))
+
+    assert cache.stats()["entries"] == 2
+    assert cache.get(audio_file, "aubio", {"n": 0}) is not None
+    assert cache.get(audio_file, "aubio", {"n": 1}) is None
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from beatcharter.beatchart.beat_phase import find_first_downbeat, find_first_downbeat_from_onsets
+
+FRAME_RATE = 100.0
+
+
+def click_envelope(bpm, first_beat, seconds=30.0, accent=2.0, beats_per_measure=4):
+    """Envelope with a pulse on every beat, the first beat of each measure accented"""
+    envelope = np.full(int(seconds * FRAME_RATE), 0.05)
+    beat_times = np.arange(first_beat, seconds, 60.0 / bpm)
+    frames = np.rint(beat_times * FRAME_RATE).astype(int)
+    envelope[frames] = 1.0
+    envelope[frames[::beats_per_measure]] = accent
+    return envelope
+
+
+def test_finds_first_accented_beat():
+    envelope = click_envelope(120, first_beat=0.73)
+    assert find_first_downbeat(envelope, FRAME_RATE, 120) == pytest.approx(0.73, abs=0.011)
+
+
+def test_downbeat_is_strongest_beat_of_measure():
+    # Pickup of three beats before the first accent
+    envelope = click_envelope(100, first_beat=2.2)
+    envelope[np.rint(np.array([0.4, 1.0, 1.6]) * FRAME_RATE).astype(int)] = 1.0
+    first_downbeat = find_first_downbeat(envelope, FRAME_RATE, 100)
+    # The grid may start a whole measure early, but lands on the accented beat
+    measure = 4 * 60.0 / 100
+    assert (first_downbeat - 2.2) / measure == pytest.approx(
+        round((first_downbeat - 2.2) / measure), abs=0.01
+    )
+    assert first_downbeat < measure
+
+
+def test_frame_offset_shifts_result():
+    envelope = click_envelope(150, first_beat=0.5)
+    assert find_first_downbeat(envelope, FRAME_RATE, 150, frame_offset=30.0) == pytest.approx(
+        30.5, abs=0.011
+    )
+
+
+def test_empty_envelope_falls_back_to_offset():
+    assert find_first_downbeat(np.array([]), FRAME_RATE, 120, frame_offset=4.0) == 4.0
+    assert find_first_downbeat(np.ones(100), FRAME_RATE, 0) == 0.0
+
+
+def test_downbeat_from_onsets_alone():
+    # Onsets a few ms off the grid, the first beat of each measure accented, with weaker
+    # off-beat onsets between
+    rng = np.random.default_rng(3)
+    beat_times = np.arange(1.37, 30.0, 60.0 / 128)
+    beat_strengths = np.where(np.arange(beat_times.size) % 4 == 0, 1.0, 0.6)
+    onset_times = np.concatenate(
+        (beat_times + rng.normal(0, 0.004, beat_times.size), beat_times + 0.2)
+    )
+    onset_strengths = np.concatenate((beat_strengths, np.full(beat_times.size, 0.2)))
+    order = np.argsort(onset_times)
+
+    first_downbeat = find_first_downbeat_from_onsets(
+        onset_times[order], onset_strengths[order], 128, start=0.5
+    )
+    assert first_downbeat == pytest.approx(1.37, abs=0.02)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+from beatcharter.beatchart.beatchart import Beatchart
+
+
+@pytest.fixture
+def chart():
+    chart = Beatchart("song", "samples/song.mp3", 120.0)
+    chart.set_analysis(
+        TempoAnalysis(
+            beats={"default": np.arange(0.25, 60, 0.5), "hfc": np.arange(0.25, 60, 0.25)},
+            bpms={"default": 120.0, "hfc": 240.0},
+            bpm=120.0,
+            onset_times=np.arange(0.25, 60, 0.125),
+            onset_strengths=np.linspace(0, 1, 479, dtype=np.float32),
+            first_downbeat=1.25,
+        )
+    )
+    chart.bpms = [(0.0, 120.0), (64.0, 140.0)]
+    return chart
+
+
+def test_analysis_is_held_in_arrays(chart):
+    assert chart.beat_times.dtype == np.float64 and len(chart.beat_times) == 120
+    assert chart.beat_times[chart.downbeat_index] == pytest.approx(1.25)
+    assert chart.offset == pytest.approx(-1.25)
+    assert chart.bpm_segments.shape == (2, 2)
+    assert chart.bpms == [(0.0, 120.0), (64.0, 140.0)]
+    with pytest.raises(AttributeError):
+        chart.notes = []
+
+
+def test_save_and_load_round_trip(chart, tmp_path):
+    path = chart.save(tmp_path / "song")
+    assert path.name == "song.npz"
+
+    loaded = Beatchart.load(path)
+    assert loaded.name == "song"
+    assert loaded.file_object == "samples/song.mp3"
+    assert loaded.bpm == 120.0
+    assert loaded.songStartOffsetSeconds == pytest.approx(1.25)
+    assert loaded.downbeat_index == chart.downbeat_index
+    for name in ("beat_times", "onset_times", "onset_strengths", "bpm_segments"):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(chart, name))
+        assert getattr(loaded, name).dtype == getattr(chart, name).dtype
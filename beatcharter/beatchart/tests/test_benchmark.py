@@ -0,0 +1,76 @@
+import pytest
+import soundfile
+
+from beatcharter.beatchart.audio_analysis import benchmark
+from beatcharter.beatchart.audio_analysis.aubio_wrapper import AubioWrapper
+from beatcharter.beatchart.audio_analysis.benchmark import (
+    compare_reports,
+    octave_error,
+    synthesize_click_track,
+)
+
+
+def test_click_track_has_known_tempo(tmp_path):
+    path = synthesize_click_track(tmp_path / "click.wav", 128.0, seconds=20.0)
+    assert soundfile.info(str(path)).duration == pytest.approx(20.0)
+
+    analysis = AubioWrapper(use_cache=False).analyze(path)
+    assert analysis.bpm == pytest.approx(128.0, abs=2.0)
+
+
+def test_octave_error_allows_half_and_double_tempo():
+    assert octave_error(146.0, 72.0) == pytest.approx(1.0)
+    assert octave_error(60.0, 120.0) == pytest.approx(0.0)
+    assert octave_error(118.0, 120.0) == pytest.approx(2.0)
+
+
+def result(case, realtime_factor=0.05, peak_rss_mb=60.0, octave_error=0.5, **kwargs):
+    return dict(
+        backend="aubio",
+        case=case,
+        realtime_factor=realtime_factor,
+        peak_rss_mb=peak_rss_mb,
+        octave_error=octave_error,
+        bpm=120.0,
+        expected_bpm=120.0,
+        **kwargs,
+    )
+
+
+def test_compare_reports_flags_regressions():
+    baseline = {"results": [result("a"), result("b"), result("c"), result("d")]}
+    report = {
+        "results": [
+            result("a", realtime_factor=0.055),  # within tolerance
+            result("b", realtime_factor=0.1, peak_rss_mb=100.0),
+            result("c", octave_error=2.0),
+            {"backend": "aubio", "case": "d", "error": "RuntimeError: boom"},
+            result("new"),  # not in the baseline
+        ]
+    }
+    regressions = compare_reports(report, baseline)
+    assert len(regressions) == 4
+    assert [r.split(":")[0] for r in regressions] == ["aubio b", "aubio b", "aubio c", "aubio d"]
+
+
+def test_compare_reports_skips_memory_without_rss():
+    # Reports written on Windows have no peak RSS
+    baseline = {"results": [result("a"), result("b", peak_rss_mb=None)]}
+    report = {"results": [result("a", peak_rss_mb=None), result("b", peak_rss_mb=100.0)]}
+    assert compare_reports(report, baseline) == []
+
+
+def test_benchmark_runs_without_resource(monkeypatch, tmp_path):
+    monkeypatch.setattr(benchmark, "resource", None)
+    path = synthesize_click_track(tmp_path / "click.wav", 120.0, seconds=5.0)
+    record = benchmark.measure("aubio", benchmark.BenchmarkCase(path.name, path, 120.0))
+    assert record["peak_rss_mb"] is None and record["import_rss_mb"] is None
+    assert record["bpm"] > 0
+
+
+def test_builder_timings_are_compared_to_the_baseline():
+    timings = benchmark.builder_benchmarks()
+    assert set(timings) == {"quantize_10_minutes", "patterns_1000_charts", "radar_200_charts"}
+    baseline = {"builders": dict(timings, radar_200_charts=timings["radar_200_charts"] / 10)}
+    regressions = compare_reports({"builders": timings}, baseline)
+    assert [r.split(":")[0] for r in regressions] == ["builder radar_200_charts"]
@@ -0,0 +1,54 @@
+import json
+import pathlib
+
+import pytest
+
+from beatcharter.beatchart.audio_analysis.benchmark import synthesize_click_track
+from beatcharter.beatchart.bpm_batch import analyze_library
+from stepchart_utils.chart_parser import ChartParser
+
+
+@pytest.fixture
+def songs_dir(tmp_path: pathlib.Path):
+    songs = tmp_path / "Songs"
+    for name, bpm in (("First", 120.0), ("Second", 140.0)):
+        song_dir = songs / "Pack" / name
+        song_dir.mkdir(parents=True)
+        synthesize_click_track(song_dir / "song.wav", bpm, seconds=12.0)
+        (song_dir / "song.sm").write_text(f"#TITLE:{name};\n#SAMPLESTART:2.0;\n#BPMS:0={bpm};\n")
+    yield songs
+
+
+def read_records(output: pathlib.Path):
+    records = []
+    for line in output.read_text().splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue  # the partial line an interrupted run left
+    return records
+
+
+def test_resume_skips_only_matching_songs(tmp_path: pathlib.Path, songs_dir: pathlib.Path):
+    output = tmp_path / "bpm.jsonl"
+    analyze_library(songs_dir, output, ChartParser(), workers=1)
+    first, second = sorted(read_records(output), key=lambda record: record["song_dir"])
+    assert first["bpm"] == pytest.approx(120.0, abs=2.0)
+    assert second["bpm"] == pytest.approx(140.0, abs=2.0)
+
+    # Interrupted after the first song, mid way through writing the second
+    output.write_text(json.dumps(first) + "\n" + json.dumps(second)[:20])
+    assert analyze_library(songs_dir, output, ChartParser(), workers=1, resume=True) == 1
+    records = read_records(output)
+    assert [record["song_dir"] for record in records] == [first["song_dir"], second["song_dir"]]
+    assert records[1]["bpm"] == pytest.approx(second["bpm"])
+
+    # Another window or backend is new work, not a finished song
+    def resume(**kwargs):
+        return analyze_library(songs_dir, output, ChartParser(), workers=1, resume=True, **kwargs)
+
+    assert resume(duration=8.0) == 2
+    assert resume(duration=8.0, use_sample_start=True) == 2
+    assert resume(duration=8.0, use_sample_start=True) == 0
+    assert resume(backend="librosa") == 2
+
@@ -0,0 +1,88 @@
+import sys
+
+import pytest
+
+from beatcharter.beatchart.audio_analysis.audio_analysis_wrapper import AudioAnalysisWrapper
+from beatcharter.beatchart.audio_analysis.backends import (
+    BACKENDS,
+    create_backend,
+    get_backend,
+    register_backend,
+)
+from beatcharter.beatchart.audio_analysis.cascade_wrapper import CascadeWrapper
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+
+
+class FixedWrapper(AudioAnalysisWrapper):
+    """Backend returning a fixed result, counting how often it analyzed"""
+
+    name = "fixed"
+    results = {}
+    calls = []
+
+    def __init__(self, use_cache=True, cache_dir=None):
+        super().__init__(use_cache=False)
+
+    def calculate_bpm(self, path, start=0.0, duration=None):
+        return [self.analyze(path, start, duration).bpm]
+
+    def analyze(self, path, start=0.0, duration=None):
+        FixedWrapper.calls.append(self.name)
+        return self.cached_analysis(
+            path, "analyze", lambda: TempoAnalysis(**self.results[self.name])
+        )
+
+
+class CheapWrapper(FixedWrapper):
+    name = "cheap"
+
+
+class ExpensiveWrapper(FixedWrapper):
+    name = "expensive"
+
+
+@pytest.fixture
+def cascade(monkeypatch):
+    monkeypatch.setitem(BACKENDS, "cheap", f"{__name__}:CheapWrapper")
+    monkeypatch.setitem(BACKENDS, "expensive", f"{__name__}:ExpensiveWrapper")
+    FixedWrapper.calls = []
+    FixedWrapper.results = {"expensive": dict(bpm=128.0, confidence=0.9, agreement=1.0)}
+    return CascadeWrapper(("cheap", "expensive"), min_confidence=0.5, min_agreement=0.6)
+
+
+def test_confident_result_skips_expensive_backend(cascade):
+    FixedWrapper.results["cheap"] = dict(bpm=120.0, confidence=0.7, agreement=1.0)
+    analysis = cascade.analyze("song.mp3")
+    assert analysis.bpm == 120.0
+    assert analysis.backend == "cheap"
+    assert cascade.loaded_backends() == ["cheap"]
+
+
+@pytest.mark.parametrize(
+    "cheap",
+    [
+        dict(bpm=120.0, confidence=0.3, agreement=1.0),
+        dict(bpm=120.0, confidence=0.7, agreement=1 / 3),
+    ],
+)
+def test_uncertain_result_escalates(cascade, cheap):
+    FixedWrapper.results["cheap"] = cheap
+    analysis = cascade.analyze("song.mp3")
+    assert analysis.bpm == 128.0
+    assert analysis.backend == "expensive"
+    assert FixedWrapper.calls == ["cheap", "expensive"]
+
+
+def test_backends_are_imported_lazily():
+    assert get_backend("aubio").__name__ == "AubioWrapper"
+    with pytest.raises(ValueError):
+        create_backend("no-such-backend")
+
+    register_backend("lazy", "beatcharter.beatchart.tests.no_such_module:Wrapper")
+    try:
+        # Registering never imports, only creating does
+        assert "beatcharter.beatchart.tests.no_such_module" not in sys.modules
+        with pytest.raises(ModuleNotFoundError):
+            create_backend("lazy")
+    finally:
+        del BACKENDS["lazy"]
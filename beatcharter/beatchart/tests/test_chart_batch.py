@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from beatcharter.beatchart.audio_analysis import analysis_cache
+from beatcharter.beatchart.audio_analysis.benchmark import synthesize_click_track
+from beatcharter.beatchart.beatchart_decoder import BeatchartDecoder
+from beatcharter.chart_batch import ChartOptions, chart_library, generate_charts
+from stepchart_utils.sm_file import SMFile
+
+
+def test_batch_resumes_from_manifest(tmp_path, monkeypatch):
+    monkeypatch.setenv("BEATCHARTER_CACHE_DIR", str(tmp_path / "cache"))
+    library = tmp_path / "library"
+    for bpm in (120.0, 140.0):
+        synthesize_click_track(library / f"click_{bpm:.0f}" / f"click_{bpm:.0f}.wav", bpm, 12.0)
+    (library / "notes.txt").write_text("not a song")
+    output = tmp_path / "out"
+    options = ChartOptions(encodings=("sm", "ssc"), backend="aubio")
+
+    counts = chart_library(str(library), output, options, workers=2)
+    assert counts == {"done": 2, "failed": 0, "skipped": 0}
+    manifest = output / "beatcharter_manifest.jsonl"
+    records = [json.loads(line) for line in manifest.read_text().splitlines()]
+    assert all(record["state"] == "done" for record in records)
+    assert (output / "click_120" / "click_120.wav" / "click_120.wav.ssc").exists()
+
+    # Finished songs are never redone, a song whose charts went missing is
+    assert chart_library(str(library), output, options, workers=2)["skipped"] == 2
+    (output / "click_140" / "click_140.wav" / "click_140.wav.sm").unlink()
+    counts = chart_library(str(library / "*"), output, options, workers=2)
+    assert counts == {"done": 1, "failed": 0, "skipped": 1}
+
+
+def test_same_named_songs_of_different_albums_stay_apart(tmp_path):
+    library = tmp_path / "library"
+    for album, bpm in (("AlbumA", 120.0), ("AlbumB", 140.0)):
+        synthesize_click_track(library / album / "01 Intro.wav", bpm, 12.0)
+    output = tmp_path / "out"
+    options = ChartOptions(backend="aubio")
+
+    for pattern in (str(library), str(library / "*" / "*.wav")):
+        counts = chart_library(pattern, output, options, manifest=tmp_path / "m.jsonl", workers=2)
+        assert counts["failed"] == 0 and counts["done"] + counts["skipped"] == 2
+    records = [json.loads(line) for line in (tmp_path / "m.jsonl").read_text().splitlines()]
+    assert len({record["outputs"][0] for record in records}) == 2
+    for album, bpm in (("AlbumA", 120.0), ("AlbumB", 140.0)):
+        sm_file, _, _ = SMFile.parse(output / album / "01 Intro.wav" / "01 Intro.wav.sm")
+        assert sm_file.bpms[0][1] == pytest.approx(bpm, abs=2.0)
+
+
+def test_batch_skips_excluded_directories(tmp_path):
+    library = tmp_path / "library"
+    synthesize_click_track(library / "click_120.wav", 120.0, 12.0)
+    # A song placed by an earlier run, charted into a directory inside the library
+    synthesize_click_track(library / "charts" / "click_120.wav" / "click_120.wav", 120.0, 12.0)
+    output = library / "charts"
+    options = ChartOptions(backend="aubio", package_mode="copy")
+
+    counts = chart_library(str(library), output, options, workers=1, exclude=[output])
+    assert counts == {"done": 1, "failed": 0, "skipped": 0}
+
+
+def test_uncached_decoder_writes_no_cache(tmp_path):
+    song = synthesize_click_track(tmp_path / "click_120.wav", 120.0, 12.0)
+    decoder = BeatchartDecoder("aubio", use_cache=False)
+    options = ChartOptions(backend="aubio", package_mode="copy")
+
+    # The second run confirms the copied song by its content hash
+    for _ in range(2):
+        assert generate_charts(decoder, song, tmp_path / "out", options)
+    assert not (tmp_path / "beatcharter_cache").exists()
+
+
+def test_copied_song_is_hashed_once(tmp_path, monkeypatch):
+    song = synthesize_click_track(tmp_path / "click_120.wav", 120.0, 12.0)
+    decoder = BeatchartDecoder("aubio")
+    options = ChartOptions(backend="aubio", package_mode="copy")
+    hashed = []
+    monkeypatch.setattr(analysis_cache, "hash_file", lambda path: hashed.append(path) or "")
+
+    # The second run confirms the copy, the third finds both hashes remembered
+    reads = []
+    for _ in range(3):
+        generate_charts(decoder, song, tmp_path / "out", options)
+        reads.append(len(hashed))
+    assert reads[1] > reads[0] and reads[2] == reads[1]
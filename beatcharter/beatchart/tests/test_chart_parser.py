@@ -0,0 +1,167 @@
+from dataclasses import astuple
+
+import numpy as np
+
+from beatcharter.beatchart.beatchart import Beatchart
+from beatcharter.builders.step_builder import StepBuilder
+from beatcharter.encoders.chart_model import ChartNotes, write_charts
+from beatcharter.encoders.groove_radar import compute_radar_rows
+from beatcharter.encoders.sm_encoder import SMEncoder
+from beatcharter.encoders.ssc_encoder import SSCEncoder
+from stepchart_utils.common_parser import HEADER_CHUNK_BYTES, read_header, tokenize_tags
+from stepchart_utils.sm_file import SMFile
+from stepchart_utils.ssc_file import SSCFile
+
+SM_CONTENT = rb"""// Written by hand
+#TITLE:Song \; Dance;
+#ARTIST:Someone // not part of the artist
+#OFFSET:-0.125;
+#BPMS:0.000=120.000,
+32.000=150.000;
+#BANNER:bn.png;
+#MADEUP:1;
+//---------------dance-single - ----------------
+#NOTES:
+     dance-single:
+     :
+     Easy:
+     3:
+     0.1,0.1,0,0,0:
+1000
+0100 // a comment; with a semicolon
+0010
+0001
+;
+"""
+
+
+def chart_with_random_onsets():
+    rng = np.random.default_rng(5)
+    chart = Beatchart("song", "song.mp3", 140.0)
+    chart.onset_times = np.sort(rng.uniform(0, 60, 300))
+    chart.onset_strengths = rng.random(300).astype(np.float32)
+    chart.songEndSeconds = 60.0
+    return chart
+
+
+def test_tokenizer_handles_comments_escapes_and_missing_semicolons():
+    tags = list(tokenize_tags(SM_CONTENT))
+    names = ["TITLE", "ARTIST", "OFFSET", "BPMS", "BANNER", "MADEUP", "NOTES"]
+    assert [tag.name for tag in tags] == names
+    assert tags[0].value == "Song ; Dance"
+    # No ; so the tag ends at the next line starting with #
+    assert tags[1].value == "Someone"
+    notes = tags[-1]
+    assert notes.value.endswith("0001") and "comment" not in notes.value
+    assert SM_CONTENT[notes.start : notes.end].startswith(b"#NOTES:")
+    assert SM_CONTENT[notes.end - 1 : notes.end] == b";"
+
+
+def test_sm_fields_come_from_one_tokenizer_pass(tmp_path):
+    path = tmp_path / "song.sm"
+    path.write_bytes(SM_CONTENT)
+    sm_file, _, _ = SMFile.parse(path)
+    assert sm_file.title == "Song ; Dance"
+    assert sm_file.artist == "Someone"
+    assert sm_file.offset == -0.125
+    assert sm_file.bpms == [(0.0, 120.0), (32.0, 150.0)]
+    assert list(sm_file.unknown_options) == ["MADEUP"]
+    assert sm_file.unknown_options["MADEUP"] == "#MADEUP:1;"
+
+
+def test_ssc_song_fields_ignore_chart_timing(tmp_path):
+    path = tmp_path / "song.ssc"
+    path.write_bytes(
+        b"#VERSION:0.83;\n#TITLE:Song;\n#OFFSET:-0.5;\n#BPMS:0=140;\n"
+        b"#NOTEDATA:;\n#STEPSTYPE:dance-single;\n#OFFSET:-0.1;\n#BPMS:0=70;\n#NOTES:\n1000\n;\n"
+    )
+    ssc_file, _, _ = SSCFile().parse(path)
+    assert ssc_file.title == "Song"
+    assert ssc_file.offset == -0.5
+    assert ssc_file.bpms == [(0.0, 140.0)]
+
+
+def test_notes_parse_into_compact_arrays(tmp_path):
+    path = tmp_path / "song.sm"
+    path.write_bytes(SM_CONTENT)
+    chart = SMFile.parse(path)[0].notes[0]
+    assert (chart.steps_type, chart.difficulty, chart.meter) == ("dance-single", "Easy", 3)
+    np.testing.assert_allclose(chart.radar, [0.1, 0.1, 0, 0, 0])
+    assert chart.notes.dtype == np.uint8 and chart.rows.dtype == np.int32
+    np.testing.assert_array_equal(chart.rows, [0, 48, 96, 144])
+    np.testing.assert_array_equal(chart.notes, np.eye(4, dtype=np.uint8))
+
+
+def test_notes_written_by_the_encoders_parse_back(tmp_path):
+    song_file = tmp_path / "song.mp3"
+    song_file.write_bytes(b"not really audio")
+    chart = Beatchart("song", song_file, 140.0)
+    notes = StepBuilder.build_all(chart_with_random_onsets(), workers=1)
+    charts = [ChartNotes(difficulty, chart_notes) for difficulty, chart_notes in notes.items()]
+    output = tmp_path / "out"
+    with SMEncoder(chart, output) as sm, SSCEncoder(chart, output, copy_song=False) as ssc:
+        write_charts([sm, ssc], charts)
+
+    for parsed in (SMFile.parse(sm.path)[0], SSCFile().parse(ssc.path)[0]):
+        assert [c.difficulty for c in parsed.notes] == [c.difficulty_name for c in charts]
+        for note_data, written in zip(parsed.notes, charts):
+            dense = note_data.dense()
+            np.testing.assert_array_equal(dense, written.notes[: len(dense)])
+            assert not written.notes[len(dense) :].any()
+            radar = compute_radar_rows(note_data.rows, note_data.notes, chart.bpms)
+            np.testing.assert_allclose(note_data.radar[:5], astuple(radar)[:5], atol=1e-6)
+
+
+def test_headers_parse_without_reading_the_charts(tmp_path):
+    path = tmp_path / "song.sm"
+    # A big chart body, with a tag that would be flagged as unknown if it were scanned
+    body = b"\n,\n".join([b"1000\n0100\n0010\n0001"] * 20000)
+    path.write_bytes(SM_CONTENT.replace(b"0001\n;", b"0001\n,\n" + body + b"\n;\n#LATER:1;"))
+    header, body_start = read_header(path)
+    assert len(header) < 1000 and path.read_bytes()[body_start:].startswith(b"#NOTES:")
+
+    sm_file, _, _ = SMFile.parse(path)
+    assert sm_file.title == "Song ; Dance" and "LATER" not in sm_file.unknown_options
+    assert sm_file._notes is None
+
+    chart = sm_file.notes[0]
+    assert chart.difficulty == "Easy" and not chart.loaded
+    assert len(chart.rows) == 4 * 20001 and chart.loaded
+
+
+def test_header_ends_at_an_indented_chart_across_chunks(tmp_path):
+    path = tmp_path / "song.sm"
+    padding = b"#TITLE:Song;\n#MADEUP:" + b"x" * (HEADER_CHUNK_BYTES - 60) + b";"
+    # The line starts in the first chunk, its #NOTES only in the second
+    content = padding + b"\n" + b" " * 40 + SM_CONTENT[SM_CONTENT.index(b"#NOTES:") :]
+    path.write_bytes(content)
+    header, body_start = read_header(path)
+    assert len(padding) < HEADER_CHUNK_BYTES < content.index(b"#NOTES:")
+    assert body_start == content.index(b"#NOTES:")
+    assert header == content[:body_start]
+
+
+def test_ssc_charts_stream_with_their_own_timing(tmp_path):
+    path = tmp_path / "song.ssc"
+    charts = [
+        (b"dance-single", b"Easy", b""),
+        (b"dance-double", b"Challenge", b"#OFFSET:-0.1;\n#BPMS:0=70;\n"),
+        (b"dance-single", b"Challenge", b"#BPMS:0=70,16=140;\n#DISPLAYBPM:70:140;\n"),
+    ]
+    body = b"".join(
+        b"#NOTEDATA:;\n#STEPSTYPE:%s;\n#DIFFICULTY:%s;\n%s#NOTES:\n1000\n;\n" % chart
+        for chart in charts
+    )
+    # A broken last chart, only read if the scan runs past the wanted one
+    path.write_bytes(b"#TITLE:Song;\n#OFFSET:-0.5;\n#BPMS:0=140;\n" + body + b"#NOTEDATA:;\n#NOTES")
+    ssc_file, _, _ = SSCFile().parse(path)
+
+    easy, double, _ = list(ssc_file.iter_charts())[:3]
+    assert (easy.offset, easy.bpms) == (-0.5, [(0.0, 140.0)])
+    assert (double.offset, double.bpms) == (-0.1, [(0.0, 70.0)])
+
+    challenge = next(ssc_file.iter_charts("DANCE-SINGLE", "challenge"))
+    assert challenge.offset == -0.5 and challenge.bpms == [(0.0, 70.0), (16.0, 140.0)]
+    assert challenge.tags == {"BPMS": "0=70,16=140", "DISPLAYBPM": "70:140"}
+    np.testing.assert_array_equal(challenge.notes, [[1, 0, 0, 0]])
+    assert ssc_file._notes is None and not ssc_file.unknown_options
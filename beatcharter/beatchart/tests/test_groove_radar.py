@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from beatcharter.builders.quantizer import ROWS_PER_BEAT, ROWS_PER_MEASURE, beats_to_times
+from beatcharter.encoders.groove_radar import compute_radar, compute_radar_rows
+
+
+def test_beats_to_times_follows_bpm_segments():
+    segments = np.array([[0.0, 120.0], [4.0, 90.0]])
+    times = beats_to_times([0.0, 2.0, 4.0, 5.5], segments, first_downbeat=0.5)
+    np.testing.assert_allclose(times, [0.5, 1.5, 2.5, 3.5])
+
+
+def test_radar_counts_and_densities():
+    # 16 measures of quarter notes at 120 bpm, 32 seconds, with extras in the first measure
+    notes = np.zeros((16 * ROWS_PER_MEASURE, 4), dtype=np.uint8)
+    notes[::ROWS_PER_BEAT, 0] = 1
+    notes[0, 3] = 1  # jump
+    notes[48, 1:] = 1  # hand
+    notes[96, 0] = 2  # hold head
+    notes[120, 2] = 3  # its tail
+    notes[12, 1] = 5  # mine
+    notes[16, 2] = 1  # a triplet, off the 8th grid
+
+    radar = compute_radar(notes, [(0.0, 120.0)])
+    assert radar.notes == 64 + 1 + 3 + 1
+    assert radar.taps_and_holds == 65
+    assert (radar.jumps, radar.hands, radar.holds, radar.mines, radar.rolls) == (2, 1, 1, 1, 0)
+    last_seconds = 63 * 0.5
+    assert radar.stream == pytest.approx(69 / last_seconds / 7)
+    assert radar.air == pytest.approx(2 / last_seconds)
+    assert radar.chaos == pytest.approx(1 / last_seconds / 2)
+    # The first 8 beats hold 13 arrows
+    assert radar.voltage == pytest.approx(13 / 8 * (63 / last_seconds) / 10)
+
+    values = radar.format().split(",")
+    assert len(values) == 22 and values[:11] == values[11:]
+    assert values[5] == "69.000000"
+
+
+def test_radar_of_rows_matches_the_full_note_array():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        rows = np.sort(rng.choice(100 * ROWS_PER_MEASURE, 800, replace=False))
+        notes = rng.integers(0, 6, (800, 4)).astype(np.uint8)
+        dense = np.zeros((100 * ROWS_PER_MEASURE, 4), dtype=np.uint8)
+        dense[rows] = notes
+        radar = compute_radar_rows(rows, notes, [(0.0, 150.0)])
+        assert radar == compute_radar(dense, [(0.0, 150.0)])
+        assert 0 < radar.stream <= 1
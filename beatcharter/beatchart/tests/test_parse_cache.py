@@ -0,0 +1,81 @@
+import os
+import pathlib
+from unittest import mock
+
+import pytest
+
+from stepchart_utils.chart_parser import ChartParser
+from stepchart_utils.parse_cache import ParseCache, parse_and_validate
+from stepchart_utils.sm_file import SMFile
+
+SM_CONTENT = b"""#TITLE:Song;
+#SUBTITLE:Sub;
+#MUSIC:song.mp3;
+#BANNER:bn.png;
+#BACKGROUND:bg.png;
+#OFFSET:0;
+#BPMS:0.000=120.000,32.000=150.000;
+#NOTES:
+     dance-single:
+     :
+     Easy:
+     3:
+     0,0,0,0,0:
+1000
+;
+"""
+
+
+@pytest.fixture
+def chart_file(tmp_path: pathlib.Path):
+    song_dir = tmp_path / "Song"
+    song_dir.mkdir()
+    (song_dir / "song.mp3").write_bytes(b"not really audio")
+    (song_dir / "bn.png").write_bytes(b"")
+    path = song_dir / "song.sm"
+    path.write_bytes(SM_CONTENT)
+    yield path
+
+
+def test_unchanged_files_are_not_parsed_again(tmp_path: pathlib.Path, chart_file: pathlib.Path):
+    cache = ParseCache(tmp_path / "cache")
+    chart, error = parse_and_validate(chart_file, ChartParser(), cache)
+    assert "bg.png" in error and cache.misses == 1
+
+    with mock.patch.object(SMFile, "parse", side_effect=AssertionError("parsed again")):
+        cached, cached_error = parse_and_validate(
+            chart_file, ChartParser(), ParseCache(tmp_path / "cache")
+        )
+    assert cached_error == error
+    assert cached.chart_file.bpms == [(0.0, 120.0), (32.0, 150.0)]
+    assert cached.chart_file.title == chart.chart_file.title == "Song"
+    assert cached.audio_file == chart.audio_file
+
+    # Adding the missing background changes the directory, the cached header is revalidated
+    (chart_file.parent / "bg.png").write_bytes(b"")
+    with mock.patch.object(SMFile, "parse", side_effect=AssertionError("parsed again")):
+        _, error = parse_and_validate(chart_file, ChartParser(), cache)
+    assert error is None
+
+    chart_file.write_bytes(SM_CONTENT.replace(b"#TITLE:Song;", b"#TITLE:Edited;"))
+    chart, _ = parse_and_validate(chart_file, ChartParser(), cache)
+    assert chart.chart_file.title == "Edited" and cache.misses == 2
+    assert cache.stats() == {"entries": 1, "invalid": 0}
+
+
+def test_verify_hash_catches_edits_that_keep_size_and_mtime(
+    tmp_path: pathlib.Path, chart_file: pathlib.Path
+):
+    cache = ParseCache(tmp_path / "cache", verify_hash=True)
+    parse_and_validate(chart_file, ChartParser(), cache)
+
+    stat = chart_file.stat()
+    chart_file.write_bytes(SM_CONTENT.replace(b"#TITLE:Song;", b"#TITLE:Sng2;"))
+    os.utime(chart_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    chart, _ = parse_and_validate(chart_file, ChartParser(), cache)
+    assert chart.chart_file.title == "Sng2"
+
+    # A new mtime on the same content is still a hit
+    os.utime(chart_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get(chart_file) is not None
+    assert cache.invalidate(chart_file) == 1 and cache.get(chart_file) is None
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from beatcharter.beatchart.beatchart import Beatchart
+from beatcharter.builders.quantizer import ROWS_PER_MEASURE
+from beatcharter.builders.step_builder import StepDifficulty
+from beatcharter.encoders.chart_model import ChartNotes, measure_resolutions, write_charts
+from beatcharter.encoders.sm_encoder import SMEncoder
+from beatcharter.encoders.ssc_encoder import SSCEncoder
+from stepchart_utils.sm_file import SMFile
+from stepchart_utils.ssc_file import SSCFile
+
+
+@pytest.fixture
+def chart(tmp_path):
+    song_file = tmp_path / "song.mp3"
+    song_file.write_bytes(b"not really audio")
+    chart = Beatchart("song", song_file, 120.0)
+    chart.songStartOffsetSeconds = 0.25
+    chart.bpms = [(0.0, 120.0), (32.0, 150.0)]
+    return chart
+
+
+def notes_with_taps(rows, n_measures=3):
+    notes = np.zeros((n_measures * ROWS_PER_MEASURE, 4), dtype=np.uint8)
+    notes[rows, np.arange(len(rows)) % 4] = 1
+    return notes
+
+
+def test_measure_resolutions_are_minimal():
+    # Quarters, eighths with a triplet, and one 192nd note
+    notes = notes_with_taps([0, 48, 192 + 24, 192 + 64, 384 + 1])
+    np.testing.assert_array_equal(measure_resolutions(notes), [4, 24, 192])
+
+
+def test_charts_stream_into_sm(chart, tmp_path):
+    notes = notes_with_taps([0, 48, 192 + 24])
+    notes[400, 2] = 5
+
+    with SMEncoder(chart, tmp_path / "out") as encoder:
+        encoder.add_chart(ChartNotes(StepDifficulty.EASY, notes))
+        encoder.add_chart(ChartNotes(StepDifficulty.HARD, notes))
+    assert encoder.path.exists()
+    assert (encoder.directory / "song.mp3").exists()
+
+    text = encoder.path.read_text()
+    assert "#OFFSET:-0.250000;" in text
+    assert "#BPMS:0.000000=120.000000,32.000000=150.000000;" in text
+    assert text.count("#NOTES:") == 2
+    first_chart = text.split("#NOTES:")[1].split(";")[0]
+    measures = first_chart.split(":")[-1].split(",")
+    assert [len(m.split()) for m in measures] == [4, 8, 12]
+    assert measures[0].split() == ["1000", "0100", "0000", "0000"]
+    assert "00M0" in measures[2]
+    radar = first_chart.split(":")[4].strip().split(",")
+    assert len(radar) == 22 and radar[5] == "3.000000" and radar[9] == "1.000000"
+
+    sm_file, _, _ = SMFile.parse(encoder.path)
+    assert sm_file.offset == pytest.approx(-0.25)
+
+
+def test_parsed_lifts_and_fakes_are_written_back(chart, tmp_path):
+    path = tmp_path / "parsed.sm"
+    path.write_bytes(b"#NOTES:dance-single::Easy:3:0,0,0,0,0:\n1L0F\n0000\nM200\n3000\n;\n")
+    notes = SMFile.parse(path)[0].notes[0].dense()
+    with SMEncoder(chart, tmp_path / "out", copy_song=False) as encoder:
+        encoder.add_chart(ChartNotes(StepDifficulty.EASY, notes))
+    assert "1L0F\n0000\nM200\n3000\n" in encoder.path.read_text()
+
+
+def test_errors_are_raised_and_leave_no_file(chart, tmp_path):
+    with pytest.raises(AttributeError):
+        with SMEncoder(chart, tmp_path / "out") as encoder:
+            encoder.add_chart(ChartNotes("not a difficulty", notes_with_taps([0])))
+    assert not encoder.path.exists()
+    assert list(encoder.directory.glob("*.partial")) == []
+
+
+def test_sm_and_ssc_from_one_pass(chart, tmp_path):
+    charts = [
+        ChartNotes(StepDifficulty.BEGINNER, notes_with_taps([0, 96])),
+        ChartNotes(
+            StepDifficulty.CHALLENGE,
+            notes_with_taps([0, 8, 16, 24]),
+            bpms=[(0.0, 240.0)],
+            offset=-0.125,
+        ),
+    ]
+    with SMEncoder(chart, tmp_path / "out") as sm, SSCEncoder(
+        chart, tmp_path / "out", copy_song=False
+    ) as ssc:
+        write_charts([sm, ssc], charts)
+
+    sm_text, ssc_text = sm.path.read_text(), ssc.path.read_text()
+    assert ssc.path.suffix == ".ssc"
+    assert ssc_text.startswith("#VERSION:0.83;")
+    assert "#OFFSET:-0.250000;" in ssc_text
+    assert ssc_text.count("#NOTEDATA:;") == 2
+    assert "#DIFFICULTY:Beginner;\n#METER:2;" in ssc_text
+
+    # Only the challenge chart carries timing of its own
+    beginner, challenge = ssc_text.split("#NOTEDATA:;")[1:]
+    assert "#BPMS" not in beginner
+    assert "#OFFSET:-0.125000;\n#BPMS:0.000000=240.000000;" in challenge
+
+    # Both formats hold the same note data
+    sm_notes = [c.split(":")[-1].split(";")[0] for c in sm_text.split("#NOTES:")[1:]]
+    ssc_notes = [c.split("#NOTES:")[1].split(";")[0] for c in ssc_text.split("#NOTEDATA:;")[1:]]
+    assert [n.strip() for n in sm_notes] == [n.strip() for n in ssc_notes]
+
+
+def test_ssc_chart_timing_is_written_whole(chart, tmp_path):
+    charts = [
+        ChartNotes(StepDifficulty.EASY, notes_with_taps([0]), offset=-0.125),
+        ChartNotes(StepDifficulty.HARD, notes_with_taps([0]), bpms=[(0.0, 240.0)]),
+    ]
+    with SSCEncoder(chart, tmp_path / "out", copy_song=False) as ssc:
+        write_charts([ssc], charts)
+
+    # Each chart falls back to the song for the value it does not set
+    for chart_text in ssc.path.read_text().split("#NOTEDATA:;")[1:]:
+        assert "#OFFSET:" in chart_text and "#BPMS:" in chart_text
+    ssc_file, _, _ = SSCFile().parse(ssc.path)
+    easy, hard = ssc_file.notes
+    assert (easy.offset, easy.bpms) == (-0.125, [(0.0, 120.0), (32.0, 150.0)])
+    assert (hard.offset, hard.bpms) == (-0.25, [(0.0, 240.0)])
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from beatcharter.beatchart.audio_analysis.analysis_cache import AnalysisCache
+from beatcharter.encoders.song_packager import PackageMode, package_song
+
+
+@pytest.fixture
+def song(tmp_path):
+    song = tmp_path / "library" / "song.mp3"
+    song.parent.mkdir()
+    song.write_bytes(b"ID3" + bytes(range(256)) * 64)
+    return song
+
+
+@pytest.mark.parametrize("mode", list(PackageMode))
+def test_package_modes_place_the_song(song, tmp_path, mode):
+    target = tmp_path / "pack" / "song.mp3"
+    used = package_song(song, target, mode)
+    assert used is not None
+    assert target.read_bytes() == song.read_bytes()
+    if used == PackageMode.HARDLINK:
+        assert os.path.samefile(song, target)
+    if used == PackageMode.SYMLINK:
+        assert target.is_symlink()
+    assert list(target.parent.glob("*.partial")) == []
+
+    # A second run finds the song in place and writes nothing
+    assert package_song(song, target, mode) is None
+
+
+def test_copies_are_confirmed_by_hash(song, tmp_path):
+    cache = AnalysisCache(tmp_path / "cache")
+    target = tmp_path / "pack" / "song.mp3"
+    assert package_song(song, target, PackageMode.COPY, cache.hash_audio) == PackageMode.COPY
+
+    # Same size and mtime but different audio is replaced
+    stat = target.stat()
+    target.write_bytes(b"X" * stat.st_size)
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert package_song(song, target, PackageMode.COPY, cache.hash_audio) == PackageMode.COPY
+    assert target.read_bytes() == song.read_bytes()
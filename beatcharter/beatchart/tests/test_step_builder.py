@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+
+from beatcharter.beatchart.beatchart import Beatchart
+from beatcharter.builders.pattern_generator import (
+    COLUMNS,
+    START_STATE,
+    build_transition_table,
+    encode_state,
+    generate_steps,
+    step_weight,
+)
+from beatcharter.builders.quantizer import (
+    NOTE_HOLD_HEAD,
+    NOTE_MINE,
+    NOTE_TAIL,
+    NOTE_TAP,
+    ROWS_PER_BEAT,
+    ROWS_PER_MEASURE,
+    grid_offsets,
+    quantize_onsets,
+    snap_to_grid,
+    times_to_beats,
+)
+from beatcharter.builders.step_builder import (
+    CONTROLLER_STYLES,
+    ControllerType,
+    StepBuilder,
+    StepDifficulty,
+)
+
+
+def test_times_to_beats_follows_bpm_segments():
+    # 4 beats at 120 (2 seconds) then 90 bpm
+    segments = np.array([[0.0, 120.0], [4.0, 90.0]])
+    beats = times_to_beats(np.array([0.5, 1.5, 2.5, 3.5, 4.5]), segments, first_downbeat=0.5)
+    np.testing.assert_allclose(beats, [0.0, 2.0, 4.0, 5.5, 7.0])
+
+
+@pytest.mark.parametrize(
+    "note_types, expected",
+    [
+        ((4,), [0, 0, 48, 96]),
+        ((4, 8), [0, 24, 48, 96]),
+        ((4, 8, 12, 16, 24), [8, 24, 40, 96]),
+    ],
+)
+def test_snap_to_grid(note_types, expected):
+    beats = np.array([0.2, 0.48, 0.85, 2.01])
+    np.testing.assert_array_equal(snap_to_grid(beats, note_types), expected)
+
+
+def test_density_is_limited_per_measure():
+    # 16th note onsets for 8 measures at 120 bpm, every other one stronger
+    onsets = np.arange(0, 16, 0.125)
+    strengths = np.tile([1.0, 0.2], len(onsets) // 2).astype(np.float32)
+    rows = quantize_onsets(onsets, strengths, np.array([[0.0, 120.0]]), 0.0, (4, 8, 16), 1.0)
+    assert np.all(np.bincount(rows // ROWS_PER_MEASURE) == 4)
+    # The strong eighth notes win, the weak sixteenths are dropped
+    assert np.all(rows % 24 == 0)
+
+
+def chart_with_onsets(onsets, bpm=120.0):
+    chart = Beatchart("song", "song.mp3", bpm)
+    chart.onset_times = np.asarray(onsets, dtype=np.float64)
+    chart.onset_strengths = np.ones(len(onsets), dtype=np.float32)
+    chart.songEndSeconds = float(onsets[-1])
+    return chart
+
+
+def test_build_lays_out_taps_holds_and_mines():
+    # Quarter notes, then a gap of two measures, then a gap of one beat and a half
+    onsets = np.concatenate((np.arange(0, 8, 0.5), [12.0, 12.75]))
+    notes = StepBuilder.build(
+        chart_with_onsets(onsets), StepDifficulty.EASY, ControllerType.PAD, True, True, False
+    )
+    assert notes.dtype == np.uint8
+    assert notes.shape[1] == 4 and notes.shape[0] % ROWS_PER_MEASURE == 0
+    # One note per row, never the same column twice in a row
+    tapped = np.flatnonzero(np.isin(notes, (NOTE_TAP, NOTE_HOLD_HEAD)).any(axis=1))
+    assert len(tapped) == 18
+    columns = np.isin(notes[tapped], (NOTE_TAP, NOTE_HOLD_HEAD)).argmax(axis=1)
+    assert np.all(np.diff(columns) != 0)
+    assert (notes == NOTE_HOLD_HEAD).sum() == (notes == NOTE_TAIL).sum() == 1
+    assert (notes == NOTE_MINE).sum() == 1
+
+
+def test_ten_minute_song_quantizes_to_the_grid_and_density():
+    rng = np.random.default_rng(0)
+    onsets = np.sort(rng.uniform(0, 600, 8000))
+    strengths = rng.random(8000).astype(np.float32)
+    segments = np.array([[0.0, 140.0]])
+    note_types = (4, 8, 12, 16, 24)
+    rows = quantize_onsets(onsets, strengths, segments, 0.25, note_types, 3.0)
+
+    assert rows.dtype == np.int64 and np.all(np.diff(rows) > 0)
+    assert np.all(np.isin(rows % ROWS_PER_BEAT, grid_offsets(note_types)))
+    # 3 notes per beat allows 12 per measure, each the strongest onsets of their measure
+    snapped = snap_to_grid(times_to_beats(onsets, segments, 0.25), note_types)
+    measures = rows // ROWS_PER_MEASURE
+    assert np.bincount(measures).max() <= 12
+    for measure in (0, len(np.unique(measures)) // 2):
+        in_measure = (snapped >= 0) & (snapped // ROWS_PER_MEASURE == measure)
+        order = np.argsort(-strengths[in_measure], kind="stable")
+        strongest = []
+        for row in snapped[in_measure][order]:
+            if row not in strongest:
+                strongest.append(row)
+        np.testing.assert_array_equal(rows[measures == measure], np.sort(strongest[:12]))
+
+
+def test_build_all_in_workers_matches_serial_build():
+    rng = np.random.default_rng(3)
+    onsets = np.sort(rng.uniform(0, 120, 600))
+    chart = chart_with_onsets(onsets, bpm=132.0)
+    chart.onset_strengths = rng.random(600).astype(np.float32)
+
+    parallel = StepBuilder.build_all(chart, workers=2)
+    serial = StepBuilder.build_all(chart, workers=1)
+    assert list(parallel) == list(StepDifficulty)
+    for difficulty, notes in serial.items():
+        np.testing.assert_array_equal(parallel[difficulty], notes)
+    # Harder charts are denser
+    taps = [np.count_nonzero(serial[d]) for d in StepDifficulty]
+    assert taps == sorted(taps)
+
+
+def test_easy_patterns_alternate_feet_facing_forward():
+    table = build_transition_table(CONTROLLER_STYLES[ControllerType.PAD], 0.0)
+    steps = generate_steps(table, 2000, np.random.default_rng(0))
+    assert np.all(steps[:, 1] == -1)  # no jumps
+    assert np.all(np.diff(steps[:, 0]) != 0)  # no jacks
+    # Feet alternate without crossing, one foot never reaches the right arrow, the other never
+    # the left one
+    odd, even = set(steps[1::2, 0]), set(steps[0::2, 0])
+    assert (3 not in odd and 0 not in even) or (0 not in odd and 3 not in even)
+
+
+@pytest.mark.parametrize("controller", list(ControllerType))
+def test_states_without_plain_steps_fall_back_to_allowed_ones(controller):
+    style = CONTROLLER_STYLES[controller]
+    probabilities = np.diff(build_transition_table(style, 0.0).cdf, axis=1, prepend=0.0)
+    for left in range(COLUMNS):
+        for right in range(COLUMNS):
+            for last_foot in range(3):
+                state = encode_state(left, right, last_foot)
+                for action in np.flatnonzero(probabilities[state, : 2 * COLUMNS] > 0):
+                    foot, panel = divmod(int(action), COLUMNS)
+                    assert step_weight(style, left, right, last_foot, foot, panel) > 0
+
+
+def test_patterns_only_take_allowed_steps():
+    table = build_transition_table(CONTROLLER_STYLES[ControllerType.ARCADE], 1.0)
+    steps = generate_steps(table, 4000, np.random.default_rng(1))
+    assert steps.shape == (4000, 2)
+    np.testing.assert_array_equal(steps, generate_steps(table, 4000, np.random.default_rng(1)))
+
+    jumps = steps[:, 1] >= 0
+    assert 0 < jumps.sum() < len(steps) // 4
+    assert np.all(steps[jumps, 0] < steps[jumps, 1])
+
+    # Every step has weight from a state the steps before could have left the feet in. A
+    # single arrow may have been either foot, so every state still possible is followed.
+    probabilities = np.diff(table.cdf, axis=1, prepend=0.0)
+    action_steps = table.steps.tolist()
+    states = {START_STATE}
+    for step in steps.tolist():
+        actions = [action for action, taken in enumerate(action_steps) if taken == step]
+        states = {
+            int(table.next_state[state, action])
+            for state in states
+            for action in actions
+            if probabilities[state, action] > 0
+        }
+        assert states
@@ -0,0 +1,50 @@
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from beatcharter.beatchart.subtatum_map import (
+    bpm_histogram,
+    fold_to_common_range,
+    intervals_to_bpm,
+    most_common_tactus,
+)
+
+
+def test_intervals_to_bpm():
+    assert_allclose(intervals_to_bpm([0.0, 0.5, 1.0, 1.0, 1.25]), [120.0, 120.0, 240.0])
+    assert_allclose(intervals_to_bpm([0.0, 500.0], units_per_second=1000.0), [120.0])
+
+
+def test_fold_to_common_range():
+    folded = fold_to_common_range(np.array([860.0, 60.0, 150.0, 80.0, 200.0, 401.0, 0.0]))
+    assert_allclose(folded, [107.5, 120.0, 150.0, 80.0, 200.0, 100.25])
+
+
+def test_bpm_histogram_counts_within_allowed_range():
+    centers, counts = bpm_histogram(np.array([120.0, 120.5, 121.5, 150.0]))
+    assert counts[np.argmin(np.abs(centers - 120.5))] == 3
+    assert counts[np.argmin(np.abs(centers - 150.0))] == 1
+    assert counts[np.argmin(np.abs(centers - 135.0))] == 0
+
+
+def test_most_common_tactus_prefers_tactus_over_tatum():
+    # Quarter notes at 120 bpm with some eighth note tatums mixed in
+    quarters = np.arange(0, 60, 0.5)
+    eighths = np.arange(0.25, 30, 0.5)
+    tactus = most_common_tactus(np.concatenate((quarters, eighths)))
+    assert tactus.bpm == pytest.approx(120.0, abs=0.5)
+    assert tactus.confidence > 0.9
+
+
+def test_most_common_tactus_hours_of_milliseconds():
+    rng = np.random.default_rng(0)
+    period_ms = 60_000.0 / 128.0
+    onsets = np.arange(0, 3 * 60 * 60 * 1000, period_ms / 2)
+    onsets += rng.normal(0, 2.0, onsets.size)
+    tactus = most_common_tactus(onsets, units_per_second=1000.0)
+    assert tactus.bpm == pytest.approx(128.0, abs=1.0)
+
+
+def test_most_common_tactus_without_beats():
+    assert most_common_tactus([]).bpm == 0.0
+    assert most_common_tactus([1.0]).confidence == 0.0
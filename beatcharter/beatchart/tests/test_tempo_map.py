@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from beatcharter.beatchart.audio_analysis.aubio_wrapper import AubioWrapper
+from beatcharter.beatchart.audio_analysis.tempo_analysis import TempoAnalysis
+from beatcharter.beatchart.tempo_map import TempoMapBuilder, build_tempo_map
+
+
+def test_constant_tempo_is_one_segment():
+    bpms = build_tempo_map(np.arange(0, 300, 60 / 128))
+    assert len(bpms) == 1
+    assert bpms[0][0] == 0.0
+    assert bpms[0][1] == pytest.approx(128.0, abs=0.5)
+
+
+def test_tempo_changes_start_new_segments():
+    rng = np.random.default_rng(1)
+    beats = np.concatenate(
+        (
+            np.arange(0, 40, 60 / 120),  # 80 beats at 120
+            40 + np.arange(0, 40, 60 / 90),  # 60 beats at 90
+            80 + np.arange(0, 40, 60 / 120),
+        )
+    )
+    beats += rng.normal(0, 0.003, beats.size)
+
+    bpms = build_tempo_map(np.sort(beats))
+    assert [beat for beat, _ in bpms] == [0.0, 80.0, 140.0]
+    assert [bpm for _, bpm in bpms] == pytest.approx([120.0, 90.0, 120.0], abs=1.0)
+
+
+def test_short_excursions_are_ignored():
+    beats = list(np.arange(0, 60, 0.5))
+    # A few seconds of double time fills that fold back to 120 and a short stumble
+    beats += [20.1, 20.3, 20.45]
+    builder = TempoMapBuilder()
+    bpms = build_tempo_map(sorted(beats), builder=builder)
+    assert len(bpms) == 1
+    assert builder.main_bpm == pytest.approx(120.0, abs=1.0)
+
+
+def test_memory_is_bounded_by_window():
+    builder = TempoMapBuilder()
+    for beat in np.arange(0, 3600, 0.5):
+        builder.add_beat(beat)
+    # One window, the steps kept to locate a change and the beats since the last window
+    retained = builder.window_seconds + (builder.confirm_windows + 1) * builder.step_seconds
+    assert len(builder._beats) <= retained / 0.5 + 2
+
+
+def test_tempo_map_from_an_analysis_needs_no_decode():
+    beats = np.concatenate((0.7 + np.arange(0, 40, 60 / 120), 40.7 + np.arange(0, 40, 60 / 90)))
+    strengths = np.where(np.arange(beats.size) % 4 == 0, 1.0, 0.5)
+    analysis = TempoAnalysis(
+        beats={"default": beats},
+        bpms={"default": 120.0},
+        bpm=120.0,
+        onset_times=beats,
+        onset_strengths=strengths,
+    )
+    # The song does not exist, so the map can only come from the analysis
+    tempo_map = AubioWrapper(use_cache=False).tempo_map(analysis)
+    assert tempo_map.first_downbeat == pytest.approx(0.7, abs=0.02)
+    assert [beat for beat, _ in tempo_map.bpm_segments] == [0.0, 80.0]
+    assert [bpm for _, bpm in tempo_map.bpm_segments] == pytest.approx([120.0, 90.0], abs=1.0)
@@ -1,16 +1,31 @@
 #!python3
 import argparse
-import os
+import logging
+from pathlib import Path
 
-from beatchart.beatchart_decoder import BeatchartDecoder
+from beatcharter.beatchart.audio_analysis.backends import available_backends
+from beatcharter.beatchart.beatchart_decoder import BeatchartDecoder
+from beatcharter.chart_batch import ENCODERS, ChartOptions, chart_library, generate_charts
+from beatcharter.encoders.song_packager import PackageMode
+
+logging.basicConfig(level=logging.INFO, format="%(filename)s:%(lineno)d - %(message)s")
 
 
 def main():
     parser = argparse.ArgumentParser()
 
-    parser.add_argument("input", help="provide an input file ")
     parser.add_argument(
-        "-e", "--argparse", help="type of encoding to perform (e.g., sm, ssc, beatmania"
+        "input",
+        help="audio file to chart, or a directory or glob of songs to chart in batch. Bare "
+        "file names are also looked up in samples/",
+    )
+    parser.add_argument(
+        "-e",
+        "--encoding",
+        "--argparse",
+        dest="encoding",
+        default="sm",
+        help="comma separated encodings to write, sm and/or ssc. default - sm",
     )
     parser.add_argument(
         "-d",
@@ -19,6 +34,13 @@ def main():
         default=0.0,
         help="optional duration to generate steps for in the song. default - whole duration",
     )
+    parser.add_argument(
+        "-s",
+        "--start",
+        type=float,
+        default=0.0,
+        help="optional time in seconds to start analyzing the song at. default - beginning",
+    )
     parser.add_argument(
         "-b",
         "--bpm",
@@ -26,19 +48,91 @@ def main():
         default=0.0,
         help="optional manual bpm to set, otherwise will attempt to figure it out",
     )
+    parser.add_argument(
+        "--variable-tempo",
+        action="store_true",
+        default=False,
+        help="detect tempo changes and write a multi-segment #BPMS instead of a single bpm",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=available_backends(),
+        default="cascade",
+        help="analysis backend. default - cascade, aubio then librosa for uncertain songs",
+    )
+    parser.add_argument(
+        "--package-mode",
+        choices=[mode.value for mode in PackageMode],
+        default=PackageMode.HARDLINK.value,
+        help="how the song is placed next to the charts. default - hardlink, falling back "
+        "to reflink then copy",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="./",
+        help="directory to write song directories to. default - current directory",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="batch only, songs charted at once. default - number of CPUs",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="batch only, JSONL file recording each song's state so an interrupted batch "
+        "resumes. default - beatcharter_manifest.jsonl in the output directory",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help="batch only, directory whose songs are not charted, e.g. an output directory "
+        "inside the library. May be repeated",
+    )
     args = parser.parse_args()
+    encodings = args.encoding.split(",")
+    unknown = [encoding for encoding in encodings if encoding not in ENCODERS]
+    if unknown:
+        parser.error(f"unsupported encoding {', '.join(unknown)}, expected {', '.join(ENCODERS)}")
     print("Launching Beatcharer with arguments: " + str(args))
 
-    input_filename = os.path.join("samples", args.input)
-    input_file = open(input_filename, "r")
+    options = ChartOptions(
+        encodings=tuple(encodings),
+        bpm=args.bpm,
+        variable_tempo=args.variable_tempo,
+        start=args.start,
+        duration=args.default if args.default > 0 else None,
+        backend=args.backend,
+        package_mode=args.package_mode,
+    )
+    output_dir = Path(args.output)
 
-    output_filename = os.path.splitext(args.input)[0] + ".sm"
-    output_dir = "./"
+    input_file = Path(args.input)
+    if not input_file.is_file() and Path("samples", args.input).is_file():
+        input_file = Path("samples", args.input)
 
-    decoder = BeatchartDecoder()
-    chart = decoder.decode_song(input_filename, args.bpm)
+    if input_file.is_file():
+        print(f"Generating charts for {input_file} in {output_dir}")
+        # Every difficulty from the one analysis, built side by side
+        outputs = generate_charts(BeatchartDecoder(args.backend), input_file, output_dir, options)
+        for path in outputs:
+            print(f"Wrote {path}")
+        return
 
-    print("Generating SM for " + input_filename + " to " + output_dir + output_filename)
+    counts = chart_library(
+        args.input,
+        output_dir,
+        options,
+        manifest=Path(args.manifest) if args.manifest else None,
+        workers=args.workers,
+        exclude=[Path(path) for path in args.exclude],
+    )
+    print(
+        f"Charted {counts['done']} songs, {counts['failed']} failed, "
+        f"{counts['skipped']} already done"
+    )
 
 
 if __name__ == "__main__":
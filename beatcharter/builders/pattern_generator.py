@@ -0,0 +1,167 @@
+"""
+Arrow choice from precomputed foot placement transition tables.
+
+The player's state is where each foot stands and which foot stepped last. For every state
+the table holds each possible next step, a single arrow hit by either foot or a jump, the
+state it leads to and its weight. Weights start at 1 and are cut for crossovers, jacks,
+drills, double steps and jumps as far as the controller and difficulty allow them, then
+stored as cumulative distributions. Choosing an arrow is then a table lookup and a binary
+search over a handful of actions, so a chart's worth of arrows takes well under a
+millisecond.
+"""
+
+from bisect import bisect_right
+from dataclasses import astuple, dataclass
+from functools import lru_cache
+from itertools import combinations
+from typing import List, Tuple
+
+import numpy as np
+from numpy import float64, int64
+from numpy.typing import NDArray
+
+COLUMNS = 4  # dance-single, left down up right
+
+# Horizontal position of each panel, a foot left of its partner is a crossover
+PANEL_X = (-1, 0, 0, 1)
+
+LEFT_FOOT, RIGHT_FOOT, BOTH_FEET = 0, 1, 2
+
+# Actions: foot * COLUMNS + panel for single steps, then every pair of panels as a jump
+JUMPS: Tuple[Tuple[int, int], ...] = tuple(combinations(range(COLUMNS), 2))
+ACTIONS = 2 * COLUMNS + len(JUMPS)
+
+# States: (left panel, right panel, last foot)
+STATES = COLUMNS * COLUMNS * 3
+
+
+@dataclass(frozen=True)
+class PatternStyle:
+    """Weights of each technique relative to a plain alternating step, at full difficulty"""
+
+    crossover: float  # a foot crossing over its partner
+    jack: float  # the same foot hitting the same arrow again
+    drill: float  # alternating feet, each staying on its arrow
+    double_step: float  # the same foot moving twice in a row
+    jump: float  # two arrows at once
+
+
+@dataclass(frozen=True)
+class TransitionTable:
+    next_state: NDArray[int64]  # STATES x ACTIONS state each action leads to
+    cdf: NDArray[float64]  # STATES x ACTIONS cumulative action weights, each row ends at 1
+    steps: NDArray[int64]  # ACTIONS x 2 columns hit by each action, -1 for none
+
+
+def encode_state(left: int, right: int, last_foot: int) -> int:
+    return (left * COLUMNS + right) * 3 + last_foot
+
+
+def step_weight(
+    style: PatternStyle, left: int, right: int, last_foot: int, foot: int, panel: int
+) -> float:
+    """Weight of one foot stepping onto panel from the given state, 0 if it can't"""
+    other = right if foot == LEFT_FOOT else left
+    if panel == other:
+        return 0.0
+    new_left, new_right = (panel, right) if foot == LEFT_FOOT else (left, panel)
+    if new_left == COLUMNS - 1 and new_right == 0:
+        # Facing backwards
+        return 0.0
+
+    weight = 1.0
+    if PANEL_X[new_left] > PANEL_X[new_right]:
+        weight *= style.crossover
+    origin = left if foot == LEFT_FOOT else right
+    if last_foot == BOTH_FEET:
+        return weight * (style.drill if origin == panel else 1.0)
+    if foot == last_foot:
+        weight *= style.jack if origin == panel else style.double_step
+    elif origin == panel:
+        weight *= style.drill
+    return weight
+
+
+@lru_cache(maxsize=None)
+def build_transition_table(style: PatternStyle, technique: float) -> TransitionTable:
+    """
+    Build the transition table of a controller style at a difficulty.
+
+    Args:
+        style: Technique weights of the controller
+        technique: 0 to 1, how much of the style's techniques the difficulty allows. At 0
+            only alternating steps without crossovers are written.
+
+    Returns:
+        TransitionTable: built once per style and technique, then shared
+    """
+    scaled = PatternStyle(*(weight * technique for weight in astuple(style)))
+    next_state = np.zeros((STATES, ACTIONS), dtype=int64)
+    weights = np.zeros((STATES, ACTIONS), dtype=float64)
+    steps = np.full((ACTIONS, 2), -1, dtype=int64)
+    steps[: 2 * COLUMNS, 0] = np.tile(np.arange(COLUMNS), 2)
+    steps[2 * COLUMNS :] = JUMPS
+
+    for left in range(COLUMNS):
+        for right in range(COLUMNS):
+            for last_foot in (LEFT_FOOT, RIGHT_FOOT, BOTH_FEET):
+                state = encode_state(left, right, last_foot)
+                for foot in (LEFT_FOOT, RIGHT_FOOT):
+                    for panel in range(COLUMNS):
+                        action = foot * COLUMNS + panel
+                        feet = (panel, right) if foot == LEFT_FOOT else (left, panel)
+                        next_state[state, action] = encode_state(*feet, foot)
+                        weights[state, action] = step_weight(
+                            scaled, left, right, last_foot, foot, panel
+                        )
+                for i, (left_panel, right_panel) in enumerate(JUMPS):
+                    action = 2 * COLUMNS + i
+                    next_state[state, action] = encode_state(left_panel, right_panel, BOTH_FEET)
+                    weights[state, action] = scaled.jump
+
+                # A state the difficulty leaves no way out of, such as crossed feet with
+                # crossovers ruled out, steps the other foot as the full style allows
+                if not weights[state].any():
+                    for foot in (LEFT_FOOT, RIGHT_FOOT):
+                        if foot == last_foot:
+                            continue
+                        for panel in range(COLUMNS):
+                            weights[state, foot * COLUMNS + panel] = step_weight(
+                                style, left, right, last_foot, foot, panel
+                            )
+
+    cdf = np.cumsum(weights, axis=1)
+    cdf /= cdf[:, -1:]
+    return TransitionTable(next_state, cdf, steps)
+
+
+# Where the feet start, on the left and right arrows
+START_STATE = encode_state(0, COLUMNS - 1, BOTH_FEET)
+
+
+def generate_steps(
+    table: TransitionTable, count: int, rng: np.random.Generator
+) -> NDArray[int64]:
+    """
+    Walk a transition table for count notes.
+
+    Args:
+        table: Table of the controller and difficulty
+        count: Number of notes
+        rng: Source of the random draws, all made up front
+
+    Returns:
+        NDArray: count x 2 columns of each note, the second -1 unless it is a jump
+    """
+    # Python lists index far faster than NumPy scalars inside the walk
+    next_state: List[List[int]] = table.next_state.tolist()
+    cdf: List[List[float]] = table.cdf.tolist()
+    draws = rng.random(count).tolist()
+
+    actions = []
+    state = START_STATE
+    for draw in draws:
+        action = min(bisect_right(cdf[state], draw), ACTIONS - 1)
+        actions.append(action)
+        state = next_state[state][action]
+    return table.steps[np.array(actions, dtype=int64)]
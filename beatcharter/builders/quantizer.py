@@ -0,0 +1,196 @@
+"""
+Vectorized onset to grid quantization.
+
+Times are converted to chart rows through the BPM segments, snapped to the nearest row of
+the allowed subdivisions, thinned to the difficulty's density and laid out as a
+rows x columns uint8 note array. Every step is a handful of NumPy passes over the whole
+song, so a ten minute song quantizes in a few milliseconds.
+"""
+
+from typing import Sequence
+
+import numpy as np
+from numpy import float32, float64, int64, uint8
+from numpy.typing import NDArray
+
+ROWS_PER_BEAT = 48
+BEATS_PER_MEASURE = 4
+ROWS_PER_MEASURE = ROWS_PER_BEAT * BEATS_PER_MEASURE  # 192nd notes
+
+# Note codes, the digits StepMania writes for each of them, except mines which are M
+NOTE_EMPTY = 0
+NOTE_TAP = 1
+NOTE_HOLD_HEAD = 2
+NOTE_TAIL = 3
+NOTE_ROLL_HEAD = 4
+NOTE_MINE = 5
+
+
+def times_to_beats(
+    times: NDArray[float64], bpm_segments: NDArray[float64], first_downbeat: float = 0.0
+) -> NDArray[float64]:
+    """
+    Convert times in seconds to chart beats.
+
+    Args:
+        times: Times in seconds from the start of the song
+        bpm_segments: (beat, bpm) rows, the first starting at beat 0
+        first_downbeat: Time in seconds of beat 0
+
+    Returns:
+        NDArray: beat of each time, negative before beat 0
+    """
+    bpm_segments = np.asarray(bpm_segments, dtype=float64).reshape(-1, 2)
+    segment_beats, segment_bpms = bpm_segments[:, 0], bpm_segments[:, 1]
+    # Time each segment starts at, from the length of the ones before it
+    segment_seconds = np.diff(segment_beats) * 60.0 / segment_bpms[:-1]
+    segment_times = first_downbeat + np.concatenate(([0.0], np.cumsum(segment_seconds)))
+
+    times = np.asarray(times, dtype=float64)
+    segment = np.clip(np.searchsorted(segment_times, times, side="right") - 1, 0, None)
+    return segment_beats[segment] + (times - segment_times[segment]) * segment_bpms[segment] / 60.0
+
+
+def beats_to_times(
+    beats: NDArray[float64], bpm_segments: NDArray[float64], first_downbeat: float = 0.0
+) -> NDArray[float64]:
+    """
+    Convert chart beats to times in seconds, the inverse of times_to_beats.
+
+    Args:
+        beats: Chart beats
+        bpm_segments: (beat, bpm) rows, the first starting at beat 0
+        first_downbeat: Time in seconds of beat 0
+
+    Returns:
+        NDArray: time of each beat in seconds from the start of the song
+    """
+    bpm_segments = np.asarray(bpm_segments, dtype=float64).reshape(-1, 2)
+    segment_beats, segment_bpms = bpm_segments[:, 0], bpm_segments[:, 1]
+    segment_seconds = np.diff(segment_beats) * 60.0 / segment_bpms[:-1]
+    segment_times = first_downbeat + np.concatenate(([0.0], np.cumsum(segment_seconds)))
+
+    beats = np.asarray(beats, dtype=float64)
+    segment = np.clip(np.searchsorted(segment_beats, beats, side="right") - 1, 0, None)
+    return segment_times[segment] + (beats - segment_beats[segment]) * 60.0 / segment_bpms[segment]
+
+
+def grid_offsets(note_types: Sequence[int]) -> NDArray[int64]:
+    """
+    Rows within one beat that the note types land on.
+
+    Args:
+        note_types: Note types per measure, e.g. (4, 8, 12) for quarter, eighth and
+            triplet notes
+
+    Returns:
+        NDArray: sorted row offsets within a beat, closed with ROWS_PER_BEAT
+    """
+    offsets = set()
+    for note_type in note_types:
+        if note_type < BEATS_PER_MEASURE or ROWS_PER_MEASURE % note_type:
+            raise ValueError(f"{note_type}th notes do not fit {ROWS_PER_MEASURE} rows per measure")
+        offsets.update(range(0, ROWS_PER_BEAT + 1, ROWS_PER_MEASURE // note_type))
+    offsets.add(ROWS_PER_BEAT)
+    return np.array(sorted(offsets), dtype=int64)
+
+
+def snap_to_grid(beats: NDArray[float64], note_types: Sequence[int]) -> NDArray[int64]:
+    """Snap beat positions to the nearest row allowed by note_types"""
+    offsets = grid_offsets(note_types)
+    rows = np.asarray(beats, dtype=float64) * ROWS_PER_BEAT
+    whole_beats = np.floor(rows / ROWS_PER_BEAT)
+    within = rows - whole_beats * ROWS_PER_BEAT
+
+    upper = np.clip(np.searchsorted(offsets, within), 1, len(offsets) - 1)
+    lower = upper - 1
+    nearest = np.where(
+        within - offsets[lower] <= offsets[upper] - within, offsets[lower], offsets[upper]
+    )
+    return whole_beats.astype(int64) * ROWS_PER_BEAT + nearest
+
+
+def thin_rows(
+    rows: NDArray[int64], strengths: NDArray[float32], notes_per_beat: float
+) -> NDArray[int64]:
+    """
+    Keep the strongest onset per row, then the strongest rows of each measure.
+
+    Args:
+        rows: Snapped row of each onset
+        strengths: Onset strength of each onset
+        notes_per_beat: Average density allowed, in notes per beat
+
+    Returns:
+        NDArray: the kept rows, sorted
+    """
+    if len(rows) == 0:
+        return rows
+    strengths = np.asarray(strengths, dtype=float64)
+    # Strongest first within each row, then one onset per row
+    order = np.lexsort((-strengths, rows))
+    rows, strengths = rows[order], strengths[order]
+    first = np.concatenate(([True], rows[1:] != rows[:-1]))
+    rows, strengths = rows[first], strengths[first]
+
+    # Rank the rows of each measure by strength and keep the top few
+    per_measure = max(int(round(notes_per_beat * BEATS_PER_MEASURE)), 1)
+    measures = rows // ROWS_PER_MEASURE
+    order = np.lexsort((-strengths, measures))
+    sorted_measures = measures[order]
+    measure_starts = np.flatnonzero(
+        np.concatenate(([True], sorted_measures[1:] != sorted_measures[:-1]))
+    )
+    counts = np.diff(np.concatenate((measure_starts, [len(order)])))
+    rank = np.arange(len(order)) - np.repeat(measure_starts, counts)
+    return np.sort(rows[order[rank < per_measure]])
+
+
+def quantize_onsets(
+    onset_times: NDArray[float64],
+    onset_strengths: NDArray[float32],
+    bpm_segments: NDArray[float64],
+    first_downbeat: float,
+    note_types: Sequence[int],
+    notes_per_beat: float,
+) -> NDArray[int64]:
+    """
+    Turn onsets into the sorted, unique rows that should hold a note.
+
+    Args:
+        onset_times: Onset times in seconds
+        onset_strengths: Strength of each onset, stronger onsets are kept first
+        bpm_segments: (beat, bpm) rows of the chart
+        first_downbeat: Time in seconds of beat 0
+        note_types: Subdivisions notes may land on, e.g. (4, 8, 16)
+        notes_per_beat: Average density allowed, in notes per beat
+
+    Returns:
+        NDArray: rows at ROWS_PER_MEASURE rows per measure, counted from beat 0
+    """
+    beats = times_to_beats(onset_times, bpm_segments, first_downbeat)
+    rows = snap_to_grid(beats, note_types)
+    keep = rows >= 0
+    return thin_rows(rows[keep], np.asarray(onset_strengths)[keep], notes_per_beat)
+
+
+def rows_to_notes(
+    rows: NDArray[int64], columns: NDArray[int64], n_columns: int = 4, n_rows: int = 0
+) -> NDArray[uint8]:
+    """
+    Lay out taps as a rows x columns note array, padded to whole measures.
+
+    Args:
+        rows: Row of each tap
+        columns: Column of each tap
+        n_columns: Columns of the chart, 4 for dance-single
+        n_rows: Minimum number of rows, e.g. to cover the whole song
+
+    Returns:
+        NDArray[uint8]: note codes, ROWS_PER_MEASURE rows per measure
+    """
+    last_row = int(rows.max()) + 1 if len(rows) else 0
+    n_measures = max(-(-max(last_row, n_rows) // ROWS_PER_MEASURE), 1)
+    notes = np.zeros((n_measures * ROWS_PER_MEASURE, n_columns), dtype=uint8)
+    notes[rows, columns] = NOTE_TAP
+    return notes
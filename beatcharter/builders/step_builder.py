@@ -1,5 +1,36 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from enum import Enum
-from beatchart.beatchart import Beatchart  # Assuming this is the correct import path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy import int64, uint8
+from numpy.typing import NDArray
+
+from beatcharter.beatchart.beatchart import Beatchart
+from beatcharter.builders.pattern_generator import (
+    COLUMNS,
+    PatternStyle,
+    build_transition_table,
+    generate_steps,
+)
+from beatcharter.builders.quantizer import (
+    NOTE_HOLD_HEAD,
+    NOTE_MINE,
+    NOTE_ROLL_HEAD,
+    NOTE_TAIL,
+    NOTE_TAP,
+    ROWS_PER_BEAT,
+    quantize_onsets,
+    rows_to_notes,
+    times_to_beats,
+)
+from beatcharter.builders.shared_arrays import SharedArrays, SharedArraysSpec, attach
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
 
 
 class StepDifficulty(Enum):
@@ -16,6 +47,44 @@ class ControllerType(Enum):
     KEYBOARD = 3  # Not limited to two directions
 
 
+@dataclass(frozen=True)
+class DifficultyGrid:
+    note_types: Tuple[int, ...]  # subdivisions notes may land on, 4 = quarter notes
+    notes_per_beat: float  # average density allowed
+    technique: float  # 0 to 1, share of the controller's PatternStyle allowed
+
+
+DIFFICULTY_GRIDS: Dict[StepDifficulty, DifficultyGrid] = {
+    StepDifficulty.BEGINNER: DifficultyGrid((4,), 0.5, 0.0),
+    StepDifficulty.EASY: DifficultyGrid((4, 8), 1.0, 0.0),
+    StepDifficulty.MEDIUM: DifficultyGrid((4, 8, 12), 1.5, 0.5),
+    StepDifficulty.HARD: DifficultyGrid((4, 8, 12, 16), 2.0, 0.8),
+    StepDifficulty.CHALLENGE: DifficultyGrid((4, 8, 12, 16, 24), 3.0, 1.0),
+}
+
+# Techniques each controller handles, relative to a plain alternating step
+CONTROLLER_STYLES: Dict[ControllerType, PatternStyle] = {
+    # The bar makes crossovers and turns manageable
+    ControllerType.ARCADE: PatternStyle(
+        crossover=0.3, jack=0.15, drill=0.3, double_step=0.02, jump=0.08
+    ),
+    # Soft pads slide, keep to alternating steps facing forward
+    ControllerType.PAD: PatternStyle(
+        crossover=0.1, jack=0.1, drill=0.25, double_step=0.01, jump=0.06
+    ),
+    # Fingers don't cross over or need to alternate
+    ControllerType.KEYBOARD: PatternStyle(
+        crossover=1.0, jack=0.4, drill=0.6, double_step=1.0, jump=0.12
+    ),
+}
+
+# Gaps between notes, in beats, long enough to turn the first note into a hold or roll,
+# or to place a mine between them
+HOLD_MIN_GAP_BEATS = 2
+ROLL_MIN_GAP_BEATS = 4
+MINE_MIN_GAP_BEATS = 1.5
+
+
 class BuilderProfile:
     def __init__(
         self,
@@ -32,7 +101,90 @@ class BuilderProfile:
         self.rolls = rolls  # Refers to a held note that must be tapped repeatedly.
 
 
+def default_profiles(
+    controller_type: ControllerType = ControllerType.PAD,
+) -> List[BuilderProfile]:
+    """One profile per difficulty, holds from Easy, mines from Medium, rolls from Hard"""
+    return [
+        BuilderProfile(
+            difficulty,
+            controller_type,
+            mines=difficulty.value >= StepDifficulty.MEDIUM.value,
+            holds=difficulty.value >= StepDifficulty.EASY.value,
+            rolls=difficulty.value >= StepDifficulty.HARD.value,
+        )
+        for difficulty in StepDifficulty
+    ]
+
+
+# Chart arrays shared with build workers
+SHARED_FIELDS = ("beat_times", "onset_times", "onset_strengths", "bpm_segments")
+
+# Per worker process chart, mapped from shared memory once by _init_worker
+_worker_chart: Optional[Beatchart] = None
+_worker_memory = None
+
+
+def _init_worker(spec: SharedArraysSpec, name, file_object, bpm, start, end, downbeat_index):
+    global _worker_chart, _worker_memory
+    _worker_memory, arrays = attach(spec)
+    _worker_chart = Beatchart(name, file_object, bpm)
+    _worker_chart.songStartOffsetSeconds = start
+    _worker_chart.songEndSeconds = end
+    _worker_chart.downbeat_index = downbeat_index
+    for field in SHARED_FIELDS:
+        setattr(_worker_chart, field, arrays[field])
+
+
+def _build_worker(profile: BuilderProfile) -> NDArray[uint8]:
+    return StepBuilder.build_profile(_worker_chart, profile)
+
+
 class StepBuilder:
+    @staticmethod
+    def build_all(
+        chart: Beatchart,
+        profiles: Optional[Sequence[BuilderProfile]] = None,
+        workers: Optional[int] = None,
+    ) -> Dict[StepDifficulty, NDArray[uint8]]:
+        """
+        Build every difficulty of a chart from one analysis, one profile per worker process.
+
+        The chart's arrays are placed in shared memory once, every worker maps them instead
+        of receiving a pickled copy, so the whole build takes about as long as the slowest
+        difficulty.
+
+        Args:
+            chart: Decoded chart to generate steps from
+            profiles: Profiles to build, defaults to default_profiles()
+            workers: Number of worker processes, defaults to one per profile. 1 builds in
+                this process.
+
+        Returns:
+            Dict[StepDifficulty, NDArray[uint8]]: note array per difficulty, in profile order
+        """
+        profiles = list(profiles) if profiles is not None else default_profiles()
+        workers = min(workers or os.cpu_count() or 1, len(profiles))
+        if workers <= 1:
+            return {p.difficulty: StepBuilder.build_profile(chart, p) for p in profiles}
+
+        with SharedArrays({field: getattr(chart, field) for field in SHARED_FIELDS}) as shared:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(
+                    shared.spec,
+                    chart.name,
+                    chart.file_object,
+                    chart.bpm,
+                    chart.songStartOffsetSeconds,
+                    chart.songEndSeconds,
+                    chart.downbeat_index,
+                ),
+            ) as executor:
+                futures = [(p.difficulty, executor.submit(_build_worker, p)) for p in profiles]
+                return {difficulty: future.result() for difficulty, future in futures}
+
     @staticmethod
     def build(
         beatchart_object: Beatchart,
@@ -41,7 +193,7 @@ class StepBuilder:
         mines: bool,
         holds: bool,
         rolls: bool,
-    ) -> str:
+    ) -> NDArray[uint8]:
         """
         Generate steps from the audio file
 
@@ -54,9 +206,98 @@ class StepBuilder:
             rolls: Whether to include roll notes
 
         Returns:
-            str: String containing the steps
+            NDArray[uint8]: rows x columns note codes, 192 rows per measure
         """
         profile = BuilderProfile(difficulty, controller_type, mines, holds, rolls)
 
-        print(f"Generating SM with difficulty: {profile.difficulty}")
-        return ""
+        logger.debug(f"Generating SM with difficulty: {profile.difficulty}")
+        return StepBuilder.build_profile(beatchart_object, profile)
+
+    @staticmethod
+    def build_profile(chart: Beatchart, profile: BuilderProfile) -> NDArray[uint8]:
+        """Quantize the chart's onsets to the profile's grid and lay out its notes"""
+        grid = DIFFICULTY_GRIDS[profile.difficulty]
+        rows = quantize_onsets(
+            chart.onset_times,
+            chart.onset_strengths,
+            chart.bpm_segments,
+            chart.songStartOffsetSeconds,
+            grid.note_types,
+            grid.notes_per_beat,
+        )
+        steps = StepBuilder.choose_columns(rows, profile)
+        columns, jump_columns = steps[:, 0], steps[:, 1]
+
+        # Pad to the end of the song rather than the last note
+        song_beats = times_to_beats(
+            [chart.songEndSeconds], chart.bpm_segments, chart.songStartOffsetSeconds
+        )[0]
+        notes = rows_to_notes(rows, columns, COLUMNS, int(max(song_beats, 0) * ROWS_PER_BEAT))
+        jumps = jump_columns >= 0
+        notes[rows[jumps], jump_columns[jumps]] = NOTE_TAP
+        StepBuilder.add_holds_and_mines(notes, rows, columns, profile, jump_columns)
+        return notes
+
+    @staticmethod
+    def choose_columns(rows: NDArray[int64], profile: BuilderProfile) -> NDArray[int64]:
+        """
+        Pick the arrows of each note by walking the foot placement table of the profile's
+        controller and difficulty.
+
+        Returns:
+            NDArray: len(rows) x 2 columns, the second -1 unless the note is a jump
+        """
+        table = build_transition_table(
+            CONTROLLER_STYLES[profile.controller_type],
+            DIFFICULTY_GRIDS[profile.difficulty].technique,
+        )
+        # Seeded by the profile so rebuilding a chart gives the same steps
+        rng = np.random.default_rng(profile.difficulty.value)
+        return generate_steps(table, len(rows), rng)
+
+    @staticmethod
+    def add_holds_and_mines(
+        notes: NDArray[uint8],
+        rows: NDArray[int64],
+        columns: NDArray[int64],
+        profile: BuilderProfile,
+        jump_columns: Optional[NDArray[int64]] = None,
+    ) -> None:
+        """
+        Turn notes followed by long gaps into holds or rolls and fill shorter gaps with mines.
+        Holds start on the first arrow of a jump, mines keep off both arrows of the next note.
+        """
+        if len(rows) < 2:
+            return
+        gaps = np.diff(rows)
+        heads, head_columns = rows[:-1], columns[:-1]
+
+        long_gaps = np.zeros(len(gaps), dtype=bool)
+        if profile.holds or profile.rolls:
+            head = NOTE_HOLD_HEAD if profile.holds else NOTE_ROLL_HEAD
+            long_gaps = gaps >= HOLD_MIN_GAP_BEATS * ROWS_PER_BEAT
+            codes = np.full(len(gaps), head, dtype=uint8)
+            if profile.rolls:
+                codes[gaps >= ROLL_MIN_GAP_BEATS * ROWS_PER_BEAT] = NOTE_ROLL_HEAD
+            # Release halfway through the gap, on a 16th
+            tails = heads + (gaps // 2) // 12 * 12
+            notes[heads[long_gaps], head_columns[long_gaps]] = codes[long_gaps]
+            notes[tails[long_gaps], head_columns[long_gaps]] = NOTE_TAIL
+
+        if profile.mines:
+            mine_gaps = (gaps >= MINE_MIN_GAP_BEATS * ROWS_PER_BEAT) & ~long_gaps
+            mine_rows = heads + (gaps // 2) // 12 * 12
+            # Opposite the previous note, or beside it if the next note is there
+            if jump_columns is None:
+                jump_columns = np.full(len(rows), -1, dtype=int64)
+            mine_columns = np.full(len(gaps), -1, dtype=int64)
+            for shift in (2, 1, 3):
+                candidates = (head_columns + shift) % COLUMNS
+                free = (
+                    (mine_columns < 0)
+                    & (candidates != columns[1:])
+                    & (candidates != jump_columns[1:])
+                )
+                mine_columns[free] = candidates[free]
+            mine_gaps &= mine_columns >= 0
+            notes[mine_rows[mine_gaps], mine_columns[mine_gaps]] = NOTE_MINE
@@ -0,0 +1,268 @@
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from beatcharter.beatchart.audio_analysis.analysis_cache import hash_file
+from beatcharter.beatchart.beatchart_decoder import BeatchartDecoder
+from beatcharter.builders.step_builder import StepBuilder
+from beatcharter.encoders.chart_model import ChartNotes, write_charts
+from beatcharter.encoders.sm_encoder import SMEncoder
+from beatcharter.encoders.song_packager import PackageMode
+from beatcharter.encoders.ssc_encoder import SSCEncoder
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+ENCODERS = {"sm": SMEncoder, "ssc": SSCEncoder}
+
+AUDIO_EXTENSIONS = (".flac", ".mp3", ".ogg", ".wav")
+
+# Song states recorded in the manifest
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+
+@dataclass
+class ChartOptions:
+    """How each song is charted, shared by every song of a batch"""
+
+    encodings: Tuple[str, ...] = ("sm",)
+    bpm: float = 0.0  # 0 to detect it
+    variable_tempo: bool = False
+    start: float = 0.0
+    duration: Optional[float] = None
+    backend: str = "cascade"
+    package_mode: str = PackageMode.HARDLINK.value
+
+
+def generate_charts(
+    decoder: BeatchartDecoder,
+    audio_file: Path,
+    output_dir: Path,
+    options: ChartOptions,
+    build_workers: Optional[int] = None,
+) -> List[Path]:
+    """
+    Decode, build and encode one song.
+
+    Args:
+        decoder: Decoder to analyze the song with
+        audio_file: Song audio file
+        output_dir: Directory the song directory is created in
+        options: How to chart the song
+        build_workers: Processes to build the difficulties on, see StepBuilder.build_all
+
+    Returns:
+        List[Path]: the chart files written
+    """
+    chart = decoder.decode_song(
+        audio_file, options.bpm, options.variable_tempo, options.start, options.duration
+    )
+    logger.info(f"{audio_file}: {chart.bpm:.2f} bpm, #OFFSET {chart.offset:.3f}")
+
+    # Every difficulty from the one analysis
+    notes = StepBuilder.build_all(chart, workers=build_workers)
+    charts = [ChartNotes(difficulty, chart_notes) for difficulty, chart_notes in notes.items()]
+
+    # Every format from one pass over the note data, the song is placed once
+    hash_song = decoder.cache.hash_audio if decoder.cache is not None else hash_file
+    with ExitStack() as stack:
+        encoders = [
+            stack.enter_context(
+                ENCODERS[encoding](
+                    chart,
+                    output_dir,
+                    copy_song=i == 0,
+                    package_mode=PackageMode(options.package_mode),
+                    hash_file=hash_song,
+                )
+            )
+            for i, encoding in enumerate(options.encodings)
+        ]
+        write_charts(encoders, charts)
+    return [encoder.path for encoder in encoders]
+
+
+# Per worker process decoder, created once by _init_worker
+_decoder: Optional[BeatchartDecoder] = None
+
+
+def _init_worker(backend: str) -> None:
+    global _decoder
+    _decoder = BeatchartDecoder(backend)
+
+
+def chart_song(audio_file: Path, output_dir: Path, options: ChartOptions) -> Dict[str, Any]:
+    """Chart a single song in a worker process and return its manifest record"""
+    record = song_record(audio_file)
+    started = time.perf_counter()
+    try:
+        # The pool already runs one song per CPU, so difficulties are built serially
+        outputs = generate_charts(_decoder, audio_file, output_dir, options, build_workers=1)
+        record.update(state=STATE_DONE, outputs=[str(path) for path in outputs])
+    except Exception as e:
+        record.update(state=STATE_FAILED, error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def song_record(audio_file: Path) -> Dict[str, Any]:
+    """Manifest identity of a song: its path, size and mtime, so edited songs are redone"""
+    stat = audio_file.stat()
+    return {
+        "audio_file": str(audio_file.resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def find_audio_files(pattern: str, exclude: Sequence[Path] = ()) -> Iterator[Path]:
+    """
+    Yield the audio files of a directory, searched recursively, or matching a glob.
+    A glob matching directories yields the audio files under each of them. Files under any
+    of the exclude directories are skipped.
+    """
+    excluded = [Path(path).resolve() for path in exclude]
+    for path in _find_audio_files(pattern):
+        if not any(path.resolve().is_relative_to(directory) for directory in excluded):
+            yield path
+
+
+def library_root(pattern: str) -> Path:
+    """The directory a library pattern searches, its path up to the first glob wildcard"""
+    parts = Path(pattern).parts
+    for i, part in enumerate(parts):
+        if glob.has_magic(part):
+            return Path(*parts[:i]) if i else Path(".")
+    return Path(pattern) if Path(pattern).is_dir() else Path(pattern).parent
+
+
+def song_output_dir(audio_file: Path, root: Path, output_dir: Path) -> Path:
+    """
+    Directory a library song's directory is created in. The folders between the library
+    root and the song are kept, so same named songs of different albums stay apart.
+    """
+    return output_dir / audio_file.parent.relative_to(root)
+
+
+def _find_audio_files(pattern: str) -> Iterator[Path]:
+    if Path(pattern).is_dir():
+        paths = [Path(pattern)]
+    else:
+        paths = sorted(map(Path, glob.glob(pattern, recursive=True)))
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(
+                p for p in path.rglob("*") if p.suffix.lower() in AUDIO_EXTENSIONS and p.is_file()
+            )
+        elif path.suffix.lower() in AUDIO_EXTENSIONS:
+            yield path
+
+
+def read_manifest(manifest: Path) -> Dict[str, Dict[str, Any]]:
+    """Return the latest record of each song in a manifest, by resolved audio path"""
+    records: Dict[str, Dict[str, Any]] = {}
+    if not manifest.exists():
+        return records
+    with open(manifest, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            records[record["audio_file"]] = record
+    return records
+
+
+def is_finished(record: Optional[Dict[str, Any]], audio_file: Path) -> bool:
+    """True if a song was charted, is unchanged since, and its charts are still there"""
+    if record is None or record.get("state") != STATE_DONE:
+        return False
+    current = song_record(audio_file)
+    return (record["size"], record["mtime_ns"]) == (current["size"], current["mtime_ns"]) and all(
+        Path(path).exists() for path in record.get("outputs", [])
+    )
+
+
+def chart_library(
+    pattern: str,
+    output_dir: Path,
+    options: ChartOptions,
+    manifest: Optional[Path] = None,
+    workers: Optional[int] = None,
+    exclude: Sequence[Path] = (),
+) -> Dict[str, int]:
+    """
+    Chart every song of a directory or glob on a process pool.
+
+    Each song's state is appended to a JSONL manifest as soon as it finishes. Songs the
+    manifest records as done, unchanged and with their charts in place are skipped, so an
+    interrupted run picks up where it stopped. Failed songs are retried. Only a few songs
+    per worker are in flight at once, which keeps memory flat however large the library is.
+
+    Args:
+        pattern: Directory to search recursively, or a glob of audio files or directories
+        output_dir: Directory the song directories are created in, under the same folders
+            as the songs are under the library root
+        options: How to chart each song
+        manifest: JSONL manifest, defaults to beatcharter_manifest.jsonl in output_dir
+        workers: Number of worker processes, defaults to the number of CPUs
+        exclude: Directories whose songs are not charted, e.g. an output_dir inside the
+            library, whose placed songs would otherwise be charted again
+
+    Returns:
+        Dict[str, int]: number of songs per state, plus "skipped"
+    """
+    manifest = manifest or output_dir / "beatcharter_manifest.jsonl"
+    records = read_manifest(manifest)
+    counts = {STATE_DONE: 0, STATE_FAILED: 0, "skipped": 0}
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    with open(manifest, "a", encoding="utf-8") as writer, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(options.backend,)
+    ) as executor:
+        in_flight: Set[Future] = set()
+
+        def drain() -> None:
+            nonlocal in_flight
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                writer.write(json.dumps(record) + "\n")
+                writer.flush()
+                counts[record["state"]] += 1
+                if record["state"] == STATE_FAILED:
+                    logger.error(f"Error charting {record['audio_file']}: {record['error']}")
+                else:
+                    logger.info(f"Charted {record['audio_file']} in {record['seconds']}s")
+
+        root = library_root(pattern)
+        for audio_file in find_audio_files(pattern, exclude):
+            if is_finished(records.get(str(audio_file.resolve())), audio_file):
+                counts["skipped"] += 1
+                continue
+            in_flight.add(
+                executor.submit(
+                    chart_song, audio_file, song_output_dir(audio_file, root, output_dir), options
+                )
+            )
+            if len(in_flight) >= max_in_flight:
+                drain()
+
+        while in_flight:
+            drain()
+
+    if counts["skipped"]:
+        logger.info(f"Skipped {counts['skipped']} songs already charted in {manifest}")
+    return counts
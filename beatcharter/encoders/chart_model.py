@@ -0,0 +1,117 @@
+"""
+Chart model shared by every encoder.
+
+The charts of a song are built once, as uint8 note arrays, and each measure is encoded to
+bytes once. write_charts hands those same bytes to every encoder, so writing .sm and .ssc
+together costs one pass over the note data.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy import int64, uint8
+from numpy.typing import NDArray
+
+from beatcharter.builders.quantizer import ROWS_PER_MEASURE
+from beatcharter.builders.step_builder import StepDifficulty
+from beatcharter.encoders.groove_radar import GrooveRadar
+from stepchart_utils.note_data import NOTE_CHARACTERS
+
+# Rows per measure a measure may be written at, coarsest first
+MEASURE_RESOLUTIONS = (4, 8, 12, 16, 24, 32, 48, 64, 96, 192)
+
+# Character written for each note code, the same table parsed charts are read with
+NOTE_CHARS = np.frombuffer(NOTE_CHARACTERS, dtype=uint8)
+NEWLINE = ord("\n")
+
+DIFFICULTY_METERS: Dict[StepDifficulty, int] = {
+    StepDifficulty.BEGINNER: 2,
+    StepDifficulty.EASY: 4,
+    StepDifficulty.MEDIUM: 6,
+    StepDifficulty.HARD: 8,
+    StepDifficulty.CHALLENGE: 10,
+}
+
+
+@dataclass
+class ChartNotes:
+    """One chart of a song: its notes and, optionally, timing of its own"""
+
+    difficulty: StepDifficulty
+    notes: NDArray[uint8]  # rows x columns note codes, ROWS_PER_MEASURE rows per measure
+    step_type: str = "dance-single"
+    description: str = ""
+    meter: Optional[int] = None  # defaults to DIFFICULTY_METERS
+    bpms: Optional[List[Tuple[float, float]]] = None  # None to use the song's #BPMS
+    offset: Optional[float] = None  # None to use the song's #OFFSET
+    radar: Optional[GrooveRadar] = None  # computed by the first encoder to write the chart
+
+    @property
+    def difficulty_name(self) -> str:
+        return self.difficulty.name.title()
+
+    @property
+    def difficulty_meter(self) -> int:
+        return self.meter if self.meter is not None else DIFFICULTY_METERS[self.difficulty]
+
+
+def measure_resolutions(notes: NDArray[uint8]) -> NDArray[int64]:
+    """
+    Smallest rows per measure that holds every note of each measure, for all measures at once.
+
+    Args:
+        notes: rows x columns note codes, ROWS_PER_MEASURE rows per measure
+
+    Returns:
+        NDArray: rows per measure to write each measure at
+    """
+    occupied = notes.reshape(-1, ROWS_PER_MEASURE, notes.shape[1]).any(axis=2)
+    row_index = np.arange(ROWS_PER_MEASURE)
+    resolutions = np.full(len(occupied), ROWS_PER_MEASURE, dtype=int64)
+    # Walk from finest to coarsest so the coarsest fitting resolution is the one kept
+    for resolution in reversed(MEASURE_RESOLUTIONS):
+        off_grid = row_index % (ROWS_PER_MEASURE // resolution) != 0
+        fits = ~(occupied & off_grid).any(axis=1)
+        resolutions[fits] = resolution
+    return resolutions
+
+
+def encode_measures(notes: NDArray[uint8]) -> Iterator[bytes]:
+    """
+    Encode note data one measure at a time, each at the coarsest resolution that fits.
+
+    Yields:
+        bytes: one measure of note rows, preceded by the comma separating it from the last
+    """
+    notes = np.asarray(notes, dtype=uint8)
+    if len(notes) % ROWS_PER_MEASURE:
+        notes = np.pad(notes, ((0, ROWS_PER_MEASURE - len(notes) % ROWS_PER_MEASURE), (0, 0)))
+    resolutions = measure_resolutions(notes)
+
+    # One reused buffer: a row of note characters plus a newline
+    lines = np.full((ROWS_PER_MEASURE, notes.shape[1] + 1), NEWLINE, dtype=uint8)
+    for measure, resolution in enumerate(resolutions):
+        start = measure * ROWS_PER_MEASURE
+        rows = notes[start : start + ROWS_PER_MEASURE : ROWS_PER_MEASURE // resolution]
+        out = lines[:resolution]
+        np.take(NOTE_CHARS, rows, out=out[:, :-1])
+        yield (b",\n" if measure else b"") + out.tobytes()
+
+
+def write_charts(encoders: Sequence, charts: Sequence[ChartNotes]) -> None:
+    """
+    Write every chart to every open encoder, encoding each measure only once.
+
+    Args:
+        encoders: Entered SMEncoder / SSCEncoder instances
+        charts: Charts to write, in order
+    """
+    for chart in charts:
+        for encoder in encoders:
+            encoder.begin_chart(chart)
+        for measure in encode_measures(chart.notes):
+            for encoder in encoders:
+                encoder.write_measure(measure)
+        for encoder in encoders:
+            encoder.end_chart()
@@ -0,0 +1,140 @@
+"""
+Groove radar values computed from a chart's notes and timing.
+
+Follows StepMania's radar categories: stream is the average arrow density, voltage the
+peak density over 8 beat windows, air the jumps, freeze the holds and chaos the arrows off
+the 8th note grid, each per second and capped at 1, followed by the raw counts. Every
+value is a few NumPy passes over the chart's note rows, so radar costs nothing next to
+building the chart and a whole library of parsed charts can be rescored in bulk.
+"""
+
+from dataclasses import astuple, dataclass
+from typing import Optional
+
+import numpy as np
+from numpy import int64, uint8
+from numpy.typing import NDArray
+
+from beatcharter.builders.quantizer import (
+    NOTE_HOLD_HEAD,
+    NOTE_MINE,
+    NOTE_ROLL_HEAD,
+    NOTE_TAP,
+    ROWS_PER_BEAT,
+    beats_to_times,
+)
+
+# Densities, in arrows, jumps, holds or chaotic arrows per second, that max out each radar
+REALLY_FAST_NPS = 7.0
+REALLY_HIGH_VOLTAGE_NPS = 10.0
+REALLY_MANY_JUMPS_PER_SECOND = 1.0
+REALLY_MANY_HOLDS_PER_SECOND = 1.0
+REALLY_CHAOTIC_PER_SECOND = 2.0
+
+VOLTAGE_WINDOW_BEATS = 8
+
+# Rows apart of 8th notes, arrows off this grid are chaotic
+EIGHTH_ROWS = ROWS_PER_BEAT // 2
+
+
+@dataclass(frozen=True)
+class GrooveRadar:
+    stream: float
+    voltage: float
+    air: float
+    freeze: float
+    chaos: float
+    notes: int  # arrows, a jump is two
+    taps_and_holds: int  # rows with arrows
+    jumps: int  # rows with two or more arrows
+    holds: int
+    mines: int
+    hands: int  # rows with three or more arrows
+    rolls: int
+
+    def format(self) -> str:
+        """The radar value list of an .sm #NOTES or .ssc #RADARVALUES, for both players"""
+        # StepMania's order lists rolls after hands, older files stop at hands
+        values = ",".join(f"{value:.6f}" for value in astuple(self)[:11])
+        return f"{values},{values}"
+
+
+def compute_radar_rows(
+    rows: NDArray[int64],
+    notes: NDArray[uint8],
+    bpm_segments: NDArray,
+    song_seconds: Optional[float] = None,
+) -> GrooveRadar:
+    """
+    Radar of a chart given as its non-empty rows.
+
+    Args:
+        rows: Row of each note line, ROWS_PER_BEAT rows per beat, ascending
+        notes: len(rows) x columns note codes
+        bpm_segments: (beat, bpm) rows, the first starting at beat 0
+        song_seconds: Length the densities are averaged over, defaults to the time of the
+            last note
+
+    Returns:
+        GrooveRadar
+    """
+    rows = np.asarray(rows, dtype=int64)
+    notes = np.asarray(notes, dtype=uint8).reshape(len(rows), -1)
+    arrows_per_row = np.isin(notes, (NOTE_TAP, NOTE_HOLD_HEAD, NOTE_ROLL_HEAD)).sum(axis=1)
+    arrow_rows = arrows_per_row > 0
+    n_arrows = int(arrows_per_row.sum())
+    jumps = int((arrows_per_row >= 2).sum())
+    holds = int((notes == NOTE_HOLD_HEAD).sum())
+    rolls = int((notes == NOTE_ROLL_HEAD).sum())
+    mines = int((notes == NOTE_MINE).sum())
+
+    if not n_arrows:
+        return GrooveRadar(0.0, 0.0, 0.0, 0.0, 0.0, 0, 0, 0, holds, mines, 0, rolls)
+
+    last_beat = rows[arrow_rows][-1] / ROWS_PER_BEAT
+    if song_seconds is None:
+        song_seconds = float(beats_to_times([last_beat], bpm_segments)[0])
+    song_seconds = max(song_seconds, 1.0)
+
+    # Peak arrows per beat over 8 beat windows, played at the song's average beat rate
+    window_arrows = np.bincount(
+        rows // (VOLTAGE_WINDOW_BEATS * ROWS_PER_BEAT), weights=arrows_per_row
+    )
+    beats_per_second = max(last_beat, 1.0) / song_seconds
+    peak_nps = window_arrows.max() / VOLTAGE_WINDOW_BEATS * beats_per_second
+
+    chaotic = int(arrow_rows[rows % EIGHTH_ROWS != 0].sum())
+    return GrooveRadar(
+        stream=min(n_arrows / song_seconds / REALLY_FAST_NPS, 1.0),
+        voltage=min(peak_nps / REALLY_HIGH_VOLTAGE_NPS, 1.0),
+        air=min(jumps / song_seconds / REALLY_MANY_JUMPS_PER_SECOND, 1.0),
+        freeze=min((holds + rolls) / song_seconds / REALLY_MANY_HOLDS_PER_SECOND, 1.0),
+        chaos=min(chaotic / song_seconds / REALLY_CHAOTIC_PER_SECOND, 1.0),
+        notes=n_arrows,
+        taps_and_holds=int(arrow_rows.sum()),
+        jumps=jumps,
+        holds=holds,
+        mines=mines,
+        hands=int((arrows_per_row >= 3).sum()),
+        rolls=rolls,
+    )
+
+
+def compute_radar(
+    notes: NDArray[uint8], bpm_segments: NDArray, song_seconds: Optional[float] = None
+) -> GrooveRadar:
+    """
+    Radar of a chart given as a full note array.
+
+    Args:
+        notes: rows x columns note codes, ROWS_PER_BEAT rows per beat
+        bpm_segments: (beat, bpm) rows, the first starting at beat 0
+        song_seconds: Length the densities are averaged over, defaults to the time of the
+            last note
+
+    Returns:
+        GrooveRadar
+    """
+    notes = np.asarray(notes, dtype=uint8)
+    rows = np.flatnonzero(notes.any(axis=1))
+    return compute_radar_rows(rows, notes[rows], bpm_segments, song_seconds)
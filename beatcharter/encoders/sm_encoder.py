@@ -1,117 +1,176 @@
+import logging
 import os
-import shutil
 from pathlib import Path
+from typing import Callable, List, Optional, Tuple, Union
+
+from beatcharter.encoders.chart_model import ChartNotes, encode_measures
+from beatcharter.encoders.groove_radar import GrooveRadar, compute_radar
+from beatcharter.encoders.song_packager import PackageMode, package_song
+
+logger = logging.getLogger(__name__)
 
 
 class SMEncoder:
-    HEADER = """#TITLE:$TITLE;
-#SUBTITLE:;
-#ARTIST:;
-#TITLETRANSLIT:;
-#SUBTITLETRANSLIT:;
-#ARTISTTRANSLIT:;
-#GENRE:;
-#CREDIT:AutoStepper by phr00t.com;
-#BANNER:$BGIMAGE;
-#BACKGROUND:$BGIMAGE;
-#LYRICSPATH:;
-#CDTITLE:;
-#MUSIC:$MUSICFILE;
-#OFFSET:$STARTTIME;
-#SAMPLESTART:30.0;
-#SAMPLELENGTH:30.0;
-#SELECTABLE:YES;
-#BPMS:0.000000=$BPM;
-#STOPS:;
-#KEYSOUNDS:;
-#ATTACKS:;"""
-
-    BEGINNER = "Beginner:\n     2:"
-    EASY = "Easy:\n     4:"
-    MEDIUM = "Medium:\n     6:"
-    HARD = "Hard:\n     8:"
-    CHALLENGE = "Challenge:\n     10:"
-
-    CHART_HEADER = """//---------------dance-single - ----------------
+    """
+    SMEncoder - stream a chart and its note data to a .sm file.
+
+    Used as a context manager: the header is written on entry, each add_chart call encodes
+    its notes measure by measure straight into a buffered file, and the file is moved into
+    place on a clean exit. On an error the partial file is removed and the error raised.
+
+        with SMEncoder(chart, output_dir) as encoder:
+            for chart_notes in charts:
+                encoder.add_chart(chart_notes)
+
+    To write several formats from one pass over the notes, see chart_model.write_charts.
+    """
+
+    extension = ".sm"
+
+    # Tags written before the charts, in order. None values are filled from the chart.
+    HEADER_TAGS = (
+        ("TITLE", None),
+        ("SUBTITLE", ""),
+        ("ARTIST", ""),
+        ("TITLETRANSLIT", ""),
+        ("SUBTITLETRANSLIT", ""),
+        ("ARTISTTRANSLIT", ""),
+        ("GENRE", ""),
+        ("CREDIT", "AutoStepper by phr00t.com"),
+        ("BANNER", ""),
+        ("BACKGROUND", ""),
+        ("LYRICSPATH", ""),
+        ("CDTITLE", ""),
+        ("MUSIC", None),
+        ("OFFSET", None),
+        ("SAMPLESTART", "30.0"),
+        ("SAMPLELENGTH", "30.0"),
+        ("SELECTABLE", "YES"),
+        ("BPMS", None),
+        ("STOPS", ""),
+        ("KEYSOUNDS", ""),
+        ("ATTACKS", ""),
+    )
+
+    CHART_HEADER = """//---------------{step_type} - ----------------
 #NOTES:
-     dance-single:
-     :
-     $DIFFICULTY
-     0.733800,0.772920,0.048611,0.850698,0.060764,634.000000,628.000000,6.000000,105.000000,8.000000,0.000000,0.733800,0.772920,0.048611,0.850698,0.060764,634.000000,628.000000,6.000000,105.000000,8.000000,0.000000:
-$NOTES
-;
-
+     {step_type}:
+     {description}:
+     {difficulty}:
+     {meter}:
+     {radar}:
 """
 
-    @staticmethod
-    def add_notes(sm_file, difficulty: str, notes: str) -> None:
-        """Add notes to the SM file for a specific difficulty."""
-        try:
-            sm_file.write(
-                SMEncoder.CHART_HEADER.replace("$DIFFICULTY", difficulty).replace(
-                    "$NOTES", notes
-                )
+    def __init__(
+        self,
+        chart,
+        output_dir: Union[str, Path],
+        copy_song: bool = True,
+        buffer_size: int = 1 << 16,
+        package_mode: PackageMode = PackageMode.HARDLINK,
+        hash_file: Optional[Callable[[Path], str]] = None,
+    ):
+        """
+        Args:
+            chart: Beatchart to write, its name, song file, bpms and offset fill the header
+            output_dir: Directory to create the song directory in
+            copy_song: Place the song file next to the .sm
+            buffer_size: Size of the write buffer, in bytes
+            package_mode: How the song file is placed, see song_packager.package_song
+            hash_file: Content hash confirming an already placed song, see package_song
+        """
+        self.chart = chart
+        self.song_file = Path(chart.file_object)
+        self.directory = Path(output_dir) / self.song_file.name
+        self.path = self.directory / f"{self.song_file.name}{self.extension}"
+        self.copy_song = copy_song
+        self.buffer_size = buffer_size
+        self.package_mode = package_mode
+        self.hash_file = hash_file
+        self._writer = None
+        self._partial_path: Optional[Path] = None
+
+    def __enter__(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.copy_song:
+            package_song(
+                self.song_file,
+                self.directory / self.song_file.name,
+                self.package_mode,
+                self.hash_file,
             )
-        except Exception:
-            pass
-
-    @staticmethod
-    def complete(sm_file) -> None:
-        """Close the SM file."""
-        try:
-            sm_file.close()
-        except Exception:
-            pass
+        self._partial_path = self.path.with_name(self.path.name + ".partial")
+        self._writer = open(self._partial_path, "wb", buffering=self.buffer_size)
+        self.write_header()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._writer.close()
+        self._writer = None
+        if exc_type is None:
+            os.replace(self._partial_path, self.path)
+        else:
+            self._partial_path.unlink(missing_ok=True)
+
+    def write(self, text: str) -> None:
+        self._writer.write(text.encode("utf-8"))
+
+    def header_values(self) -> List[Tuple[str, str]]:
+        song_name = self.song_file.stem
+        chart_values = {
+            "TITLE": song_name[:32] if len(song_name) > 32 else song_name,
+            "MUSIC": self.song_file.name,
+            "OFFSET": f"{self.chart.offset:.6f}",
+            "BPMS": SMEncoder.format_bpms(self.chart.bpms),
+        }
+        return [
+            (tag, chart_values[tag] if value is None else value) for tag, value in self.HEADER_TAGS
+        ]
+
+    def write_header(self) -> None:
+        self.write("".join(f"#{tag}:{value};\n" for tag, value in self.header_values()))
+        self.write("\n")
+
+    def add_chart(self, chart: ChartNotes) -> None:
+        """Stream one chart's notes into the file"""
+        self.begin_chart(chart)
+        for measure in encode_measures(chart.notes):
+            self.write_measure(measure)
+        self.end_chart()
+
+    def begin_chart(self, chart: ChartNotes) -> None:
+        if (chart.bpms is not None and chart.bpms != self.chart.bpms) or (
+            chart.offset is not None and chart.offset != self.chart.offset
+        ):
+            logger.warning(
+                f"SM has no per-chart timing, {chart.difficulty_name} uses the song's instead"
+            )
+        self.write(
+            self.CHART_HEADER.format(
+                step_type=chart.step_type,
+                description=chart.description,
+                difficulty=chart.difficulty_name,
+                meter=chart.difficulty_meter,
+                radar=self.radar(chart).format(),
+            )
+        )
 
-    @staticmethod
-    def get_sm_file(song_file: Path, output_dir: str) -> Path:
-        """Get the path for the SM file."""
-        filename = song_file.name
-        directory = Path(output_dir) / f"{filename}_dir"
-        return directory / f"{filename}.sm"
+    def radar(self, chart: ChartNotes) -> GrooveRadar:
+        """Groove radar of a chart, computed once and shared by every encoder writing it"""
+        if chart.radar is None:
+            bpms = chart.bpms if chart.bpms is not None else self.chart.bpms
+            chart.radar = compute_radar(chart.notes, bpms)
+        return chart.radar
 
-    @staticmethod
-    def generate_sm(bpm: float, start_time: float, song_file: Path, output_dir: str):
-        """
-        Generate a new SM file.
+    def write_measure(self, measure: bytes) -> None:
+        self._writer.write(measure)
 
-        Args:
-            bpm: Beats per minute of the song
-            start_time: Start time of the song
-            song_file: Path to the song file
-            output_dir: Directory to output the SM file
+    def end_chart(self) -> None:
+        self.write(";\n\n")
 
-        Returns:
-            file object: The opened SM file writer
-        """
-        filename = song_file.name
-        song_name = Path(filename).stem
-        short_name = song_name[:32] if len(song_name) > 32 else song_name
-
-        # Create directory
-        directory = Path(output_dir) / filename
-        directory.mkdir(parents=True, exist_ok=True)
-
-        sm_file = directory / f"{filename}.sm"
-
-        try:
-            # Remove old file if it exists
-            if sm_file.exists():
-                sm_file.unlink()
-
-            # Copy song file to new directory
-            shutil.copy2(song_file, directory / filename)
-
-            # Create and write to new SM file
-            with open(sm_file, "w") as writer:
-                header_content = (
-                    SMEncoder.HEADER.replace("$TITLE", short_name)
-                    .replace("$MUSICFILE", filename)
-                    .replace("$STARTTIME", str(start_time))
-                    .replace("$BPM", str(bpm))
-                )
-                writer.write(header_content)
-                return writer
-
-        except Exception:
-            return None
+    @staticmethod
+    def format_bpms(bpm: Union[float, List[Tuple[float, float]]]) -> str:
+        """Format a single bpm or a list of (beat, bpm) segments as the #BPMS value"""
+        if isinstance(bpm, (int, float)):
+            bpm = [(0.0, bpm)]
+        return ",".join(f"{beat:.6f}={value:.6f}" for beat, value in bpm)
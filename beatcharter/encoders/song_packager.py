@@ -0,0 +1,123 @@
+"""
+Place song audio next to generated charts without duplicating it.
+
+The audio is linked rather than copied where the filesystem allows it, and nothing is
+written at all when the target already holds the same audio, so regenerating a whole pack
+touches almost no audio bytes.
+"""
+
+import errno
+import logging
+import os
+import shutil
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+class PackageMode(Enum):
+    HARDLINK = "hardlink"  # same file, zero bytes written, needs the same filesystem
+    REFLINK = "reflink"  # copy-on-write clone, zero bytes written, btrfs/xfs and similar
+    SYMLINK = "symlink"  # link to the source, breaks if the library moves
+    COPY = "copy"  # full copy
+
+
+# What each mode falls back to when the filesystem refuses it
+FALLBACKS = {
+    PackageMode.HARDLINK: PackageMode.REFLINK,
+    PackageMode.REFLINK: PackageMode.COPY,
+    PackageMode.SYMLINK: PackageMode.COPY,
+}
+
+
+def reflink(source: Path, target: Path) -> None:
+    """Clone source to target sharing its blocks. Raises OSError where unsupported."""
+    import fcntl
+
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            target.unlink(missing_ok=True)
+            raise
+    shutil.copystat(source, target)
+
+
+def is_packaged(source: Path, target: Path, hash_file: Optional[Callable[[Path], str]]) -> bool:
+    """
+    True if target already holds source's audio: the same file, a link to it, or a file
+    with the same size, mtime and content hash.
+    """
+    if not os.path.lexists(target):
+        return False
+    if target.is_symlink():
+        return target.resolve() == source.resolve()
+    if os.path.samefile(source, target):
+        return True
+
+    source_stat, target_stat = source.stat(), target.stat()
+    if (source_stat.st_size, source_stat.st_mtime_ns) != (
+        target_stat.st_size,
+        target_stat.st_mtime_ns,
+    ):
+        return False
+    # Size and mtime match, the hash confirms it. AnalysisCache.hash_audio remembers hashes
+    # by path, size and mtime, so with it a rerun costs no reads.
+    return hash_file is None or hash_file(source) == hash_file(target)
+
+
+def package_song(
+    source: Path,
+    target: Path,
+    mode: PackageMode = PackageMode.HARDLINK,
+    hash_file: Optional[Callable[[Path], str]] = None,
+) -> Optional[PackageMode]:
+    """
+    Make the song audio at source available at target.
+
+    Args:
+        source: Song audio file
+        target: Path the song should appear at
+        mode: Preferred mode, falling back through FALLBACKS when the filesystem refuses it
+        hash_file: Content hash used to confirm a target with matching size and mtime,
+            e.g. analysis_cache.hash_file or AnalysisCache.hash_audio. None trusts size and mtime alone.
+
+    Returns:
+        PackageMode: the mode used, or None if target already held the audio
+    """
+    source, target = Path(source), Path(target)
+    if is_packaged(source, target, hash_file):
+        logger.debug(f"{target} is up to date")
+        return None
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Built next to the target and moved over it, so a failure never leaves half a song
+    partial = target.with_name(target.name + ".partial")
+    partial.unlink(missing_ok=True)
+    while True:
+        try:
+            if mode == PackageMode.HARDLINK:
+                os.link(source, partial)
+            elif mode == PackageMode.REFLINK:
+                reflink(source, partial)
+            elif mode == PackageMode.SYMLINK:
+                os.symlink(source.resolve(), partial)
+            else:
+                shutil.copy2(source, partial)
+            break
+        except (OSError, ImportError) as e:
+            if mode not in FALLBACKS or (
+                isinstance(e, OSError) and e.errno in (errno.ENOENT, errno.ENOSPC)
+            ):
+                raise
+            logger.debug(f"{mode.value} of {source} failed ({e}), trying {FALLBACKS[mode].value}")
+            mode = FALLBACKS[mode]
+
+    os.replace(partial, target)
+    return mode
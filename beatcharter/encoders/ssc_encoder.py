@@ -0,0 +1,80 @@
+from typing import List, Tuple
+
+from beatcharter.encoders.chart_model import ChartNotes
+from beatcharter.encoders.sm_encoder import SMEncoder
+
+
+class SSCEncoder(SMEncoder):
+    """
+    SSCEncoder - stream a chart and its note data to a StepMania 5 .ssc file.
+
+    Shares the chart model and measure encoding of SMEncoder. Unlike .sm, each chart can
+    carry its own #BPMS and #OFFSET, which are written when ChartNotes sets them.
+    """
+
+    extension = ".ssc"
+
+    HEADER_TAGS = (
+        ("VERSION", "0.83"),
+        ("TITLE", None),
+        ("SUBTITLE", ""),
+        ("ARTIST", ""),
+        ("TITLETRANSLIT", ""),
+        ("SUBTITLETRANSLIT", ""),
+        ("ARTISTTRANSLIT", ""),
+        ("GENRE", ""),
+        ("ORIGIN", ""),
+        ("CREDIT", "AutoStepper by phr00t.com"),
+        ("BANNER", ""),
+        ("BACKGROUND", ""),
+        ("PREVIEWVID", ""),
+        ("JACKET", ""),
+        ("CDIMAGE", ""),
+        ("DISCIMAGE", ""),
+        ("LYRICSPATH", ""),
+        ("CDTITLE", ""),
+        ("MUSIC", None),
+        ("OFFSET", None),
+        ("SAMPLESTART", "30.0"),
+        ("SAMPLELENGTH", "30.0"),
+        ("SELECTABLE", "YES"),
+        ("BPMS", None),
+        ("STOPS", ""),
+        ("DELAYS", ""),
+        ("WARPS", ""),
+        ("TIMESIGNATURES", "0.000000=4=4"),
+        ("TICKCOUNTS", "0.000000=4"),
+        ("COMBOS", "0.000000=1"),
+        ("SPEEDS", "0.000000=1.000000=0.000000=0"),
+        ("SCROLLS", "0.000000=1.000000"),
+        ("FAKES", ""),
+        ("LABELS", "0.000000=Song Start"),
+        ("BGCHANGES", ""),
+        ("KEYSOUNDS", ""),
+        ("ATTACKS", ""),
+    )
+
+    def chart_tags(self, chart: ChartNotes) -> List[Tuple[str, str]]:
+        tags = [
+            ("CHARTNAME", ""),
+            ("STEPSTYPE", chart.step_type),
+            ("DESCRIPTION", chart.description),
+            ("CHARTSTYLE", ""),
+            ("DIFFICULTY", chart.difficulty_name),
+            ("METER", str(chart.difficulty_meter)),
+            ("RADARVALUES", self.radar(chart).format()),
+            ("CREDIT", ""),
+        ]
+        # A chart with any timing of its own uses none of the song's, so both are written
+        if chart.offset is not None or chart.bpms is not None:
+            offset = chart.offset if chart.offset is not None else self.chart.offset
+            bpms = chart.bpms if chart.bpms is not None else self.chart.bpms
+            tags.append(("OFFSET", f"{offset:.6f}"))
+            tags.append(("BPMS", SMEncoder.format_bpms(bpms)))
+        return tags
+
+    def begin_chart(self, chart: ChartNotes) -> None:
+        self.write(f"//---------------{chart.step_type} - {chart.description}----------------\n")
+        self.write("#NOTEDATA:;\n")
+        self.write("".join(f"#{tag}:{value};\n" for tag, value in self.chart_tags(chart)))
+        self.write("#NOTES:\n")
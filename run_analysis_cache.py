@@ -0,0 +1,52 @@
+import argparse
+import logging
+from pathlib import Path
+
+from beatcharter.beatchart.audio_analysis.analysis_cache import AnalysisCache
+
+logging.basicConfig(level=logging.INFO, format="%(filename)s:%(lineno)d - %(message)s")
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the audio analysis cache")
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Path to the cache directory (default: $BEATCHARTER_CACHE_DIR or ~/.cache/beatcharter)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    invalidate_parser = subparsers.add_parser(
+        "invalidate", help="Drop cached analysis for audio files, or everything if none given"
+    )
+    invalidate_parser.add_argument("paths", type=str, nargs="*", help="Audio files to invalidate")
+
+    subparsers.add_parser("stats", help="Show the number and total size of cached entries")
+    args = parser.parse_args()
+
+    cache = AnalysisCache(Path(args.cache_dir) if args.cache_dir else None)
+
+    if args.command == "invalidate":
+        if not args.paths:
+            removed = cache.invalidate()
+            logger.info(f"Removed all {removed} cached analysis entries")
+        for path in args.paths:
+            path = Path(path)
+            if not path.exists():
+                logger.error(f"Error: Path {path} does not exist")
+                continue
+            removed = cache.invalidate(path)
+            logger.info(f"Removed {removed} cached analysis entries for {path}")
+
+    elif args.command == "stats":
+        stats = cache.stats()
+        logger.info(
+            f"{stats['entries']} entries, {stats['size'] / 1024 / 1024:.1f} of "
+            f"{stats['max_size'] / 1024 / 1024:.1f} MB in {cache.db_path}"
+        )
+
+
+if __name__ == "__main__":
+    main()
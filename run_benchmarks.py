@@ -0,0 +1,133 @@
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+from beatcharter.beatchart.audio_analysis.backends import available_backends
+from beatcharter.beatchart.audio_analysis.benchmark import (
+    DEFAULT_CLICK_BPMS,
+    builder_benchmarks,
+    click_cases,
+    compare_reports,
+    read_report,
+    run_benchmarks,
+    sample_cases,
+    write_report,
+)
+from config_utils import load_config, get_config_value
+
+logging.basicConfig(level=logging.INFO, format="%(filename)s:%(lineno)d - %(message)s")
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the speed, memory use and accuracy of the audio analysis backends"
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="beatcharter.toml",
+        help="Path to TOML config file (default: beatcharter.toml)",
+    )
+    parser.add_argument(
+        "--backend",
+        "-b",
+        action="append",
+        choices=available_backends(),
+        help="Backend to benchmark, may be repeated (overrides config, default: aubio and librosa)",
+    )
+    parser.add_argument(
+        "--samples-dir",
+        type=str,
+        help="Directory of songs with known tempos (overrides config, default: samples)",
+    )
+    parser.add_argument(
+        "--no-samples",
+        action="store_true",
+        default=False,
+        help="Only benchmark the synthesized click tracks",
+    )
+    parser.add_argument(
+        "--click-bpms",
+        type=float,
+        nargs="*",
+        help="Tempos of the synthesized click tracks, none to skip them",
+    )
+    parser.add_argument(
+        "--click-seconds",
+        type=float,
+        default=60.0,
+        help="Length of each synthesized click track (default: 60)",
+    )
+    parser.add_argument(
+        "--click-dir",
+        type=str,
+        help="Directory the click tracks are written to (overrides config)",
+    )
+    parser.add_argument(
+        "--no-builders",
+        action="store_true",
+        default=False,
+        help="Skip timing the chart building steps (quantization, patterns, radar)",
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        type=int,
+        default=1,
+        help="Analyses per song, the fastest is reported (default: 1)",
+    )
+    parser.add_argument(
+        "--output", "-o", type=str, help="JSON report to write (overrides config)"
+    )
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        help="Baseline report to compare against, exits with status 1 on a regression",
+    )
+    args = parser.parse_args()
+
+    # Load config
+    config = load_config(Path(args.config))
+
+    # Get values from config or command line (CLI takes precedence)
+    backends = args.backend or get_config_value(config, "benchmark", "backends", ["aubio", "librosa"])
+    samples_dir = Path(args.samples_dir if args.samples_dir else get_config_value(config, "benchmark", "samples_dir", "samples"))
+    click_dir = Path(args.click_dir if args.click_dir else get_config_value(config, "benchmark", "click_dir", "benchmark/clicks"))
+    output = Path(args.output if args.output else get_config_value(config, "benchmark", "output", "benchmark/report.json"))
+    baseline = args.baseline if args.baseline else get_config_value(config, "benchmark", "baseline", None)
+    click_bpms = args.click_bpms if args.click_bpms is not None else DEFAULT_CLICK_BPMS
+
+    cases = []
+    if not args.no_samples:
+        if not samples_dir.is_dir():
+            logger.error(f"Error: Samples directory {samples_dir} does not exist")
+            return
+        cases += sample_cases(samples_dir)
+    cases += click_cases(click_dir, click_bpms, args.click_seconds)
+    if not cases:
+        parser.error("Nothing to benchmark, give a samples directory or click track tempos")
+
+    report = run_benchmarks(backends, cases, args.repeat)
+    if not args.no_builders:
+        report["builders"] = builder_benchmarks(args.repeat)
+    write_report(report, output)
+    logger.info(f"Wrote benchmark report for {len(report['results'])} runs to {output}")
+
+    if baseline:
+        baseline = Path(baseline)
+        if not baseline.exists():
+            logger.warning(f"Baseline {baseline} does not exist, nothing to compare against")
+            return
+        regressions = compare_reports(report, read_report(baseline))
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        logger.info(f"No regressions against {baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import logging
+from pathlib import Path
+
+from stepchart_utils.chart_parser import ChartParser
+from beatcharter.beatchart.audio_analysis.backends import available_backends
+from beatcharter.beatchart.bpm_batch import analyze_library
+from config_utils import load_config, get_config_value
+
+logging.basicConfig(level=logging.INFO, format="%(filename)s:%(lineno)d - %(message)s")
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyze the BPM of every song in a Songs directory in parallel"
+    )
+    parser.add_argument(
+        "--config",
+        type=str,
+        default="beatcharter.toml",
+        help="Path to TOML config file (default: beatcharter.toml)",
+    )
+    parser.add_argument(
+        "songs_dir",
+        type=str,
+        nargs="?",
+        help="Path to the Songs directory (overrides config)",
+    )
+    parser.add_argument(
+        "--output", "-o", type=str, help="JSONL file to stream results to (overrides config)"
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        help="Number of worker processes (overrides config, default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        choices=available_backends(),
+        help="Analysis backend (overrides config, default: aubio)",
+    )
+    parser.add_argument(
+        "--start",
+        type=float,
+        default=0.0,
+        help="Seconds into each song to start analyzing at (default: 0)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        help="Seconds of each song to analyze (default: whole song)",
+    )
+    parser.add_argument(
+        "--sample-start",
+        action="store_true",
+        default=False,
+        help="Start analyzing each song at its chart's #SAMPLESTART",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Append to an existing output and skip songs already analyzed",
+    )
+    args = parser.parse_args()
+
+    # Load config
+    config = load_config(Path(args.config))
+
+    # Get values from config or command line (CLI takes precedence)
+    songs_dir = args.songs_dir if args.songs_dir else get_config_value(config, "bpm_analysis", "songs_dir", None)
+    if not songs_dir:
+        parser.error("songs_dir is required (either as argument or in config file [bpm_analysis] section)")
+    songs_dir = Path(songs_dir)
+
+    output = Path(args.output if args.output else get_config_value(config, "bpm_analysis", "output", "bpm_analysis.jsonl"))
+    workers = args.workers if args.workers else get_config_value(config, "bpm_analysis", "workers", None)
+    backend = args.backend if args.backend else get_config_value(config, "bpm_analysis", "backend", "aubio")
+
+    if not songs_dir.is_dir():
+        logger.error(f"Error: Songs directory {songs_dir} does not exist")
+        return
+
+    analyzed = analyze_library(
+        songs_dir=songs_dir,
+        output=output,
+        chart_parser=ChartParser(),
+        backend=backend,
+        workers=workers,
+        resume=args.resume,
+        start=args.start,
+        duration=args.duration,
+        use_sample_start=args.sample_start,
+    )
+    logger.info(f"Analyzed {analyzed} songs, results in {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,10 @@
 import argparse
 import logging
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from stepchart_utils.chart_parser import Chart, ChartParser
 from stepchart_utils.common_parser import ParseError
+from stepchart_utils.parse_cache import ParseCache, parse_and_validate
 from config_utils import load_config, get_config_value
 
 logging.basicConfig(level=logging.INFO, format="%(filename)s:%(lineno)d - %(message)s")
@@ -13,11 +14,13 @@ logger.setLevel(logging.INFO)
 chart_parser = ChartParser()
 
 
-def parse_chart_file(chart_file_path: Path) -> Chart:
-    """Process a single SM file and return the parsed result"""
+def parse_chart_file(chart_file_path: Path, cache: Optional[ParseCache] = None) -> Chart:
+    """Process a single SM file and return the parsed result, None if it is invalid"""
     try:
-        result: Chart = chart_parser.parse_file(chart_file_path)
-        result.validate()
+        result, error = parse_and_validate(chart_file_path, chart_parser, cache)
+        if error:
+            logger.error(f"Error processing {chart_file_path}: {error}")
+            return None
         logger.debug(
             f"Successfully parsed: {chart_file_path.relative_to(chart_file_path.parent.parent)}"
         )
@@ -52,6 +55,16 @@ def main():
     parser.add_argument(
         "--output", "-o", type=str, help="Output file for parsed data (overrides config)"
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Parse every file instead of reusing results of unchanged files (overrides config)",
+    )
+    parser.add_argument(
+        "--verify-hash",
+        action="store_true",
+        help="Only reuse cached results of files whose content hash matches (overrides config)",
+    )
     args = parser.parse_args()
 
     # Load config
@@ -69,6 +82,13 @@ def main():
         logger.error(f"Error: Path {path} does not exist")
         return
 
+    cache = None
+    if not args.no_cache and get_config_value(config, "stepchart_parser", "cache", True):
+        verify_hash = args.verify_hash or get_config_value(
+            config, "stepchart_parser", "verify_hash", False
+        )
+        cache = ParseCache(verify_hash=verify_hash)
+
     results: List[Chart] = []
     # Handle single file
     if path.is_file():
@@ -76,7 +96,7 @@ def main():
             logger.error(f"Error: {path} is not a chart file")
             return
         results = []
-        result = parse_chart_file(path)
+        result = parse_chart_file(path, cache)
         if result:
             results.append(result)
 
@@ -89,7 +109,7 @@ def main():
         errors = []
         for chart_file_path in chart_files:
             try:
-                result = parse_chart_file(chart_file_path)
+                result = parse_chart_file(chart_file_path, cache)
                 if result:
                     results.append(result)
             except Exception as e:
@@ -101,6 +121,10 @@ def main():
                 logger.error(error)
 
         logger.info(f"Found {len(results)} of {len(chart_files)} valid Chart files")
+        if cache is not None:
+            logger.info(
+                f"Parsed {cache.misses} changed Chart files, reused {cache.hits} from {cache.db_path}"
+            )
 
     # Print results
     if logger.getEffectiveLevel() == logging.DEBUG:
@@ -1,5 +1,6 @@
 from pathlib import Path
 import re
+from typing import AbstractSet, Dict, Iterable, Iterator, List, NamedTuple, Tuple
 
 
 class ParseError(Exception):
@@ -25,11 +26,137 @@ class OptionWarning(ParseError):
         super().__init__(f"Option warning for option: #{option.upper()}: {message}")
 
 
-def extract_value(content: str, key: str) -> str:
-    """Extract value from SM file format #KEY:value;"""
-    pattern = f"#{key}:([^;]*?);"
-    match = re.search(pattern, content, re.DOTALL)
-    return match.group(1).strip() if match else ""
+class Tag(NamedTuple):
+    name: str  # upper case, without the #
+    value: str  # stripped, comments removed and escapes resolved
+    start: int  # byte offset of the #
+    end: int  # byte offset just past the ; or wherever the tag was cut off
+
+
+# The only bytes the tokenizer has to stop at, everything between them is copied in bulk
+_SPECIAL = re.compile(rb"//[^\n]*|\\.|#|:|;|\n[ \t]*(?=#)", re.DOTALL)
+
+
+def tokenize_tags(
+    content: bytes, start: int = 0, lazy_values: AbstractSet[str] = frozenset()
+) -> Iterator[Tag]:
+    """
+    Yield every #TAG:value; of an SM or SSC file in one pass, as StepMania reads them.
+
+    // starts a comment running to the end of the line, a backslash escapes the next byte,
+    and a tag missing its ; ends where the next line starts with #. Only those bytes and
+    the tag delimiters are visited, so the cost is linear in the file size however large
+    its #NOTES are.
+
+    Args:
+        content: Raw file contents, bytes or an mmap of the file
+        start: Byte offset to start at
+        lazy_values: Tags whose values are not copied out, their Tag.value is empty and
+            their byte range is all that is recorded
+
+    Yields:
+        Tag: in file order, repeated tags included
+    """
+    name = None  # name of the open tag, None outside of one
+    in_value = lazy = False
+    cut = start
+    chunks = []
+
+    def finish(end: int) -> Tag:
+        value = b"".join(chunks).decode("utf-8", errors="replace").strip()
+        return Tag(tag_name, value, start, end)
+
+    for match in _SPECIAL.finditer(content, start):
+        token = match.group()
+        position = match.start()
+        if name is None:
+            if token == b"#":
+                # Outside of a tag only a # matters, the name runs to the first : or ;
+                name, in_value, start, cut = b"", False, position, match.end()
+            continue
+
+        if not in_value:
+            if token in (b":", b";") or token.startswith(b"\n"):
+                name = content[cut:position]
+                tag_name = name.decode("utf-8", errors="replace").strip().upper()
+                chunks = []
+                if token == b":":
+                    in_value, cut, lazy = True, match.end(), tag_name in lazy_values
+                    continue
+                yield finish(match.end() if token == b";" else position)
+                name = None
+            continue
+
+        if token.startswith(b"//"):
+            if not lazy:
+                chunks.append(content[cut:position])
+            cut = match.end()
+        elif token.startswith(b"\\"):
+            if not lazy:
+                chunks.append(content[cut:position])
+                chunks.append(token[1:])
+            cut = match.end()
+        elif token == b";" or token.startswith(b"\n"):
+            if not lazy:
+                chunks.append(content[cut:position])
+            yield finish(match.end() if token == b";" else position)
+            name = None
+
+    if name is not None and in_value:
+        if not lazy:
+            chunks.append(content[cut:])
+        yield finish(len(content))
+
+
+# The first chart tag at the start of a line ends the song's header
+_HEADER_END = re.compile(rb"(?:\A|\n)[ \t]*(#(?:NOTES|NOTEDATA)[ \t]*:)")
+HEADER_CHUNK_BYTES = 8192
+
+
+def read_header(filepath: Path) -> Tuple[bytes, int]:
+    """
+    Read a chart file only up to its first chart.
+
+    Song tags after the first chart are not part of the header, so they are neither parsed
+    nor reported as unknown options. In an .ssc file those tags belong to the charts, an
+    .sm file with song tags between its charts has them ignored.
+
+    Returns:
+        (header, body_start): the song's header bytes and the offset the charts start at,
+        the file's size if it has none
+    """
+    header = b""
+    with open(filepath, "rb") as f:
+        while True:
+            chunk = f.read(HEADER_CHUNK_BYTES)
+            # Search again from the last line start, a chart tag may straddle the two chunks
+            search_from = max(header.rfind(b"\n"), 0)
+            header += chunk
+            match = _HEADER_END.search(header, search_from)
+            if match:
+                return header[: match.start(1)], match.start(1)
+            if not chunk:
+                return header, len(header)
+
+
+def parse_bpms(bpms: str) -> List[Tuple[float, float]]:
+    """
+    Convert BPMS to list of tuples
+    Example #BPMS:0.000=160.002,10.000=180.002;
+    Would be converted to [(0.0, 160.002), (10.0, 180.002)]
+    """
+    return [
+        (float(bpm[0]), float(bpm[1]))
+        for bpm in [bpm.split("=") for bpm in bpms.split(",") if bpm.strip()]
+    ]
+
+
+def tag_values(tags: Iterable[Tag]) -> Dict[str, str]:
+    """Value of each tag name, the first occurrence wins"""
+    values: Dict[str, str] = {}
+    for tag in tags:
+        values.setdefault(tag.name, tag.value)
+    return values
 
 
 def find_video_file(chart_dir: Path) -> Path:
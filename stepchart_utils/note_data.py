@@ -0,0 +1,281 @@
+"""
+Compact note data parsed from #NOTES.
+
+A chart keeps only its non-empty rows: a uint8 rows x columns array of note codes and an
+int32 array of where each row sits, 48 rows per beat. A typical chart is a few kilobytes,
+so a whole library of charts fits in memory. Parsing splits the note data per measure with
+bytes methods and converts every row of the chart in one NumPy pass, no Python loop ever
+visits a single note.
+
+Charts are found by scanning an mmap of the file past its header, recording each chart's
+metadata and the byte range of its measures. The measures are only read and decoded when
+a chart's notes are first used, so header-only work never pays for them.
+"""
+
+import logging
+import mmap
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+from numpy import float32, int32, int64, uint8
+from numpy.typing import NDArray
+
+from stepchart_utils.common_parser import parse_bpms, tokenize_tags
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+ROWS_PER_BEAT = 48
+ROWS_PER_MEASURE = ROWS_PER_BEAT * 4
+
+# Note code of each note character, the same codes beatcharter builds charts with. Anything
+# else, such as keysound indices, reads as empty.
+NOTE_CHARACTERS = b"01234MLF"  # empty, tap, hold head, tail, roll head, mine, lift, fake
+NOTE_CODES = np.zeros(256, dtype=uint8)
+NOTE_CODES[np.frombuffer(NOTE_CHARACTERS, dtype=uint8)] = np.arange(len(NOTE_CHARACTERS))
+
+_COMMENT = re.compile(rb"//[^\n]*")
+
+
+class NoteSource(NamedTuple):
+    """Byte range of a chart's measures within its file"""
+
+    path: Path
+    start: int
+    end: int
+
+    def read(self) -> bytes:
+        """The measures with comments removed, read through an mmap of the file"""
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            measures = mm[self.start : self.end]
+        return _COMMENT.sub(b"", measures).rstrip(b"; \t\r\n")
+
+
+@dataclass
+class NoteData:
+    """One chart of a song file, its note arrays are decoded from its source on first access"""
+
+    steps_type: str = ""
+    description: str = ""
+    difficulty: str = ""
+    meter: int = 0
+    radar: NDArray[float32] = field(default_factory=lambda: np.zeros(0, dtype=float32))
+    # Timing the chart plays with, the song's unless the chart overrides it
+    offset: float = 0.0
+    bpms: List[Tuple[float, float]] = field(default_factory=list)
+    stops: str = ""
+    tags: Dict[str, str] = field(default_factory=dict)  # every other tag of an .ssc chart
+    source: Optional[NoteSource] = None
+    _notes: Optional[NDArray[uint8]] = field(default=None, repr=False)
+    _rows: Optional[NDArray[int32]] = field(default=None, repr=False)
+
+    @property
+    def notes(self) -> NDArray[uint8]:
+        """Non-empty rows x columns note codes"""
+        self.load()
+        return self._notes
+
+    @property
+    def rows(self) -> NDArray[int32]:
+        """Row of each of notes, 48 rows per beat"""
+        self.load()
+        return self._rows
+
+    @property
+    def loaded(self) -> bool:
+        return self._notes is not None
+
+    def load(self) -> None:
+        if self._notes is None:
+            measures = self.source.read() if self.source is not None else b""
+            self._notes, self._rows = parse_note_rows(measures)
+
+    @property
+    def columns(self) -> int:
+        return self.notes.shape[1]
+
+    @property
+    def measures(self) -> int:
+        return int(self.rows[-1]) // ROWS_PER_MEASURE + 1 if len(self.rows) else 0
+
+    def dense(self) -> NDArray[uint8]:
+        """The full rows x columns note array, ROWS_PER_MEASURE rows per measure"""
+        dense = np.zeros((self.measures * ROWS_PER_MEASURE, self.columns), dtype=uint8)
+        dense[self.rows] = self.notes
+        return dense
+
+
+def parse_radar(radar: str) -> NDArray[float32]:
+    return np.array([value for value in radar.split(",") if value.strip()], dtype=float32)
+
+
+def parse_meter(meter: str) -> int:
+    try:
+        return int(float(meter))
+    except ValueError:
+        return 0
+
+
+def parse_note_rows(
+    note_data: Union[str, bytes], columns: Optional[int] = None
+) -> Tuple[NDArray[uint8], NDArray[int32]]:
+    """
+    Parse the measures of a chart.
+
+    Args:
+        note_data: Measures separated by commas, one line of note characters per row
+        columns: Expected line width, defaults to the width of the first line
+
+    Returns:
+        (notes, rows): uint8 note codes and int32 row of each non-empty line
+    """
+    measure_lines: List[bytes] = []
+    counts: List[int] = []
+    if isinstance(note_data, str):
+        note_data = note_data.encode("utf-8")
+    for measure in note_data.split(b","):
+        lines = measure.split()
+        if columns is None and lines:
+            columns = len(lines[0])
+        joined = b"".join(lines)
+        if len(joined) != len(lines) * columns:
+            # A malformed line, keep the ones of the chart's width
+            lines = [line for line in lines if len(line) == columns]
+            joined = b"".join(lines)
+        measure_lines.append(joined)
+        counts.append(len(lines))
+
+    if not columns or not sum(counts):
+        return np.zeros((0, columns or 4), dtype=uint8), np.zeros(0, dtype=int32)
+
+    characters = np.frombuffer(b"".join(measure_lines), dtype=uint8).reshape(-1, columns)
+    notes = NOTE_CODES[characters]
+
+    # Each line's row from its measure and its place among the measure's lines
+    counts = np.asarray(counts, dtype=int64)
+    per_line = np.repeat(counts, counts)
+    measure = np.repeat(np.arange(len(counts)), counts)
+    line = np.arange(len(per_line)) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = measure * ROWS_PER_MEASURE + np.rint(line * ROWS_PER_MEASURE / per_line).astype(int64)
+
+    occupied = notes.any(axis=1)
+    return notes[occupied], rows[occupied].astype(int32)
+
+
+class SongTiming(NamedTuple):
+    """The song's timing, which every chart plays with unless it has its own"""
+
+    offset: float = 0.0
+    bpms: Tuple[Tuple[float, float], ...] = ()
+    stops: str = ""
+
+
+def iter_sm_charts(
+    path: Path, body_start: int, timing: SongTiming = SongTiming()
+) -> Iterator[NoteData]:
+    """
+    Yield the charts of an .sm file. Each #NOTES holds steps type, description,
+    difficulty, meter and radar separated by colons, then the measures. Only those five
+    fields are decoded, the measures are left in the file until the notes are used.
+
+    Args:
+        path: .sm file
+        body_start: Offset of the first chart, see common_parser.read_header
+        timing: The song's timing, .sm charts have none of their own
+    """
+    with open(path, "rb") as f:
+        if body_start >= f.seek(0, 2):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for tag in tokenize_tags(mm, body_start, lazy_values={"NOTES"}):
+                if tag.name != "NOTES":
+                    continue
+                position = mm.find(b":", tag.start, tag.end) + 1
+                fields: List[str] = []
+                for _ in range(5):
+                    colon = mm.find(b":", position, tag.end)
+                    if colon < 0:
+                        break
+                    field_bytes = _COMMENT.sub(b"", mm[position:colon])
+                    fields.append(field_bytes.decode("utf-8", errors="replace").strip())
+                    position = colon + 1
+                if len(fields) < 5:
+                    logger.warning(f"Skipping a chart of {path}, its #NOTES is missing fields")
+                    continue
+                yield NoteData(
+                    steps_type=fields[0],
+                    description=fields[1],
+                    difficulty=fields[2],
+                    meter=parse_meter(fields[3]),
+                    radar=parse_radar(fields[4]),
+                    offset=timing.offset,
+                    bpms=list(timing.bpms),
+                    stops=timing.stops,
+                    source=NoteSource(path, position, tag.end),
+                )
+
+
+# Tags an .ssc chart describes itself with, the rest land in NoteData.tags
+SSC_CHART_TAGS = ("STEPSTYPE", "DESCRIPTION", "DIFFICULTY", "METER", "RADARVALUES")
+
+
+def iter_ssc_charts(
+    path: Path, body_start: int, timing: SongTiming = SongTiming()
+) -> Iterator[NoteData]:
+    """
+    Yield the charts of an .ssc file one at a time. Each runs from its #NOTEDATA to its
+    #NOTES, the tags between are decoded and the measures are left in the file until the
+    notes are used. A chart's own #OFFSET, #BPMS and #STOPS override the song's.
+
+    Stopping early, e.g. once the wanted chart is found, leaves the rest of the file unread.
+
+    Args:
+        path: .ssc file
+        body_start: Offset of the first chart, see common_parser.read_header
+        timing: The song's timing
+    """
+    with open(path, "rb") as f:
+        if body_start >= f.seek(0, 2):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            chart_values = {}
+            for tag in tokenize_tags(mm, body_start, lazy_values={"NOTES"}):
+                if tag.name == "NOTEDATA":
+                    chart_values = {}
+                    continue
+                if tag.name != "NOTES":
+                    chart_values.setdefault(tag.name, tag.value)
+                    continue
+                offset = chart_values.get("OFFSET", "")
+                bpms = chart_values.get("BPMS", "")
+                yield NoteData(
+                    steps_type=chart_values.get("STEPSTYPE", ""),
+                    description=chart_values.get("DESCRIPTION", ""),
+                    difficulty=chart_values.get("DIFFICULTY", ""),
+                    meter=parse_meter(chart_values.get("METER", "")),
+                    radar=parse_radar(chart_values.get("RADARVALUES", "")),
+                    offset=float(offset) if offset else timing.offset,
+                    bpms=parse_bpms(bpms) if bpms else list(timing.bpms),
+                    stops=chart_values.get("STOPS", timing.stops),
+                    tags={
+                        name: value
+                        for name, value in chart_values.items()
+                        if name not in SSC_CHART_TAGS
+                    },
+                    source=NoteSource(path, mm.find(b":", tag.start, tag.end) + 1, tag.end),
+                )
+
+
+def select_charts(
+    charts: Iterable[NoteData], steps_type: Optional[str] = None, difficulty: Optional[str] = None
+) -> Iterator[NoteData]:
+    """Yield the charts of a steps type and difficulty, either None for any, ignoring case"""
+    for chart in charts:
+        if steps_type is not None and chart.steps_type.lower() != steps_type.lower():
+            continue
+        if difficulty is not None and chart.difficulty.lower() != difficulty.lower():
+            continue
+        yield chart
@@ -0,0 +1,233 @@
+"""
+Persistent cache of parsed chart headers and their validation results.
+
+Each chart file's parsed header fields, the audio and video files found next to it and the
+outcome of validating it are stored in SQLite, keyed by the file's path, size and mtime. An
+unchanged file is served from the cache without being opened, so revalidating a library
+only parses the files that changed since the last run. Validation looks at the files next
+to the chart, so a cached result is only reused while the chart's directory is unchanged,
+otherwise the cached header is validated again.
+
+With verify_hash the file's content hash must match as well, catching edits that keep the
+size and mtime, and a file whose mtime changed but whose content did not, such as one
+touched or restored in place, is still served from the cache. Entries are looked up by
+path only, so a file copied or moved elsewhere is parsed again: hashing it to find its
+old entry would read more of it than parsing its header does.
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from stepchart_utils.chart_parser import Chart, ChartParser
+from stepchart_utils.common_parser import ParseError
+from stepchart_utils.sm_file import SMFile
+from stepchart_utils.ssc_file import SSCFile
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "beatcharter"
+# Bumped whenever the parsers or validation change, so older entries miss instead of lying
+FORMAT_VERSION = 1
+
+CHART_FILE_TYPES = {"SMFile": SMFile, "SSCFile": SSCFile}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parsed_chart (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT,
+    format_version INTEGER NOT NULL,
+    chart_type TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    audio_file TEXT,
+    video_file TEXT,
+    dir_mtime_ns INTEGER NOT NULL,
+    error TEXT
+);
+"""
+
+
+@dataclass
+class CachedChart:
+    chart: Chart
+    error: Optional[str]  # the validation error, None if the chart is valid
+    dir_mtime_ns: int  # of the chart's directory when it was validated
+
+
+class ParseCache:
+    """
+    ParseCache - persistent store of parsed and validated chart files.
+
+    A connection is opened per operation so a cache can be shared between processes.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, verify_hash: bool = False):
+        if cache_dir is None:
+            cache_dir = Path(os.environ.get("BEATCHARTER_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.cache_dir = Path(cache_dir)
+        self.db_path = self.cache_dir / "stepchart_parse.sqlite3"
+        self.verify_hash = verify_hash
+        self.hits = 0
+        self.misses = 0
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        if not self._initialized:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self._initialized = True
+        return connection
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, filepath: Path) -> Optional[CachedChart]:
+        """Return the cached chart of an unchanged file, or None on a miss"""
+        path = Path(filepath).resolve()
+        stat = path.stat()
+        with closing(self._connect()) as connection, connection:
+            row = connection.execute(
+                "SELECT size, mtime_ns, content_hash, format_version, chart_type, fields,"
+                " audio_file, video_file, dir_mtime_ns, error FROM parsed_chart WHERE path = ?",
+                (str(path),),
+            ).fetchone()
+            if row is None or row[3] != FORMAT_VERSION:
+                return None
+            size, mtime_ns, content_hash = row[:3]
+
+            if self.verify_hash:
+                if size != stat.st_size or content_hash != self.hash_file(path):
+                    return None
+                if mtime_ns != stat.st_mtime_ns:
+                    # Same content with a new mtime, remember it so the next run matches
+                    connection.execute(
+                        "UPDATE parsed_chart SET mtime_ns = ? WHERE path = ?",
+                        (stat.st_mtime_ns, str(path)),
+                    )
+            elif (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                return None
+
+        chart_type, fields, audio_file, video_file, dir_mtime_ns, error = row[4:]
+        chart_file = CHART_FILE_TYPES[chart_type](**self._decode_fields(json.loads(fields)))
+        chart = Chart(
+            chart_file,
+            Path(video_file) if video_file is not None else None,
+            Path(audio_file) if audio_file is not None else None,
+        )
+        return CachedChart(chart, error, dir_mtime_ns)
+
+    def put(self, filepath: Path, chart: Chart, error: Optional[str]) -> None:
+        """Store a parsed chart file and the result of validating it"""
+        path = Path(filepath).resolve()
+        stat = path.stat()
+        content_hash = self.hash_file(path) if self.verify_hash else None
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO parsed_chart VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    content_hash,
+                    FORMAT_VERSION,
+                    type(chart.chart_file).__name__,
+                    json.dumps(self._encode_fields(chart.chart_file)),
+                    str(chart.audio_file) if chart.audio_file is not None else None,
+                    str(chart.video_file) if chart.video_file is not None else None,
+                    path.parent.stat().st_mtime_ns,
+                    error,
+                ),
+            )
+
+    @staticmethod
+    def _encode_fields(chart_file) -> Dict[str, Any]:
+        # Parsed header fields only, the charts are scanned from the file when needed
+        values = {
+            f.name: getattr(chart_file, f.name)
+            for f in dataclasses.fields(chart_file)
+            if not f.name.startswith("_")
+        }
+        values["filepath"] = str(values["filepath"])
+        return values
+
+    @staticmethod
+    def _decode_fields(values: Dict[str, Any]) -> Dict[str, Any]:
+        values["filepath"] = Path(values["filepath"])
+        values["bpms"] = [tuple(bpm) for bpm in values["bpms"]]
+        return values
+
+    def invalidate(self, path: Optional[Path] = None) -> int:
+        """
+        Drop the cached result of one chart file, or of everything when path is None.
+
+        Returns:
+            int: Number of entries removed
+        """
+        with closing(self._connect()) as connection, connection:
+            if path is None:
+                return connection.execute("DELETE FROM parsed_chart").rowcount
+            return connection.execute(
+                "DELETE FROM parsed_chart WHERE path = ?", (str(Path(path).resolve()),)
+            ).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        with closing(self._connect()) as connection:
+            entries, invalid = connection.execute(
+                "SELECT COUNT(*), COUNT(error) FROM parsed_chart"
+            ).fetchone()
+        return {"entries": entries, "invalid": invalid}
+
+
+def parse_and_validate(
+    filepath: Path, chart_parser: ChartParser, cache: Optional[ParseCache] = None
+) -> Tuple[Chart, Optional[str]]:
+    """
+    Parse and validate a chart file, served from the cache when it is unchanged.
+
+    Only ParseErrors are validation results, any other error is raised and nothing cached.
+
+    Args:
+        filepath: .sm or .ssc file
+        chart_parser: Parser used on a cache miss
+        cache: Cache to read and update, None to always parse
+
+    Returns:
+        (chart, error): the parsed chart and its validation error, None if it is valid
+    """
+    cached = cache.get(filepath) if cache is not None else None
+    if cached is not None:
+        cache.hits += 1
+        if cached.dir_mtime_ns == Path(filepath).resolve().parent.stat().st_mtime_ns:
+            return cached.chart, cached.error
+        chart = cached.chart
+    else:
+        if cache is not None:
+            cache.misses += 1
+        chart = chart_parser.parse_file(filepath)
+
+    try:
+        chart.validate()
+        error = None
+    except ParseError as e:
+        error = str(e)
+    if cache is not None:
+        cache.put(filepath, chart, error)
+    return chart, error
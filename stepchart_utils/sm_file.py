@@ -5,7 +5,7 @@ SMFile is a class that represents an SM file.
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import List
+from typing import Iterator, List, Optional
 from pathlib import Path
 import logging
 
@@ -13,10 +13,14 @@ from stepchart_utils.common_parser import (
     FileMissing,
     FileUnspecified,
     OptionWarning,
-    extract_value,
     find_audio_file,
     find_video_file,
+    parse_bpms,
+    read_header,
+    tag_values,
+    tokenize_tags,
 )
+from stepchart_utils.note_data import NoteData, SongTiming, iter_sm_charts, select_charts
 from stepchart_utils.step_chart_file import StepChartFile
 
 logger = logging.getLogger(__name__)
@@ -60,69 +64,86 @@ class SMFile(StepChartFile):
     bg_changes_color1: str = ""
     bg_changes_color2: str = ""
     attacks: str = ""
-    notes: List[str] = None
+    body_start: int = 0  # byte offset of the first chart, the header is everything before
+    _notes: Optional[List[NoteData]] = field(default=None, repr=False, compare=False)
     unknown_options: dict[str, str] = field(default_factory=dict)
 
-    def __post_init__(self):
-        if self.notes is None:
-            self.notes = []
+    @property
+    def notes(self) -> List[NoteData]:
+        """Every chart of the file, scanned on first access, their notes decoded on use"""
+        if self._notes is None:
+            self._notes = list(iter_sm_charts(self.filepath, self.body_start, self.timing))
+        return self._notes
+
+    @property
+    def timing(self) -> SongTiming:
+        return SongTiming(self.offset, tuple(self.bpms), self.stops)
+
+    def iter_charts(
+        self, steps_type: Optional[str] = None, difficulty: Optional[str] = None
+    ) -> Iterator[NoteData]:
+        """
+        Yield the charts of a steps type and difficulty one at a time, e.g.
+        iter_charts("dance-single", "Challenge"). Unless notes was already used, the file is
+        scanned as the charts are asked for, so stopping at the wanted chart skips the rest.
+
+        Args:
+            steps_type: #STEPSTYPE to keep, None for any
+            difficulty: #DIFFICULTY to keep, None for any
+        """
+        if self._notes is not None:
+            charts = self._notes
+        else:
+            charts = iter_sm_charts(self.filepath, self.body_start, self.timing)
+        return select_charts(charts, steps_type, difficulty)
 
     @staticmethod
     def parse(filepath: Path) -> tuple[SMFile, Path, Path]:
         """Parse an SM file and return an SMFile object"""
         sm_file = SMFile()
 
-        with open(filepath, "r", encoding="utf-8") as f:
-            content = f.read()
+        # Only the song's header is read, charts are scanned when notes is first used
+        content, body_start = read_header(filepath)
+        tags = list(tokenize_tags(content))
+        values = tag_values(tags)
 
         # Parse basic metadata
         sm_file.filepath = filepath
-        sm_file.title = extract_value(content, "TITLE")
-        sm_file.subtitle = extract_value(content, "SUBTITLE")
-        sm_file.artist = extract_value(content, "ARTIST")
-        sm_file.genre = extract_value(content, "GENRE")
-        sm_file.credit = extract_value(content, "CREDIT")
-        sm_file.menu_color = extract_value(content, "MENUCOLOR")
-        sm_file.meter_type = extract_value(content, "METERTYPE")
-        sm_file.banner = extract_value(content, "BANNER")
-        sm_file.background = extract_value(content, "BACKGROUND")
-        sm_file.lyrics_path = extract_value(content, "LYRICSPATH")
-        sm_file.cd_title = extract_value(content, "CDTITLE")
-        sm_file.music = extract_value(content, "MUSIC")
+        sm_file.body_start = body_start
+        sm_file.title = values.get("TITLE", "")
+        sm_file.subtitle = values.get("SUBTITLE", "")
+        sm_file.artist = values.get("ARTIST", "")
+        sm_file.genre = values.get("GENRE", "")
+        sm_file.credit = values.get("CREDIT", "")
+        sm_file.menu_color = values.get("MENUCOLOR", "")
+        sm_file.meter_type = values.get("METERTYPE", "")
+        sm_file.banner = values.get("BANNER", "")
+        sm_file.background = values.get("BACKGROUND", "")
+        sm_file.lyrics_path = values.get("LYRICSPATH", "")
+        sm_file.cd_title = values.get("CDTITLE", "")
+        sm_file.music = values.get("MUSIC", "")
 
         # Parse numeric values
-        offset = extract_value(content, "OFFSET")
+        offset = values.get("OFFSET", "")
         sm_file.offset = float(offset) if offset else 0.0
 
-        sample_start = extract_value(content, "SAMPLESTART")
+        sample_start = values.get("SAMPLESTART", "")
         sm_file.sample_start = float(sample_start) if sample_start else 0.0
 
-        sample_length = extract_value(content, "SAMPLELENGTH")
+        sample_length = values.get("SAMPLELENGTH", "")
         sm_file.sample_length = float(sample_length) if sample_length else 0.0
 
         # Parse other metadata
-        sm_file.selectable = extract_value(content, "SELECTABLE")
-        sm_file.list_sort = extract_value(content, "LISTSORT")
-
-        # Convert BPMS to list of tuples
-        # Example #BPMS:0.000=160.002,10.000=180.002;
-        # Would be converted to [(0.0, 160.002), (10.0, 180.002)]
-        bpms = extract_value(content, "BPMS")
-        if bpms:
-            sm_file.bpms = [
-                (float(bpm[0]), float(bpm[1]))
-                for bpm in [bpm.split("=") for bpm in bpms.split(",")]
-            ]
-        else:
-            sm_file.bpms = []
+        sm_file.selectable = values.get("SELECTABLE", "")
+        sm_file.list_sort = values.get("LISTSORT", "")
 
-        sm_file.stops = extract_value(content, "STOPS")
-        bg_changes = extract_value(content, "BGCHANGES")
-        sm_file.bg_changes = sm_file._parse_bgchange(bg_changes)
+        sm_file.bpms = parse_bpms(values.get("BPMS", ""))
 
-        sm_file.attacks = extract_value(content, "ATTACKS")
+        sm_file.stops = values.get("STOPS", "")
+        bg_changes = values.get("BGCHANGES", "")
+        sm_file.bg_changes = sm_file._parse_bgchange(bg_changes)
 
-        # TODO: Implement notes parsing
+        sm_file.attacks = values.get("ATTACKS", "")
 
         if sm_file.bg_changes_file:
             video_file = sm_file.filepath.parent / sm_file.bg_changes_file
@@ -133,14 +154,12 @@ class SMFile(StepChartFile):
         else:
             audio_file = find_audio_file(sm_file.filepath.parent)
 
-        # Now check for unknown options. Operate on the whole content string, look at each option #FOO and see if it's in the list of valid options. If it's not, add it to the unknown_options dict.
-        for line in content.split("\n"):
-            if line.startswith("#"):
-                option = line[1:].split(":")[0]
-                if option not in sm_file.get_valid_options():
-                    sm_file.unknown_options[option] = (
-                        line  # Technically should be every line until the next #FOO, but this is good enough to warn on.
-                    )
+        # Only the header's tags are checked, see read_header
+        for tag in tags:
+            if tag.name not in sm_file.get_valid_options():
+                sm_file.unknown_options[tag.name] = content[tag.start : tag.end].decode(
+                    "utf-8", errors="replace"
+                )
 
         return sm_file, audio_file, video_file
 
@@ -7,16 +7,20 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 import logging
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional
 
 from stepchart_utils.common_parser import (
     FileMissing,
     FileUnspecified,
     OptionWarning,
-    extract_value,
     find_audio_file,
     find_video_file,
+    parse_bpms,
+    read_header,
+    tag_values,
+    tokenize_tags,
 )
+from stepchart_utils.note_data import NoteData, SongTiming, iter_ssc_charts, select_charts
 from stepchart_utils.sm_file import SMFile
 
 logger = logging.getLogger(__name__)
@@ -60,68 +64,88 @@ class SSCFile:
     bg_changes_color1: str = ""
     bg_changes_color2: str = ""
     attacks: str = ""
-    notes: List[str] = None
+    body_start: int = 0  # byte offset of the first chart, the header is everything before
+    _notes: Optional[List[NoteData]] = field(default=None, repr=False, compare=False)
     unknown_options: dict[str, str] = field(default_factory=dict)
     jacket: str = ""
 
-    def __post_init__(self):
-        if self.notes is None:
-            self.notes = []
+    @property
+    def notes(self) -> List[NoteData]:
+        """Every chart of the file, scanned on first access, their notes decoded on use"""
+        if self._notes is None:
+            self._notes = list(iter_ssc_charts(self.filepath, self.body_start, self.timing))
+        return self._notes
+
+    @property
+    def timing(self) -> SongTiming:
+        return SongTiming(self.offset, tuple(self.bpms), self.stops)
+
+    def iter_charts(
+        self, steps_type: Optional[str] = None, difficulty: Optional[str] = None
+    ) -> Iterator[NoteData]:
+        """
+        Yield the charts of a steps type and difficulty one at a time, e.g.
+        iter_charts("dance-single", "Challenge"). Unless notes was already used, the file is
+        scanned as the charts are asked for, so stopping at the wanted chart skips the rest.
+
+        Args:
+            steps_type: #STEPSTYPE to keep, None for any
+            difficulty: #DIFFICULTY to keep, None for any
+        """
+        if self._notes is not None:
+            charts = self._notes
+        else:
+            charts = iter_ssc_charts(self.filepath, self.body_start, self.timing)
+        return select_charts(charts, steps_type, difficulty)
 
     def parse(self, filepath: Path) -> tuple[SSCFile, Path, Path]:
         """Parse an SSC file and return an SSCFile object"""
 
         ssc_file = SSCFile()
 
-        with open(filepath, "r", encoding="utf-8") as f:
-            content = f.read()
+        # Only the song's header is read, charts are scanned when notes is first used
+        content, body_start = read_header(filepath)
+        tags = list(tokenize_tags(content))
+        values = tag_values(tags)
 
         # Parse basic metadata
         ssc_file.filepath = filepath
-        ssc_file.title = extract_value(content, "TITLE")
-        ssc_file.subtitle = extract_value(content, "SUBTITLE")
-        ssc_file.artist = extract_value(content, "ARTIST")
-        ssc_file.genre = extract_value(content, "GENRE")
-        ssc_file.credit = extract_value(content, "CREDIT")
-        ssc_file.menu_color = extract_value(content, "MENUCOLOR")
-        ssc_file.meter_type = extract_value(content, "METERTYPE")
-        ssc_file.banner = extract_value(content, "BANNER")
-        ssc_file.background = extract_value(content, "BACKGROUND")
-        ssc_file.lyrics_path = extract_value(content, "LYRICSPATH")
-        ssc_file.cd_title = extract_value(content, "CDTITLE")
-        ssc_file.music = extract_value(content, "MUSIC")
-        ssc_file.jacket = extract_value(content, "JACKET")
+        ssc_file.body_start = body_start
+        ssc_file.title = values.get("TITLE", "")
+        ssc_file.subtitle = values.get("SUBTITLE", "")
+        ssc_file.artist = values.get("ARTIST", "")
+        ssc_file.genre = values.get("GENRE", "")
+        ssc_file.credit = values.get("CREDIT", "")
+        ssc_file.menu_color = values.get("MENUCOLOR", "")
+        ssc_file.meter_type = values.get("METERTYPE", "")
+        ssc_file.banner = values.get("BANNER", "")
+        ssc_file.background = values.get("BACKGROUND", "")
+        ssc_file.lyrics_path = values.get("LYRICSPATH", "")
+        ssc_file.cd_title = values.get("CDTITLE", "")
+        ssc_file.music = values.get("MUSIC", "")
+        ssc_file.jacket = values.get("JACKET", "")
 
         # Parse numeric values
-        offset = extract_value(content, "OFFSET")
+        offset = values.get("OFFSET", "")
         ssc_file.offset = float(offset) if offset else 0.0
 
-        sample_start = extract_value(content, "SAMPLESTART")
+        sample_start = values.get("SAMPLESTART", "")
         ssc_file.sample_start = float(sample_start) if sample_start else 0.0
 
-        sample_length = extract_value(content, "SAMPLELENGTH")
+        sample_length = values.get("SAMPLELENGTH", "")
         ssc_file.sample_length = float(sample_length) if sample_length else 0.0
 
         # Parse other metadata
-        ssc_file.selectable = extract_value(content, "SELECTABLE")
-        ssc_file.list_sort = extract_value(content, "LISTSORT")
-
-        bpms = extract_value(content, "BPMS")
-        if bpms:
-            ssc_file.bpms = [
-                (float(bpm[0]), float(bpm[1]))
-                for bpm in [bpm.split("=") for bpm in bpms.split(",")]
-            ]
-        else:
-            ssc_file.bpms = []
+        ssc_file.selectable = values.get("SELECTABLE", "")
+        ssc_file.list_sort = values.get("LISTSORT", "")
 
-        ssc_file.stops = extract_value(content, "STOPS")
-        bg_changes = extract_value(content, "BGCHANGES")
-        ssc_file.bg_changes = ssc_file._parse_bgchange(bg_changes)
+        ssc_file.bpms = parse_bpms(values.get("BPMS", ""))
 
-        ssc_file.attacks = extract_value(content, "ATTACKS")
+        ssc_file.stops = values.get("STOPS", "")
+        bg_changes = values.get("BGCHANGES", "")
+        ssc_file.bg_changes = ssc_file._parse_bgchange(bg_changes)
 
-        # TODO: Implement notes parsing
+        ssc_file.attacks = values.get("ATTACKS", "")
 
         if ssc_file.bg_changes_file:
             video_file = ssc_file.filepath.parent / ssc_file.bg_changes_file
@@ -132,13 +156,12 @@ class SSCFile:
         else:
             audio_file = find_audio_file(ssc_file.filepath.parent)
 
-        for line in content.split("\n"):
-            if line.startswith("#"):
-                option = line[1:].split(":")[0]
-                if option not in ssc_file.get_valid_options():
-                    ssc_file.unknown_options[option] = (
-                        line  # Technically should be every line until the next #FOO, but this is good enough to warn on.
-                    )
+        # Only the header's tags are checked, see read_header
+        for tag in tags:
+            if tag.name not in ssc_file.get_valid_options():
+                ssc_file.unknown_options[tag.name] = content[tag.start : tag.end].decode(
+                    "utf-8", errors="replace"
+                )
 
         return ssc_file, audio_file, video_file
 